@@ -0,0 +1,145 @@
+"""Compute aggregate statistics over streams of close approaches.
+
+An aggregation groups the close approaches matched by a collection of filters
+by zero or more group-by keys (year, month, NEO, hazardous) and summarizes one
+numeric field (distance, velocity, or diameter) of each group with a count, a
+minimum, a maximum, a mean, and optionally a histogram over fixed bin edges.
+
+Everything is computed in a single streaming pass - the approaches are consumed
+one at a time and only the running statistics of each group are kept. The
+approaches can also be consumed a batch at a time, from lists of approaches or
+from dictionaries of columns as generated by `NEODatabase.query_batches`.
+"""
+import bisect
+import itertools
+import math
+
+from columnar import EPOCH, MINUTE
+
+
+# Functions to compute the value of each group-by key from a `CloseApproach`.
+GROUP_KEYS = {
+    'year': lambda approach: approach.time.year,
+    'month': lambda approach: f"{approach.time.year:04d}-{approach.time.month:02d}",
+    'neo': lambda approach: approach.neo.designation,
+    'hazardous': lambda approach: approach.neo.hazardous,
+}
+
+# Functions to compute the values of each group-by key from a dictionary of columns.
+COLUMN_GROUP_KEYS = {
+    'year': lambda columns: [(EPOCH + t * MINUTE).year for t in columns['time']],
+    'month': lambda columns: [f"{time.year:04d}-{time.month:02d}"
+                              for time in (EPOCH + t * MINUTE for t in columns['time'])],
+    'neo': lambda columns: columns['designation'],
+    'hazardous': lambda columns: [bool(hazardous) for hazardous in columns['hazardous']],
+}
+
+# Functions to fetch each aggregable numeric field from a `CloseApproach`.
+FIELDS = {
+    'distance': lambda approach: approach.distance,
+    'velocity': lambda approach: approach.velocity,
+    'diameter': lambda approach: approach.neo.diameter,
+}
+
+
+class UnsupportedAggregateError(ValueError):
+    """The group-by key or the aggregated field is not supported."""
+
+
+class Aggregate:
+    """Running statistics for one group of close approaches.
+
+    The `count` includes every approach added to the group, while the minimum,
+    maximum, mean, and histogram only consider values that aren't NaN (such as
+    the diameter of an NEO whose size is unknown).
+    """
+    def __init__(self, bins=None):
+        """Create a new, empty `Aggregate`.
+
+        :param bins: An optional ascending sequence of histogram bin edges.
+        """
+        self.count = 0
+        self.valid = 0
+        self.total = 0.0
+        self.minimum = math.nan
+        self.maximum = math.nan
+        self.bins = tuple(bins) if bins else None
+        self.histogram = [0] * (len(self.bins) - 1) if self.bins else None
+
+    def add(self, value):
+        """Fold a single value into the running statistics.
+
+        :param value: The value of the aggregated field for one approach.
+        """
+        self.count += 1
+        if math.isnan(value):
+            return
+        if not self.valid or value < self.minimum:
+            self.minimum = value
+        if not self.valid or value > self.maximum:
+            self.maximum = value
+        self.valid += 1
+        self.total += value
+        if self.bins and self.bins[0] <= value <= self.bins[-1]:
+            # Bins are half-open, except the last one which includes its upper edge.
+            index = min(bisect.bisect_right(self.bins, value) - 1, len(self.histogram) - 1)
+            self.histogram[index] += 1
+
+    @property
+    def mean(self):
+        """Return the mean of the non-NaN values, or NaN for an empty group."""
+        return self.total / self.valid if self.valid else math.nan
+
+    def serialize(self):
+        """Return serialized aggregate object"""
+        aggregate_dic = {
+            "count": self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": self.mean,
+        }
+        if self.bins:
+            aggregate_dic["histogram"] = list(self.histogram)
+        return aggregate_dic
+
+    def __repr__(self):
+        return f"Aggregate(count={self.count}, min={self.minimum:.3f}, " \
+               f"max={self.maximum:.3f}, mean={self.mean:.3f})"
+
+
+def aggregate(approaches, group_by=(), field='distance', bins=None):
+    """Aggregate a stream of close approaches in a single pass.
+
+    :param approaches: An iterable of `CloseApproach` objects, or of batches of them.
+    :param group_by: A sequence of group-by key names from `GROUP_KEYS`.
+    :param field: The name of the aggregated field from `FIELDS`.
+    :param bins: An optional ascending sequence of histogram bin edges.
+    :return: A dictionary mapping tuples of group-by values to `Aggregate`s.
+    """
+    try:
+        keys = tuple(GROUP_KEYS[key] for key in group_by)
+    except KeyError as err:
+        raise UnsupportedAggregateError(f"Unsupported group-by key: {err.args[0]!r}") from None
+    try:
+        get = FIELDS[field]
+    except KeyError:
+        raise UnsupportedAggregateError(f"Unsupported aggregate field: {field!r}") from None
+    if bins is not None and (len(bins) < 2 or list(bins) != sorted(bins)):
+        raise UnsupportedAggregateError("Histogram bins must be at least two ascending edges.")
+
+    groups = {}
+    for item in approaches:
+        if isinstance(item, dict):
+            # A batch of columns: compute each group-by key a column at a time.
+            values = item[field]
+            columns = [COLUMN_GROUP_KEYS[key](item) for key in group_by]
+            rows = zip(zip(*columns) if columns else itertools.repeat(()), values)
+        else:
+            batch = item if isinstance(item, list) else (item,)
+            rows = ((tuple(key(approach) for key in keys), get(approach)) for approach in batch)
+        for group, value in rows:
+            accumulator = groups.get(group)
+            if accumulator is None:
+                accumulator = groups[group] = Aggregate(bins)
+            accumulator.add(value)
+    return groups
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Compare the speed of the query engines on a few typical workloads.
+
+This script loads the NEO and close approach data files into each engine and
+times a fixed set of queries against each of them, printing the best time of
+several repetitions:
+
+    $ python3 benchmark.py
+    $ python3 benchmark.py --neofile tests/test-neos-2020.csv --cadfile tests/test-cad-2020.json
+
+The in-memory engine is the `NEODatabase`, the k-d tree engine is an
+`NEODatabase` with a `KDTree` for multi-attribute box queries, the bitmap engine
+is an `NEODatabase` with a `BitmapIndex` and its cache of filter bitmaps (which
+are reused across repetitions, as in an interactive session), and the SQLite
+engine is a `SQLiteNEODatabase` over a temporary database file built by
+`import_to_sqlite`. Then, the nearest-neighbor search of the k-d tree is
+timed against a full scan of the close approaches. Finally, an export of every
+close approach is timed in each output format, uncompressed and compressed,
+and as columns in an `.npz` file, and the size of each output file is printed.
+The compressed CSV export is also timed through the pipeline of `pipeline.py`.
+"""
+import argparse
+import datetime
+import heapq
+import math
+import pathlib
+import tempfile
+import timeit
+
+from columnar import columns_of, write_to_npz
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from pipeline import write_pipelined
+from sqlitedb import SQLiteNEODatabase, import_to_sqlite
+from write import write_to_csv, write_to_json
+
+
+PROJECT_ROOT = pathlib.Path(__file__).parent.resolve()
+DATA_ROOT = PROJECT_ROOT / 'data'
+
+# Named collections of filters, as keyword arguments to `create_filters`.
+WORKLOADS = {
+    'all': {},
+    'one date': {'date': datetime.date(2020, 3, 2)},
+    'date range': {'start_date': datetime.date(2020, 1, 1), 'end_date': datetime.date(2020, 1, 31),
+                   'distance_max': 0.025},
+    'distance and velocity': {'distance_min': 0.2, 'velocity_min': 30},
+    'hazardous and diameter': {'diameter_min': 0.5, 'hazardous': True},
+    'distance, speed, size': {'distance_max': 0.05, 'velocity_min': 20, 'diameter_min': 0.5},
+}
+
+
+def best_time(function, repeat):
+    """Return the best time, in milliseconds, of several calls to a function."""
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def benchmark(engines, repeat):
+    """Time each workload's query and count against each engine, and print a table.
+
+    :param engines: A dictionary mapping engine names to databases.
+    :param repeat: The number of repetitions of each measurement.
+    """
+    print(f"{'workload':<24}{'engine':<10}{'matches':>9}{'query ms':>11}{'count ms':>11}")
+    for name, criteria in WORKLOADS.items():
+        filters = create_filters(**criteria)
+        for engine, database in engines.items():
+            matches = database.count(filters)
+            query = best_time(lambda: sum(1 for _ in database.query(filters)), repeat)
+            count = best_time(lambda: database.count(filters), repeat)
+            print(f"{name:<24}{engine:<10}{matches:>9}{query:>11.2f}{count:>11.2f}")
+
+
+def benchmark_similar(database, repeat, k=10):
+    """Time the nearest-neighbor search of the k-d tree against a full scan, and print them.
+
+    :param database: An `NEODatabase` with a k-d tree.
+    :param repeat: The number of repetitions of each measurement.
+    :param k: The number of nearest neighbors to find.
+    """
+    tree = database._kdtree
+    position = len(tree.points) // 2
+    target = tree.points[position]
+
+    def scan():
+        return heapq.nsmallest(k, (
+            (math.sqrt(sum((a - b) ** 2 for a, b in zip(target, point))), other)
+            for other, point in enumerate(tree.points) if other != position
+        ))
+
+    for engine, function in (('kdtree', lambda: tree.nearest(position, k)), ('scan', scan)):
+        print(f"{'similar':<24}{engine:<10}{k:>9}{best_time(function, repeat):>11.2f}")
+
+
+def benchmark_exports(database, directory, repeat):
+    """Time the export of every close approach to each output format, and print their sizes.
+
+    :param database: An `NEODatabase`.
+    :param directory: A path to a directory in which to write the output files.
+    :param repeat: The number of repetitions of each measurement.
+    """
+    approaches = list(database.query())
+    print(f"{'export':<24}{'format':<14}{'MB':>9}{'write ms':>11}{'ratio':>8}")
+    for writer, suffix in ((write_to_csv, '.csv'), (write_to_json, '.json')):
+        plain = None
+        for compression in ('', '.gz', '.bz2', '.xz'):
+            path = pathlib.Path(directory) / f"export{suffix}{compression}"
+            elapsed = best_time(lambda: writer(approaches, path), repeat)
+            size = path.stat().st_size
+            plain = plain or size
+            print(f"{'all':<24}{suffix + compression:<14}{size / 2 ** 20:>9.2f}"
+                  f"{elapsed:>11.2f}{plain / size:>8.1f}")
+    path = pathlib.Path(directory) / 'export.npz'
+    elapsed = best_time(lambda: write_to_npz(columns_of(approaches), path), repeat)
+    print(f"{'all':<24}{'.npz':<14}{path.stat().st_size / 2 ** 20:>9.2f}{elapsed:>11.2f}")
+    path = pathlib.Path(directory) / 'pipelined.csv.gz'
+    elapsed = best_time(lambda: write_pipelined(approaches, path), repeat)
+    print(f"{'all':<24}{'.csv.gz piped':<14}{path.stat().st_size / 2 ** 20:>9.2f}{elapsed:>11.2f}")
+
+
+def main():
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description="Compare the speed of the query engines.")
+    parser.add_argument('--neofile', default=(DATA_ROOT / 'neos.csv'), type=pathlib.Path,
+                        help="Path to CSV file of near-Earth objects.")
+    parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'), type=pathlib.Path,
+                        help="Path to JSON file of close approach data.")
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help="The number of repetitions of each measurement.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite_file = pathlib.Path(directory) / 'neos.sqlite'
+        import_to_sqlite(args.neofile, args.cadfile, sqlite_file)
+        engines = {
+            'memory': NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile)),
+            'kdtree': NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile),
+                                  spatial=True),
+            'bitmaps': NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile),
+                                   bitmaps=True),
+            'sqlite': SQLiteNEODatabase(sqlite_file),
+        }
+        try:
+            benchmark(engines, args.repeat)
+            benchmark_similar(engines['kdtree'], args.repeat)
+            benchmark_exports(engines['memory'], directory, args.repeat)
+        finally:
+            engines['sqlite'].close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Write close approaches as typed columns, to `.npz` or Arrow IPC output files.
+
+Downstream analytics jobs can load these files without parsing any text. Each
+file holds the same seven columns, one value per close approach:
+
+    column          type
+    time            datetime64[m], as int64 minutes since 1970-01-01 00:00 (UTC)
+    distance        float64, in au
+    velocity        float64, in km/s
+    designation     fixed-width unicode string
+    name            fixed-width unicode string, empty if the NEO has no name
+    diameter        float64, in km, NaN if unknown
+    hazardous       bool
+
+An `.npz` file is a zip archive of `.npy` arrays, as written by `numpy.savez`
+and read by `numpy.load`. It's written by hand, so numpy isn't needed to write
+it. An `.arrow` file is an Arrow IPC file, which can only be written if
+`pyarrow` is installed.
+
+Columns are held in a dictionary mapping each column name to an `array` (for
+the numeric columns) or a list of strings. `columns_of` builds them from a
+stream of `CloseApproach`es, and `MappedNEODatabase.columns` slices them from
+its mapped columns. They're also the batches generated by `query_batches`
+with `columns=True`, and `rows_of` turns them back into rows of values.
+"""
+import ast
+import datetime
+import sys
+import zipfile
+from array import array
+
+# The columns of an output file, with their typecode in `array` and in `.npy`
+# (without byte order). String columns have no typecode.
+COLUMNS = (
+    ('time', 'q', 'M8[m]'),
+    ('distance', 'd', 'f8'),
+    ('velocity', 'd', 'f8'),
+    ('designation', None, 'U'),
+    ('name', None, 'U'),
+    ('diameter', 'd', 'f8'),
+    ('hazardous', 'b', 'b1'),
+)
+# The epoch of the time column, and its resolution.
+EPOCH = datetime.datetime(1970, 1, 1)
+MINUTE = datetime.timedelta(minutes=1)
+# The magic string and format version that start a `.npy` array.
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# The total size of a `.npy` preamble and header is padded to a multiple of this.
+NPY_ALIGNMENT = 64
+
+
+def empty_columns():
+    """Return a dictionary of empty columns, ready to be extended."""
+    return {name: array(typecode) if typecode else []
+            for name, typecode, _ in COLUMNS}
+
+
+def columns_of(results):
+    """Gather an iterable of `CloseApproach` objects into columns.
+
+    :param results: An iterable of `CloseApproach` objects.
+    :return: A dictionary mapping each column name to its values.
+    """
+    columns = empty_columns()
+    for result in results:
+        neo = result.neo
+        columns['time'].append((result.time - EPOCH) // MINUTE)
+        columns['distance'].append(result.distance)
+        columns['velocity'].append(result.velocity)
+        columns['designation'].append(neo.designation)
+        columns['name'].append(neo.name or '')
+        columns['diameter'].append(neo.diameter)
+        columns['hazardous'].append(bool(neo.hazardous))
+    return columns
+
+
+def rows_of(columns):
+    """Turn columns of close approaches back into rows of values.
+
+    Each row holds the time (as a `datetime`), distance, velocity, designation,
+    name, diameter and hazardous flag (as a `bool`) of one close approach, in
+    the order of `COLUMNS`.
+
+    :param columns: A dictionary mapping each column name to its values.
+    :return: A list of tuples.
+    """
+    return list(zip([EPOCH + t * MINUTE for t in columns['time']],
+                    columns['distance'], columns['velocity'],
+                    columns['designation'], columns['name'], columns['diameter'],
+                    map(bool, columns['hazardous'])))
+
+
+def _npy_header(descr, length):
+    """Build the preamble and header of a one-dimensional `.npy` array.
+
+    :param descr: The numpy type description of the array, such as '<f8'.
+    :param length: The number of elements of the array.
+    :return: The bytes that come before the data of the array.
+    """
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({length},), }}"
+    size = len(NPY_MAGIC) + 2 + len(header) + 1
+    header += ' ' * (-size % NPY_ALIGNMENT) + '\n'
+    return NPY_MAGIC + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+def _npy_array(column, typecode, descr):
+    """Encode a column as the type description and data of a `.npy` array."""
+    if typecode is None:
+        # Strings are stored as fixed-width UTF-32, padded with NULs.
+        width = max(map(len, column), default=0) or 1
+        data = ''.join(value.ljust(width, '\0') for value in column).encode('utf-32-le')
+        return f"<U{width}", data
+    order = '|' if descr == 'b1' else ('<' if sys.byteorder == 'little' else '>')
+    return order + descr, column.tobytes()
+
+
+def write_to_npz(columns, filename):
+    """Write columns of close approaches to an `.npz` file, one `.npy` array per column.
+
+    :param columns: A dictionary mapping each column name to its values.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    """
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED) as archive:
+        for name, typecode, descr in COLUMNS:
+            descr, data = _npy_array(columns[name], typecode, descr)
+            with archive.open(name + '.npy', 'w', force_zip64=True) as member:
+                member.write(_npy_header(descr, len(columns[name])))
+                member.write(data)
+
+
+def read_npz(filename):
+    """Read the columns of an `.npz` file written by `write_to_npz`, without numpy.
+
+    :param filename: A Path-like object pointing to an `.npz` file.
+    :return: A dictionary mapping each column name to its values.
+    """
+    columns = {}
+    with zipfile.ZipFile(filename) as archive:
+        for name, typecode, _ in COLUMNS:
+            raw = archive.read(name + '.npy')
+            size = int.from_bytes(raw[len(NPY_MAGIC):len(NPY_MAGIC) + 2], 'little')
+            start = len(NPY_MAGIC) + 2
+            header = ast.literal_eval(raw[start:start + size].decode('latin1'))
+            data = raw[start + size:]
+            if typecode is None:
+                width = int(header['descr'][2:])
+                text = data.decode('utf-32-le')
+                columns[name] = [text[i:i + width].rstrip('\0')
+                                 for i in range(0, len(text), width)]
+            else:
+                columns[name] = array(typecode, data)
+                order = header['descr'][0]
+                if order != '|' and order != ('<' if sys.byteorder == 'little' else '>'):
+                    columns[name].byteswap()
+    return columns
+
+
+def write_to_arrow(columns, filename):
+    """Write columns of close approaches to an Arrow IPC file.
+
+    :param columns: A dictionary mapping each column name to its values.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :raises ImportError: If `pyarrow` isn't installed.
+    """
+    import pyarrow
+    import pyarrow.ipc
+
+    length = len(columns['time'])
+
+    def numeric(column, type_):
+        # Arrow arrays share the native byte order of `array`s, so wrap the buffers as they are.
+        return pyarrow.Array.from_buffers(type_, length, [None, pyarrow.py_buffer(column)])
+
+    table = pyarrow.table({
+        'time': numeric(array('q', (t * 60 for t in columns['time'])), pyarrow.timestamp('s')),
+        'distance': numeric(columns['distance'], pyarrow.float64()),
+        'velocity': numeric(columns['velocity'], pyarrow.float64()),
+        'designation': pyarrow.array(columns['designation'], type=pyarrow.string()),
+        'name': pyarrow.array(columns['name'], type=pyarrow.string()),
+        'diameter': numeric(columns['diameter'], pyarrow.float64()),
+        'hazardous': pyarrow.array(columns['hazardous'].tolist(), type=pyarrow.bool_()),
+    })
+    with pyarrow.OSFile(str(filename), 'wb') as sink:
+        with pyarrow.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
@@ -1,3 +1,29 @@
+import bisect
+import collections
+import heapq
+import itertools
+import operator
+from array import array
+from operator import attrgetter
+
+from aggregate import aggregate
+from columnar import columns_of
+from extract import parse_approach
+from filters import DateFilter, DistanceFilter, HazardousFilter, VelocityFilter, batched
+from indexes import (BITMAP_CACHE_MB, RESULT_CACHE_SIZE, BitmapCache, BitmapIndex, KDTree,
+                     PrefixIndex, ResultCache, RollupCube, SortedIndex, ZoneMap, bitmap_positions,
+                     popcount, to_bitmap)
+from models import ApproachSummary, ApproachesView
+
+# The filter classes on whose attribute `NEODatabase` maintains a `SortedIndex`.
+INDEXED_FILTERS = (DateFilter, DistanceFilter, VelocityFilter)
+# The default number of close approaches in each batch generated by `query_batches`.
+BATCH_SIZE = 2000
+# The fraction of changed approaches, over the indexed ones, beyond which an `NEODatabase`
+# rebuilds its indexes.
+COMPACT_FRACTION = 0.25
+
+
 class NEODatabase:
     """A database of near-Earth objects and their close approaches.
 
@@ -6,7 +32,13 @@ class NEODatabase:
     help fetch NEOs by primary designation or by name and to help speed up
     querying for close approaches that match criteria.
     """
-    def __init__(self, neos, approaches):
+    # Whether the database finds the positions of matching approaches (`positions` and
+    # `approaches_at`), and the approaches most similar to one (`similar`).
+    supports_positions = True
+    supports_similar = True
+
+    def __init__(self, neos, approaches, rollup=False, spatial=False, bitmaps=False,
+                 bitmap_cache_mb=BITMAP_CACHE_MB, result_cache=RESULT_CACHE_SIZE):
         """Create a new `NEODatabase`.
 
         As a precondition, this constructor assumes that the collections of NEOs
@@ -21,17 +53,126 @@ class NEODatabase:
         a collection of that NEO's close approaches, and the `.neo` attribute of
         each close approach references the appropriate NEO.
 
+        The approaches of all NEOs are kept grouped by NEO in one contiguous
+        list, and the `.approaches` of each NEO is an `ApproachesView` over its
+        slice of that list, sorted by time. Each NEO's `.summary` of its
+        approaches is precomputed at the same time.
+
+        If `rollup` is True, a `RollupCube` of the approaches by year, hazard,
+        distance bucket and diameter bucket is additionally built, so that
+        counts over those dimensions are answered mostly without a scan.
+
+        If `spatial` is True, a `KDTree` over the distance, velocity, diameter
+        and time of the approaches is additionally built, so that queries
+        constraining several of those attributes only test the approaches in
+        the box they describe. Otherwise, the tree is only built when first
+        needed by `similar`.
+
+        If `bitmaps` is True, a `BitmapIndex` by hazard flag and by diameter,
+        distance and velocity bucket is additionally built. The bitmap of each
+        filter on those attributes (or on the date) is computed once and kept
+        in a `BitmapCache` of at most `bitmap_cache_mb` megabytes, so that
+        queries sharing filters combine their bitmaps by bitwise AND.
+
+        The positions of the matches of the latest `result_cache` distinct
+        queries are kept in a `ResultCache`.
+
         :param neos: A collection of `NearEarthObject`s.
         :param approaches: A collection of `CloseApproach`es.
+        :param rollup: Whether to pre-aggregate the approaches into a `RollupCube`.
+        :param spatial: Whether to index the approaches with a `KDTree` for box queries.
+        :param bitmaps: Whether to index the approaches with a `BitmapIndex`.
+        :param bitmap_cache_mb: The memory cap of the cached filter bitmaps, in megabytes.
+        :param result_cache: The maximum number of cached query results, or 0 for none.
         """
 
         self._neos = neos
+        self._neos_by_designation = {neo.designation: neo for neo in self._neos}
+        # Index the NEOs by the prefixes of their designations and names.
+        self._prefixes = {
+            'designation': PrefixIndex(self._neos, attrgetter('designation')),
+            'name': PrefixIndex(self._neos, attrgetter('name')),
+        }
+        self._bitmap_cache = BitmapCache(bitmap_cache_mb)
+        self._results = ResultCache(result_cache)
+        # Added approaches whose NEO is unknown, until it's added.
+        self._unlinked = []
+        self._index(approaches, rollup=rollup, spatial=spatial, bitmaps=bitmaps)
+
+    def _index(self, approaches, rollup=False, spatial=False, bitmaps=False):
+        """Link the close approaches to the NEOs, and index them.
+
+        :param approaches: A list of `CloseApproach`es.
+        :param rollup: Whether to pre-aggregate the approaches into a `RollupCube`.
+        :param spatial: Whether to index the approaches with a `KDTree`.
+        :param bitmaps: Whether to index the approaches with a `BitmapIndex`.
+        """
         self._approaches = approaches
-        for neo in self._neos:
-            for approache in self._approaches:
-                if approache._designation == neo.designation:
-                    neo.approaches.append(approache)
-                    approache.neo = neo
+        for approache in self._approaches:
+            approache.neo = self._neos_by_designation.get(approache._designation)
+
+        # Group the linked approaches by NEO into one contiguous list, in which
+        # the approaches of the `i`th NEO span `self._offsets[i]` (inclusive)
+        # to `self._offsets[i + 1]` (exclusive), sorted by time.
+        self._neo_positions = {id(neo): i for i, neo in enumerate(self._neos)}
+        self._offsets = array('l', [0]) * (len(self._neos) + 1)
+        for approache in self._approaches:
+            if approache.neo is not None:
+                self._offsets[self._neo_positions[id(approache.neo)] + 1] += 1
+        for i in range(len(self._neos)):
+            self._offsets[i + 1] += self._offsets[i]
+        self._by_neo = [None] * self._offsets[-1]
+        cursors = array('l', self._offsets)
+        for approache in sorted(self._approaches, key=attrgetter('time')):
+            if approache.neo is not None:
+                i = self._neo_positions[id(approache.neo)]
+                self._by_neo[cursors[i]] = approache
+                cursors[i] += 1
+        for i, neo in enumerate(self._neos):
+            neo.approaches = ApproachesView(self._by_neo, self._offsets[i], self._offsets[i + 1])
+            # Summarize each NEO's approaches once, while linking.
+            neo._summary = ApproachSummary.of(neo.approaches)
+
+        # The approaches before `self._base` are indexed; those after it were
+        # added since, and are scanned, although they're ordered by time in
+        # `self._recent`. The positions of removed approaches are kept in
+        # `self._tombstones`, and skipped. NEOs whose approaches changed since
+        # are relinked to a sorted list in `self._relinked`.
+        self._base = len(self._approaches)
+        self._recent = SortedIndex((), attrgetter('time'))
+        self._tombstones = set()
+        self._relinked = {}
+
+        # Index the approaches by each of the range-filterable attributes.
+        self._indexes = {cls: SortedIndex(self._approaches, cls.get) for cls in INDEXED_FILTERS}
+        self._rollup = RollupCube(self._approaches) if rollup else None
+        self._kdtree = KDTree(self._approaches) if spatial else None
+        self._bitmaps = BitmapIndex(self._approaches) if bitmaps else None
+        # Record the range of each attribute in fixed-size blocks of approaches.
+        self._zonemap = ZoneMap(self._approaches)
+        # Order the approaches by time - all of them, and those of each hazard flag.
+        self._timelines = {
+            None: SortedIndex(self._approaches, attrgetter('time')),
+            True: SortedIndex(self._approaches, attrgetter('time'),
+                              where=lambda approach: approach.neo and approach.neo.hazardous),
+            False: SortedIndex(self._approaches, attrgetter('time'),
+                               where=lambda approach: approach.neo and not approach.neo.hazardous),
+        }
+
+    def _approaches_of(self, neo):
+        """Return the view of one NEO's slice of the approaches grouped by NEO.
+
+        If the NEO's close approaches changed since they were indexed, return
+        the list they were relinked to instead.
+
+        :param neo: A `NearEarthObject` of this database.
+        :return: An `ApproachesView` (or a list) of the NEO's close approaches, sorted by time.
+        """
+        if id(neo) in self._relinked:
+            return self._relinked[id(neo)]
+        i = self._neo_positions[id(neo)]
+        return ApproachesView(self._by_neo, self._offsets[i], self._offsets[i + 1])
+
     def get_neo_by_designation(self, designation):
         """Find and return an NEO by its primary designation.
 
@@ -45,10 +186,24 @@ class NEODatabase:
         :param designation: The primary designation of the NEO to search for.
         :return: The `NearEarthObject` with the desired primary designation, or `None`.
         """
-        for neo in self._neos:
-            if neo.designation == designation:
-                return neo
-        return None
+        return self._neos_by_designation.get(designation)
+
+    def get_neos_by_designations(self, designations):
+        """Find many NEOs by their primary designations at once.
+
+        Each designation is looked up in the index of NEOs by designation, so
+        the whole collection is resolved in one pass. Designations that match
+        no NEO are left out of the result, as are repeated designations.
+
+        :param designations: An iterable of primary designations to search for.
+        :return: A dictionary mapping each matched designation to its `NearEarthObject`, in order.
+        """
+        matches = {}
+        for designation in designations:
+            neo = self._neos_by_designation.get(designation)
+            if neo is not None:
+                matches[designation] = neo
+        return matches
 
     def get_neo_by_name(self, name):
         """Find and return an NEO by its name.
@@ -69,6 +224,50 @@ class NEODatabase:
                 return neo            
         return None
 
+    def search_prefix(self, prefix, limit=10, field=None):
+        """Find NEOs whose designation or name starts with a prefix.
+
+        The matching ignores case. Each NEO is returned at most once, even if
+        both its designation and its name match.
+
+        :param prefix: The prefix, as a string, to search for.
+        :param limit: The maximum number of NEOs to return, or None for all of them.
+        :param field: 'designation' or 'name' to only search one of them, or None for both.
+        :return: A list of matching `NearEarthObject`s, sorted by their matching value.
+        """
+        fields = [field] if field else ['designation', 'name']
+        matches = sorted((match for f in fields for match in self._prefixes[f].search(prefix, limit)),
+                         key=lambda match: match[0].casefold())
+        results, seen = [], set()
+        for _, neo in matches:
+            if id(neo) not in seen:
+                seen.add(id(neo))
+                results.append(neo)
+        return results[:limit] if limit is not None else results
+
+    def query_neos(self, closest_max=None, max_velocity_min=None, approaches_min=None):
+        """Query NEOs by the precomputed summaries of their close approaches.
+
+        Only the summary of each NEO is examined, never its approaches. NEOs
+        without any close approach never match.
+
+        :param closest_max: In au. The maximum distance of an NEO's closest approach.
+        :param max_velocity_min: In km/s. The minimum of an NEO's largest approach velocity.
+        :param approaches_min: The minimum number of an NEO's close approaches.
+        :return: A stream of matching `NearEarthObject`s.
+        """
+        for neo in self._neos:
+            summary = neo.summary
+            if summary.closest is None:
+                continue
+            if closest_max is not None and not summary.closest.distance <= closest_max:
+                continue
+            if max_velocity_min is not None and not summary.max_velocity >= max_velocity_min:
+                continue
+            if approaches_min is not None and summary.count < approaches_min:
+                continue
+            yield neo
+
     def query(self, filters=()):
         """Query close approaches to generate those that match a collection of filters.
 
@@ -80,14 +279,560 @@ class NEODatabase:
         The `CloseApproach` objects are generated in internal order, which isn't
         guaranteed to be sorted meaninfully, although is often sorted by time.
 
+        The positions of the matches of recent queries are kept in a result
+        cache keyed by their filters, so that repeating a query only replays
+        them; see `result_stats`.
+
+        If the database has a k-d tree and the filters constrain several of its
+        dimensions, only the approaches in the box they describe are tested.
+        Otherwise, if the database has bitmap indexes, only the approaches in
+        the intersection of the bitmaps of the filters are tested. Otherwise,
+        blocks of approaches whose zone map ranges can't satisfy the filters
+        are skipped without testing their approaches; see `scan_stats`.
+        Approaches added since the indexes were built are all tested.
+
         :param filters: A collection of filters capturing user-specified criteria.
         :return: A stream of matching `CloseApproach` objects.
         """
         
-        if filters:
-            for approach in self._approaches:
-                if all(map(lambda f: f(approach), filters)):
-                    yield approach
+        if not filters:
+            for position in self._live():
+                yield self._approaches[position]
+            return
+
+        for position in self._matches(filters):
+            yield self._approaches[position]
+
+    def query_batches(self, filters=(), batch_size=BATCH_SIZE, columns=False):
+        """Query close approaches to generate batches of those that match a collection of filters.
+
+        The batches hold the close approaches generated by `query`, in the same
+        order, found by the same indexes, caches and scans. Each batch is built
+        in a single loop, so that a consumer resumes a generator once per batch
+        rather than once per close approach.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param batch_size: The maximum number of close approaches in each batch.
+        :param columns: Whether to generate dictionaries of columns, as built by
+                        `columnar.columns_of`, instead of lists of `CloseApproach` objects.
+        :return: A stream of non-empty batches of matching close approaches.
+        """
+        positions = self._matches(filters) if filters else self._live()
+        approaches = self._approaches
+        for batch in batched(positions, batch_size):
+            batch = [approaches[position] for position in batch]
+            yield columns_of(batch) if columns else batch
+
+    def _matches(self, filters):
+        """Generate the positions of the close approaches that match a collection of filters.
+
+        :param filters: A non-empty collection of filters capturing user-specified criteria.
+        :return: A stream of matching positions, in internal order.
+        """
+        # Replay the positions of the matches of the same filters, if cached.
+        key = ResultCache.key(filters)
+        positions = self._results.get(key)
+        if positions is not None:
+            yield from positions
+            return
+
+        candidates = self._box(filters)
+        if candidates is None:
+            candidates = self._bitmapped(filters)
+        if candidates is None:
+            candidates = self._scan(filters)
+        candidates = itertools.chain(candidates, range(self._base, len(self._approaches)))
+        matches = array('l')
+        for position in candidates:
+            if position in self._tombstones:
+                continue
+            approach = self._approaches[position]
+            if all(map(lambda f: f(approach), filters)):
+                matches.append(position)
+                yield position
+        # Only a fully consumed stream has all of the matches.
+        self._results.put(key, matches)
+
+    def positions(self, filters=(), within=None):
+        """Find the positions of the close approaches that match a collection of filters.
+
+        If the positions of the matches of a previous, broader query are given,
+        only those close approaches are tested against the filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param within: An optional sequence of candidate positions, in internal order.
+        :return: An `array` of the matching positions, in internal order.
+        """
+        if within is not None:
+            return array('l', (position for position in within
+                               if position not in self._tombstones
+                               and all(f(self._approaches[position]) for f in filters)))
+        if not filters:
+            return array('l', self._live())
+        return array('l', self._matches(filters))
+
+    def _live(self):
+        """Return the positions of the close approaches that weren't removed, in internal order."""
+        if not self._tombstones:
+            return range(len(self._approaches))
+        return (position for position in range(len(self._approaches))
+                if position not in self._tombstones)
+
+    def approaches_at(self, positions):
+        """Return the close approaches at some positions.
+
+        :param positions: A sequence of positions, such as those found by `positions`.
+        :return: A list of `CloseApproach` objects, in the same order.
+        """
+        return [self._approaches[position] for position in positions]
+
+    def count(self, filters=()):
+        """Count the close approaches that match a collection of filters.
+
+        No results are generated. If every filter compares one and the same
+        indexed attribute (the date, the distance or the velocity), the count
+        is computed by index arithmetic alone. If the database has a rollup
+        cube and every filter is on one of its dimensions, the count is read
+        from the cube, scanning only partially matching cells. If the database
+        has bitmap indexes on every filtered attribute, the count is that of the
+        bits of the intersection of their bitmaps. Otherwise, the narrowest
+        span of any index narrows the candidates, which are scanned.
+
+        The count of the indexed approaches is then corrected by those of the
+        approaches added and removed since the indexes were built. The rollup
+        cube is kept up to date with the added approaches as well.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        if not filters:
+            return len(self._approaches) - len(self._tombstones)
+        # Only a count that scans the zone map blocks has scan statistics.
+        self._zonemap.skipped = self._zonemap.visited = 0
+        positions = self._results.get(ResultCache.key(filters))
+        if positions is not None:
+            return len(positions)
+
+        def matches(position):
+            return all(f(self._approaches[position]) for f in filters)
+        total = None
+        if len({type(f) for f in filters}) == 1 and type(filters[0]) in self._indexes:
+            span = self._indexes[type(filters[0])].span(filters)
+            if span is not None:
+                total = span[1] - span[0]
+        if total is None and self._rollup is not None and self._rollup.supports(filters):
+            return self._rollup.count(filters) - sum(1 for position in self._tombstones
+                                                     if matches(position))
+        if total is None:
+            total = self._indexed_count(filters)
+        if self._base == len(self._approaches) and not self._tombstones:
+            return total
+        added = sum(1 for position in range(self._base, len(self._approaches))
+                    if position not in self._tombstones and matches(position))
+        removed = sum(1 for position in self._tombstones
+                      if position < self._base and matches(position))
+        return total + added - removed
+
+    def _indexed_count(self, filters):
+        """Count the indexed close approaches that match a non-empty collection of filters.
+
+        :param filters: A non-empty collection of filters capturing user-specified criteria.
+        :return: The number of matching indexed close approaches, including removed ones.
+        """
+        if self._bitmaps is not None:
+            bitmap, remaining = self._bitmap_of(filters)
+            if bitmap is not None and not remaining:
+                return popcount(bitmap)
+        return sum(1 for position in self._candidates(filters)
+                   if all(f(self._approaches[position]) for f in filters))
+
+    def _candidates(self, filters):
+        """Generate the positions of close approaches that might match a collection of filters.
+
+        The position of every approach that matches all of the filters is
+        generated, in internal order, but those of approaches that don't match
+        might be as well.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of candidate positions.
+        """
+        candidates = self._box(filters)
+        if candidates is None:
+            candidates = self._bitmapped(filters)
+        if candidates is not None:
+            return candidates
+        best = None
+        for cls, index in self._indexes.items():
+            indexed = [f for f in filters if type(f) is cls]
+            span = index.span(indexed) if indexed else None
+            if span is not None and (best is None or span[1] - span[0] < best[2] - best[1]):
+                best = (index, *span)
+        if best is None:
+            return self._scan(filters)
+        index, start, stop = best
+        return sorted(index.positions[start:stop])
+
+    def _box(self, filters):
+        """Find the candidate positions of the k-d tree for some filters, if it supports them.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A sorted list of candidate positions, or None.
+        """
+        if self._kdtree is None or not self._kdtree.supports(filters):
+            return None
+        return sorted(self._kdtree.box(filters))
+
+    def _filter_bitmap(self, f):
+        """Compute the bitmap of a filter from the bitmap index or a sorted index, or None."""
+        if self._bitmaps.supports(f):
+            return self._bitmaps.bitmap(f)
+        if type(f) in self._indexes:
+            span = self._indexes[type(f)].span([f])
+            if span is not None:
+                return to_bitmap(self._indexes[type(f)].positions[span[0]:span[1]])
+        return None
+
+    def _bitmap_of(self, filters):
+        """Intersect the cached bitmaps of the filters that have bitmaps.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A tuple of the intersected bitmap (or None), and the filters without bitmaps.
+        """
+        result, remaining = None, []
+        for f in filters:
+            bitmap = self._bitmap_cache.get(f, self._filter_bitmap)
+            if bitmap is None:
+                remaining.append(f)
+            else:
+                result = bitmap if result is None else result & bitmap
+        return result, remaining
+
+    def _bitmapped(self, filters):
+        """Generate the positions in the intersected bitmaps of some filters, if any.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of candidate positions in internal order, or None.
+        """
+        if self._bitmaps is None:
+            return None
+        bitmap, _ = self._bitmap_of(filters)
+        if bitmap is None:
+            return None
+        return bitmap_positions(bitmap)
+
+    @property
+    def bitmap_stats(self):
+        """Return the hits, misses and evictions of the cache of filter bitmaps, or None.
+
+        :return: A dictionary of statistics, as `BitmapCache.stats`, or None without bitmap indexes.
+        """
+        return self._bitmap_cache.stats if self._bitmaps is not None else None
+
+    @property
+    def result_stats(self):
+        """Return the hits and misses of the cache of query results.
+
+        :return: A dictionary of statistics, as `ResultCache.stats`.
+        """
+        return self._results.stats
+
+    def invalidate_caches(self):
+        """Drop the cached query results and filter bitmaps, once the data has changed."""
+        self._results.clear()
+        self._bitmap_cache.clear()
+
+    def apply_delta(self, added=(), removed=()):
+        """Add and remove close approaches, without rebuilding the indexes.
+
+        Added approaches are linked to their NEOs and appended after the
+        indexed approaches, where every query tests them. Those whose NEO is
+        unknown are held back until it's added with `add_neos`. Removed
+        approaches are marked as such, and skipped by every query.
+
+        Only the NEOs whose approaches changed are relinked, to a sorted list.
+        The time order of the added approaches, the rollup cube, and the lists
+        and summaries of NEOs which only gained approaches are all updated in
+        place, so that appending approaches in time order takes time in
+        proportion to their number. Each such NEO's added approaches are sorted
+        once and merged into its list, so approaches that arrive out of time
+        order cost one pass over the list per NEO and call, not per approach.
+
+        Once the added and removed approaches outnumber `COMPACT_FRACTION` of
+        the indexed approaches, the database is compacted.
+
+        :param added: A collection of unlinked `CloseApproach`es to add.
+        :param removed: A collection of `CloseApproach`es of this database to remove.
+        :return: A tuple of the numbers of added (and linked) and removed close approaches.
+        """
+        added, removed = list(added), list(removed)
+        held = {id(approach) for approach in self._unlinked}
+        positions = [None if id(approach) in held else self._position_of(approach)
+                     for approach in removed]
+        for approach, position in zip(removed, positions):
+            if position is None and id(approach) not in held:
+                raise ValueError(f"{approach!r} isn't an approach of this database.")
+
+        touched, shrunk, gone, additions = {}, set(), set(), collections.defaultdict(list)
+        for approach, position in zip(removed, positions):
+            gone.add(id(approach))
+            if position is None:
+                continue
+            self._tombstones.add(position)
+            touched[id(approach.neo)] = approach.neo
+            shrunk.add(id(approach.neo))
+        if gone and self._unlinked:
+            self._unlinked = [approach for approach in self._unlinked if id(approach) not in gone]
+        linked = 0
+        for approach in added:
+            approach.neo = self._neos_by_designation.get(approach._designation)
+            if approach.neo is None:
+                self._unlinked.append(approach)
+                continue
+            position = len(self._approaches)
+            self._approaches.append(approach)
+            self._recent.insert(approach.time, position)
+            if self._rollup is not None:
+                self._rollup.add(position)
+            touched[id(approach.neo)] = approach.neo
+            additions[id(approach.neo)].append(approach)
+            linked += 1
+        for key, neo in touched.items():
+            if key in shrunk:
+                kept = [approach for approach in neo.approaches if id(approach) not in gone]
+                neo.approaches = sorted(kept + additions[key], key=attrgetter('time'))
+                neo._summary = ApproachSummary.of(neo.approaches)
+            else:
+                # Copy the NEO's slice of the approaches grouped by NEO once.
+                if key not in self._relinked:
+                    neo.approaches = list(neo.approaches)
+                _merge_by_time(neo.approaches, additions[key])
+                neo._summary = neo.summary.extend(additions[key])
+            self._relinked[key] = neo.approaches
+
+        # The cached bitmaps only cover the indexed approaches, but the cached results are stale.
+        self._results.clear()
+        if len(self._approaches) - self._base + len(self._tombstones) > COMPACT_FRACTION * self._base:
+            self.compact()
+        return linked, len(removed)
+
+    def append_approaches(self, rows, fields=None):
+        """Append new close approaches, from raw rows of close approach data.
+
+        Each row is either a mapping of field names to values, such as one
+        record of an NDJSON file, or a sequence of values in the order of
+        `fields`, such as one row of the close approach data file. The new
+        approaches are added as by `apply_delta`, so approaches whose NEO is
+        unknown are held back until it's added.
+
+        :param rows: A collection of rows of close approach data.
+        :param fields: The field names of the values of sequence rows, or None for mappings.
+        :return: The number of close approaches appended and linked to their NEO.
+        """
+        if fields is None:
+            approaches = [parse_approach(row.keys(), row.values()) for row in rows]
         else:
-            for approach in self._approaches:
-                yield approach
+            approaches = [parse_approach(fields, row) for row in rows]
+        return self.apply_delta(added=approaches)[0]
+
+    @property
+    def held_back(self):
+        """Return the number of added close approaches whose NEO is still unknown."""
+        return len(self._unlinked)
+
+    def add_neos(self, neos):
+        """Add NEOs, and link them to the held back close approaches with their designations.
+
+        :param neos: A collection of `NearEarthObject`s whose designations are new.
+        """
+        neos = list(neos)
+        for neo in neos:
+            self._neos_by_designation[neo.designation] = neo
+            self._neo_positions[id(neo)] = len(self._neos)
+            self._neos.append(neo)
+            self._offsets.append(self._offsets[-1])
+            neo.approaches = []
+            neo._summary = ApproachSummary.of(neo.approaches)
+        self._prefixes = {
+            'designation': PrefixIndex(self._neos, attrgetter('designation')),
+            'name': PrefixIndex(self._neos, attrgetter('name')),
+        }
+        designations = {neo.designation for neo in neos}
+        orphans = [approach for approach in self._unlinked if approach._designation in designations]
+        self._unlinked = [approach for approach in self._unlinked
+                          if approach._designation not in designations]
+        self.apply_delta(added=orphans)
+
+    def compact(self):
+        """Rebuild the indexes over the close approaches that weren't removed.
+
+        Afterwards, the approaches are in the same order as before, without
+        those that were removed, and every cache is invalidated.
+        """
+        approaches = [self._approaches[position] for position in self._live()]
+        self._index(approaches, rollup=self._rollup is not None,
+                    spatial=self._kdtree is not None, bitmaps=self._bitmaps is not None)
+        self.invalidate_caches()
+
+    def _position_of(self, approach):
+        """Find the position of a close approach of this database, or None.
+
+        The approaches at the same time, indexed or added since, are found by
+        bisection.
+
+        :param approach: A `CloseApproach`.
+        :return: Its position, unless it was removed or it isn't in this database.
+        """
+        for timeline in (self._timelines[None], self._recent):
+            for i in range(bisect.bisect_left(timeline.keys, approach.time),
+                           bisect.bisect_right(timeline.keys, approach.time)):
+                position = timeline.positions[i]
+                if self._approaches[position] is approach and position not in self._tombstones:
+                    return position
+        return None
+
+    def _scan(self, filters):
+        """Generate the positions in the zone map blocks that might match some filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of candidate positions, in internal order.
+        """
+        for start, stop in self._zonemap.blocks(filters):
+            yield from range(start, stop)
+
+    @property
+    def scan_stats(self):
+        """Return statistics about the latest scan over the approach blocks.
+
+        :return: A dictionary with the number of `blocks` visited and the number of those `skipped`.
+        """
+        return {"blocks": self._zonemap.visited, "skipped": self._zonemap.skipped}
+
+    def similar(self, approach, k=10):
+        """Find the close approaches most similar to a given one.
+
+        Similarity is the Euclidean distance between the approaches' distance,
+        velocity, NEO diameter and time, each normalized by its range over the
+        database. The k-d tree is built on first use, if it wasn't already, and
+        the database is compacted first if approaches were added or removed.
+
+        :param approach: A `CloseApproach` of this database.
+        :param k: The number of similar close approaches to find.
+        :return: A list of at most `k` `(distance, CloseApproach)` tuples, most similar first.
+        """
+        if self._base < len(self._approaches) or self._tombstones:
+            self.compact()
+        if self._kdtree is None:
+            self._kdtree = KDTree(self._approaches)
+        position = self._position_of(approach)
+        if position is None:
+            raise ValueError(f"{approach!r} isn't an approach of this database.")
+        return [(distance, self._approaches[other])
+                for distance, other in self._kdtree.nearest(position, k)]
+
+    def _timeline(self, filters):
+        """Choose the narrowest time-ordered index for a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A tuple of the `SortedIndex` by time, and the filters it doesn't imply.
+        """
+        for f in filters:
+            if type(f) is HazardousFilter and f.op is operator.eq and f.value in (True, False):
+                return self._timelines[f.value], [g for g in filters if g is not f]
+        return self._timelines[None], list(filters)
+
+    def next_approaches(self, t, n, filters=()):
+        """Find the next close approaches strictly after a time that match some filters.
+
+        The time-ordered index is searched by bisection, and then walked forward
+        until `n` matches are found. A filter on the hazard flag selects an
+        index of only those NEOs' approaches, so it never needs to be walked.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, in time order.
+        """
+        timeline, remaining = self._timeline(filters)
+        results = []
+        for position in range(bisect.bisect_right(timeline.keys, t), len(timeline)):
+            if len(results) >= n:
+                break
+            if timeline.positions[position] in self._tombstones:
+                continue
+            approach = self._approaches[timeline.positions[position]]
+            if all(f(approach) for f in remaining):
+                results.append(approach)
+        added = []
+        for position in range(bisect.bisect_right(self._recent.keys, t), len(self._recent)):
+            if len(added) >= n:
+                break
+            approach = self._approaches[self._recent.positions[position]]
+            if self._recent.positions[position] not in self._tombstones \
+                    and all(f(approach) for f in filters):
+                added.append(approach)
+        if added:
+            results = sorted(results + added, key=attrgetter('time'))[:n]
+        return results
+
+    def prev_approaches(self, t, n, filters=()):
+        """Find the last close approaches strictly before a time that match some filters.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, latest first.
+        """
+        timeline, remaining = self._timeline(filters)
+        results = []
+        for position in range(bisect.bisect_left(timeline.keys, t) - 1, -1, -1):
+            if len(results) >= n:
+                break
+            if timeline.positions[position] in self._tombstones:
+                continue
+            approach = self._approaches[timeline.positions[position]]
+            if all(f(approach) for f in remaining):
+                results.append(approach)
+        added = []
+        for position in range(bisect.bisect_left(self._recent.keys, t) - 1, -1, -1):
+            if len(added) >= n:
+                break
+            approach = self._approaches[self._recent.positions[position]]
+            if self._recent.positions[position] not in self._tombstones \
+                    and all(f(approach) for f in filters):
+                added.append(approach)
+        if added:
+            results = sorted(results + added, key=attrgetter('time'), reverse=True)[:n]
+        return results
+
+    def aggregate(self, filters=(), group_by=(), field='distance', bins=None):
+        """Aggregate the close approaches that match a collection of filters.
+
+        The matching approaches are grouped by the given group-by keys (any of
+        'year', 'month', 'neo' and 'hazardous') and the chosen field
+        ('distance', 'velocity' or 'diameter') is summarized with a count, a
+        minimum, a maximum, a mean and optionally a histogram. The statistics
+        are computed in a single streaming pass over batches of the matches.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param group_by: A sequence of group-by key names.
+        :param field: The name of the field to aggregate.
+        :param bins: An optional ascending sequence of histogram bin edges.
+        :return: A dictionary mapping tuples of group-by values to `Aggregate`s.
+        """
+        return aggregate(self.query_batches(filters), group_by=group_by, field=field, bins=bins)
+
+
+def _merge_by_time(approaches, added):
+    """Merge close approaches into a list sorted by time, after those at the same time.
+
+    The added approaches are sorted once, and appended if they all come at or
+    after the last approach of the list, or else merged with it in one pass.
+
+    :param approaches: A list of `CloseApproach`es, sorted by time.
+    :param added: A list of `CloseApproach`es to merge in.
+    """
+    added = sorted(added, key=attrgetter('time'))
+    if not approaches or not added or approaches[-1].time <= added[0].time:
+        approaches.extend(added)
+    else:
+        approaches[:] = heapq.merge(approaches, added, key=attrgetter('time'))
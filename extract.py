@@ -1,32 +1,177 @@
 import csv
+import glob
+import heapq
 import json
+import os
+import re
+from operator import attrgetter
 
 from models import NearEarthObject, CloseApproach
+from streams import open_stream
+
+
+# The number of characters read from a close approach data file at a time, while streaming it.
+READ_SIZE = 1 << 16
+WHITESPACE = re.compile(r'[ \t\n\r]*')
 
 
 import csv
 from models import NearEarthObject
 
+def read_neo_rows(neo_csv_path):
+    """Read the raw rows of near-Earth object information from a CSV file.
+
+    :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+    :return: A list of the rows of values, without the header.
+    """
+    with open_stream(neo_csv_path, "r", newline="") as file:
+        reader = csv.reader(file)
+        next(reader)
+        return list(reader)
+
+def parse_neo(row):
+    """Create a `NearEarthObject` from one raw row of near-Earth object information.
+
+    :param row: One row of values, in the order of the CSV file's columns.
+    :return: A `NearEarthObject`.
+    """
+    if row[15]:
+        dbdiameter = float(row[15])
+    else:
+        dbdiameter = float('nan')
+    return NearEarthObject(designation = row[3],name=row[4],diameter=dbdiameter,hazardous=row[7] == "Y")
+
 def load_neos(neo_csv_path):
     """Read near-Earth object information from a CSV file.
 
     :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
     :return: A collection of `NearEarthObject`s.
     """
-    neos = [] 
+    return [parse_neo(row) for row in read_neo_rows(neo_csv_path)]
 
-    with open(neo_csv_path, "r") as file:
-        reader = csv.reader(file)
-        next(reader)
-        for row in reader:
-            if row[15]:
-                dbdiameter = float(row[15])
+def read_approach_rows(cad_json_path):
+    """Read the raw rows of close approach data from a JSON file.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :return: A tuple of the field names, and the list of rows of values.
+    """
+    with open_stream(cad_json_path, "r") as file:
+        data = json.load(file)
+    return data['fields'], data['data']
+
+class _JSONReader:
+    """Decode the values of a JSON document one at a time, reading its file a block at a time."""
+    def __init__(self, file):
+        self._file = file
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Read the next block of the file, and return whether there was one."""
+        block = self._file.read(READ_SIZE)
+        self._buffer = self._buffer[self._position:] + block
+        self._position = 0
+        self._eof = not block
+        return bool(block)
+
+    def peek(self):
+        """Skip whitespace, and return the next character ('' at the end of the file)."""
+        while True:
+            self._position = WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer) or not self._fill():
+                return self._buffer[self._position:self._position + 1]
+
+    def consume(self, char):
+        """Skip whitespace and the next character, which must be `char`."""
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in the JSON file, at {self.peek()!r}.")
+        self._position += 1
+
+    def skip(self, char):
+        """Skip whitespace and the next character if it's `char`."""
+        if self.peek() == char:
+            self._position += 1
+
+    def value(self):
+        """Decode the next value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may go on in the next block.
+            if end < len(self._buffer) or self._eof:
+                self._position = end
+                return value
+            self._fill()
+
+
+def stream_approach_rows(cad_json_path, header=None):
+    """Stream the raw rows of close approach data from a JSON file, as it's read.
+
+    The file is decoded a block at a time, and each row is generated as soon as
+    it's decoded, once the field names are known. The rows of a file whose
+    "fields" come before its "data", as in the responses of the SBDB close
+    approach API, are streamed without holding the file in memory. The rows
+    that come before the field names are held until they're read.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param header: An optional dictionary, filled with the other keys of the file as they're read.
+    :return: A generator of rows of values, in the order of `header['fields']`.
+    :raises KeyError: If the file has no field names or no data.
+    """
+    header = {} if header is None else header
+    held, has_data = [], False
+    with open_stream(cad_json_path, "r") as file:
+        reader = _JSONReader(file)
+        reader.consume('{')
+        while reader.peek() != '}':
+            key = reader.value()
+            reader.consume(':')
+            if key != 'data':
+                header[key] = reader.value()
+                if key == 'fields':
+                    yield from held
+                    held = []
             else:
-                dbdiameter = float('nan')
-            neo = NearEarthObject(designation = row[3],name=row[4],diameter=dbdiameter,hazardous=row[7] == "Y")
-            neos.append(neo)
+                has_data = True
+                reader.consume('[')
+                while reader.peek() != ']':
+                    row = reader.value()
+                    if 'fields' in header:
+                        yield row
+                    else:
+                        held.append(row)
+                    reader.skip(',')
+                reader.consume(']')
+            reader.skip(',')
+    if 'fields' not in header:
+        raise KeyError('fields')
+    if not has_data:
+        raise KeyError('data')
 
-    return neos
+def parse_approach(fields, entry):
+    """Create a `CloseApproach` from one raw row of close approach data.
+
+    :param fields: The field names of the close approach data.
+    :param entry: One row of values, in the order of the field names.
+    :return: A `CloseApproach`.
+    """
+    ca_data = dict(zip(fields, entry))
+    if float(ca_data['dist']):
+        float_dist = float(ca_data['dist'])
+    else:
+        float_dist=float('nan')
+    if float(ca_data['v_rel']):
+        float_v_rel = float(ca_data['v_rel'])
+    else:
+        float_v_rel=float('nan')
+    return CloseApproach(_designation = ca_data['des'],time=ca_data['cd'],distance= float_dist,velocity = float_v_rel)
 
 def load_approaches(cad_json_path):
     """Read close approach data from a JSON file.
@@ -34,21 +179,58 @@ def load_approaches(cad_json_path):
     :param cad_json_path: A path to a JSON file containing data about close approaches.
     :return: A collection of `CloseApproach`es.
     """
-    close_approaches = [] 
-    with open(cad_json_path, "r") as file:
-        data = json.load(file)
-        fields = data['fields']
-        for entry in data['data']:
-            ca_data = dict(zip(fields, entry))
-            if float(ca_data['dist']):
-                float_dist = float(ca_data['dist'])
-            else:
-                float_dist=float('nan')
-            if float(ca_data['v_rel']):
-                float_v_rel = float(ca_data['v_rel'])
-            else:
-                float_v_rel=float('nan')
-            ca = CloseApproach(_designation = ca_data['des'],time=ca_data['cd'],distance= float_dist,velocity = float_v_rel)
-            close_approaches.append(ca)
+    fields, rows = read_approach_rows(cad_json_path)
+    return [parse_approach(fields, entry) for entry in rows]
 
-    return close_approaches
+def expand_paths(paths):
+    """Expand the glob patterns among some paths of data files.
+
+    A path which names an existing file is kept as is, even if it looks like a
+    pattern. A pattern that matches no file is kept as is, too.
+
+    :param paths: A collection of paths or glob patterns.
+    :return: A list of paths, with the matches of each pattern sorted by name.
+    """
+    expanded = []
+    for path in paths:
+        matches = sorted(glob.glob(str(path))) if any(c in str(path) for c in '*?[') else []
+        if matches and not os.path.exists(path):
+            expanded.extend(type(path)(match) for match in matches)
+        else:
+            expanded.append(path)
+    return expanded
+
+def merge_approaches(streams):
+    """Merge streams of close approaches, each sorted by time, into one sorted by time.
+
+    The streams are merged lazily, by a k-way merge. Approaches with the same
+    designation and time, which overlapping data files share, are only kept
+    once - the first of them.
+
+    :param streams: A collection of iterables of `CloseApproach`es, each sorted by time.
+    :return: A stream of `CloseApproach`es, sorted by time.
+    """
+    time, seen = None, set()
+    for approach in heapq.merge(*streams, key=attrgetter('time')):
+        if approach.time != time:
+            time, seen = approach.time, set()
+        if approach._designation in seen:
+            continue
+        seen.add(approach._designation)
+        yield approach
+
+def load_merged_approaches(cad_json_paths):
+    """Read close approach data from several JSON files, and merge them by time.
+
+    The files are loaded one after the other, since parsing is CPU-bound and
+    threads wouldn't parse them any faster. Any file whose approaches aren't
+    sorted by time is sorted on its own before the merge.
+
+    :param cad_json_paths: A collection of paths to JSON files containing data about close approaches.
+    :return: A list of the distinct `CloseApproach`es of all of the files, sorted by time.
+    """
+    loaded = [load_approaches(path) for path in cad_json_paths]
+    for approaches in loaded:
+        if any(approaches[i].time > approaches[i + 1].time for i in range(len(approaches) - 1)):
+            approaches.sort(key=attrgetter('time'))
+    return list(merge_approaches(loaded))
@@ -1,3 +1,4 @@
+import itertools
 import operator
 
 class UnsupportedCriterionError(NotImplementedError):
@@ -85,18 +86,18 @@ class DiameterFilter(AttributeFilter):
     def get(cls, approach):        
         """
         :param approach: A `CloseApproach` on which to evaluate this filter.
-        :return: The diameter of the NEO associated with the approach.
+        :return: The diameter of the NEO associated with the approach, or NaN if it has none.
         """    
-        return approach.neo.diameter
+        return approach.neo.diameter if approach.neo is not None else float('nan')
 
 class HazardousFilter(AttributeFilter):
     @classmethod
     def get(cls, approach):
         """
         :param approach: A `CloseApproach` on which to evaluate this filter.
-        :return: The hazardous of the NEO associated with the approach.
+        :return: The hazardous of the NEO associated with the approach, or None if it has none.
         """  
-        return approach.neo.hazardous
+        return approach.neo.hazardous if approach.neo is not None else None
 
 def create_filters(
         date=None, start_date=None, end_date=None,
@@ -167,6 +168,46 @@ def create_filters(
 
     return filters
 
+def _implies(f, g):
+    """Return whether every value that satisfies filter `f` also satisfies filter `g`."""
+    if type(f) is not type(g):
+        return False
+    if g.op is operator.eq:
+        return f.op is operator.eq and f.value == g.value
+    if g.op in (operator.ge, operator.gt):
+        return f.op in (operator.eq, operator.ge, operator.gt) and (
+            f.value > g.value or (f.value == g.value and (g.op is operator.ge or f.op is operator.gt)))
+    if g.op in (operator.le, operator.lt):
+        return f.op in (operator.eq, operator.le, operator.lt) and (
+            f.value < g.value or (f.value == g.value and (g.op is operator.le or f.op is operator.lt)))
+    return False
+
+
+def narrows(filters, previous):
+    """Return whether a collection of filters only matches what previous filters matched.
+
+    This holds when each previous filter is implied by one of the filters -
+    for example, when filters were only added, or a date range was tightened.
+    Every match of `filters` is then among the matches of `previous`.
+
+    :param filters: A collection of filters capturing user-specified criteria.
+    :param previous: A previous collection of filters.
+    :return: Whether the matches of `filters` are a subset of the matches of `previous`.
+    """
+    return all(any(_implies(f, g) for f in filters) for g in previous)
+
+
+def batched(iterator, size):
+    """Generate lists of consecutive elements from an iterator.
+
+    :param iterator: An iterable object.
+    :param size: The number of elements in each list, except maybe the last one.
+    :return: A stream of non-empty lists.
+    """
+    iterator = iter(iterator)
+    return iter(lambda: list(itertools.islice(iterator, size)), [])
+
+
 def limit(iterator, n=None):
     """Returns the first n elements from an iterator.
 
@@ -0,0 +1,768 @@
+"""Auxiliary index structures that help `NEODatabase` answer queries quickly.
+
+Every index is built once over the positions of the close approaches in the
+database, and answers questions about those positions without having to test
+every close approach against every filter.
+
+A `SortedIndex` keeps the positions of the close approaches sorted by one
+attribute (the one fetched by the `get` classmethod of a filter class), so that
+the approaches matching any range of that attribute form one contiguous span
+which can be found by binary search.
+
+A `RollupCube` pre-aggregates the positions of the close approaches into cells
+keyed on coarse dimensions - year, hazardous, distance bucket and diameter
+bucket - so that counts over whole cells are answered without any scan.
+
+A `ZoneMap` splits the positions of the close approaches into fixed-size blocks
+and records the minimum and maximum of a few attributes within each block, so
+that blocks which can't hold any match are skipped by a scan.
+
+A `KDTree` indexes the close approaches as points in the normalized space of
+their distance, velocity, diameter and time, to find candidates for queries
+constraining several of those attributes at once, and nearest neighbors.
+
+A `BitmapIndex` keeps a bitmap of approach positions for each hazard flag and
+each bucket of the diameter, distance and velocity, so that the positions
+matching a filter are combined with those matching other filters by bitwise
+AND. A `BitmapCache` keeps the bitmaps of recently used filters for reuse, and
+a `ResultCache` keeps the matching positions of recent queries.
+
+A `PrefixIndex` keeps the NEOs sorted by the case-folded value of a string
+attribute, such as the name, so that the NEOs whose value starts with a prefix
+form one contiguous span which can be found by binary search.
+"""
+import bisect
+import collections
+import datetime
+import heapq
+import math
+import operator
+from array import array
+
+from filters import DateFilter, DiameterFilter, DistanceFilter, HazardousFilter, VelocityFilter
+
+
+# How much of a range of attribute values satisfies a filter.
+NONE, SOME, ALL = 0, 1, 2
+
+# The default edges of the distance (in au) and diameter (in km) buckets of a `RollupCube`.
+DISTANCE_BUCKETS = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5)
+DIAMETER_BUCKETS = (0.0, 0.1, 0.14, 0.5, 1.0, 5.0)
+# The default edges of the velocity (in km/s) buckets of a `BitmapIndex`.
+VELOCITY_BUCKETS = (0.0, 5.0, 10.0, 15.0, 20.0, 30.0, 50.0)
+
+# The default number of approaches in each block of a `ZoneMap`.
+BLOCK_SIZE = 1024
+
+# The default memory cap of a `BitmapCache`, in megabytes.
+BITMAP_CACHE_MB = 64
+
+# The default number of query results kept by a `ResultCache`.
+RESULT_CACHE_SIZE = 128
+
+
+def coverage(f, low, high, low_inclusive=True, high_inclusive=True):
+    """Determine how much of a range of attribute values satisfies a filter.
+
+    The range spans from `low` to `high`, and each bound is part of the range
+    unless it's marked as exclusive. A range whose bounds are None holds no
+    values at all.
+
+    :param f: A filter comparing an attribute to a reference value.
+    :param low: The lower bound of the range.
+    :param high: The upper bound of the range.
+    :param low_inclusive: Whether the lower bound is part of the range.
+    :param high_inclusive: Whether the upper bound is part of the range.
+    :return: `ALL` if every value satisfies the filter, `NONE` if none does, or `SOME`.
+    """
+    if low is None or high is None:
+        return NONE
+    value = f.value
+    if f.op is operator.eq:
+        if value < low or value > high or (value == low and not low_inclusive) \
+                or (value == high and not high_inclusive):
+            return NONE
+        return ALL if low == high else SOME
+    if f.op is operator.ge or f.op is operator.gt:
+        if high < value or (high == value and not (high_inclusive and f.op is operator.ge)):
+            return NONE
+        if low > value or (low == value and (f.op is operator.ge or not low_inclusive)):
+            return ALL
+        return SOME
+    if f.op is operator.le or f.op is operator.lt:
+        if low > value or (low == value and not (low_inclusive and f.op is operator.le)):
+            return NONE
+        if high < value or (high == value and (f.op is operator.le or not high_inclusive)):
+            return ALL
+        return SOME
+    return SOME
+
+
+def bucket_of(edges, value):
+    """Return the bucket of ascending edges that holds a value, or -1 for NaN.
+
+    Bucket `2 * i + 1` holds values equal to the `i`th edge, and bucket `2 * i`
+    holds values strictly between the `(i - 1)`th and `i`th edges, so that both
+    minimum and maximum filters on an edge align with bucket boundaries.
+    """
+    if math.isnan(value):
+        return -1
+    i = bisect.bisect_left(edges, value)
+    if i < len(edges) and edges[i] == value:
+        return 2 * i + 1
+    return 2 * i
+
+
+def bucket_bounds(edges, bucket):
+    """Return the `(low, high, low_inclusive, high_inclusive)` range of a bucket of `bucket_of`."""
+    if bucket == -1:
+        return None, None, True, True
+    i, point = divmod(bucket, 2)
+    if point:
+        return edges[i], edges[i], True, True
+    low = edges[i - 1] if i > 0 else -math.inf
+    high = edges[i] if i < len(edges) else math.inf
+    return low, high, False, False
+
+
+def to_bitmap(positions):
+    """Return a bitmap, as an int, in which the bits of some positions are set.
+
+    :param positions: An iterable of non-negative approach positions.
+    :return: An int whose `i`th bit is set for each position `i`.
+    """
+    bits = bytearray()
+    for position in positions:
+        byte = position >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte + 1 - len(bits)))
+        bits[byte] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bitmap_positions(bitmap):
+    """Generate the positions of the set bits of a bitmap, in ascending order."""
+    # Reversed, the binary digits are ordered from the lowest bit up.
+    digits = bin(bitmap)[:1:-1]
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def popcount(bitmap):
+    """Return the number of set bits of a bitmap."""
+    return bin(bitmap).count('1')
+
+
+class SortedIndex:
+    """The positions of close approaches, sorted by one attribute.
+
+    Approaches whose attribute is NaN are left out of the index, since they
+    can't satisfy any comparison against a reference value.
+    """
+    def __init__(self, approaches, get, where=None):
+        """Create a new `SortedIndex`.
+
+        :param approaches: A sequence of `CloseApproach`es.
+        :param get: A function fetching the indexed attribute from a `CloseApproach`.
+        :param where: An optional predicate choosing which `CloseApproach`es to index.
+        """
+        pairs = []
+        for position, approach in enumerate(approaches):
+            if where is not None and not where(approach):
+                continue
+            value = get(approach)
+            # NaN is the only value which isn't equal to itself.
+            if value == value:
+                pairs.append((value, position))
+        pairs.sort()
+        self.keys = [value for value, _ in pairs]
+        self.positions = array('l', (position for _, position in pairs))
+
+    def __len__(self):
+        """Return the number of indexed approaches."""
+        return len(self.keys)
+
+    def insert(self, value, position):
+        """Index one more approach, after those with the same value.
+
+        Inserting values in ascending order only appends to the index.
+
+        :param value: The indexed attribute of the approach.
+        :param position: The position of the approach.
+        """
+        if value == value:
+            i = bisect.bisect_right(self.keys, value)
+            self.keys.insert(i, value)
+            self.positions.insert(i, position)
+
+    def span(self, filters):
+        """Find the span of the index that satisfies every one of some filters.
+
+        Each filter must compare the indexed attribute using one of the
+        `operator.eq`, `operator.ge`, `operator.gt`, `operator.le` or
+        `operator.lt` comparators.
+
+        :param filters: A collection of filters on the indexed attribute.
+        :return: A `(start, stop)` tuple of the matching span, or None if a comparator is unsupported.
+        """
+        start, stop = 0, len(self.keys)
+        for f in filters:
+            if f.op is operator.eq:
+                start = max(start, bisect.bisect_left(self.keys, f.value))
+                stop = min(stop, bisect.bisect_right(self.keys, f.value))
+            elif f.op is operator.ge:
+                start = max(start, bisect.bisect_left(self.keys, f.value))
+            elif f.op is operator.gt:
+                start = max(start, bisect.bisect_right(self.keys, f.value))
+            elif f.op is operator.le:
+                stop = min(stop, bisect.bisect_right(self.keys, f.value))
+            elif f.op is operator.lt:
+                stop = min(stop, bisect.bisect_left(self.keys, f.value))
+            else:
+                return None
+        return start, max(start, stop)
+
+
+class RollupCube:
+    """Close approach positions pre-aggregated by year, hazard, distance and diameter.
+
+    Each cell of the cube holds the positions of the approaches in one year, of
+    NEOs with one hazard flag, in one distance bucket and in one diameter
+    bucket. The buckets of an attribute are the open intervals between its
+    bucket edges and the edges themselves, so that both minimum and maximum
+    filters on an edge align with bucket boundaries. An approach whose distance
+    or NEO diameter is NaN falls into a bucket of its own, which no filter on
+    that attribute matches. So does an approach without an NEO, whose hazard
+    flag is None.
+    """
+    # The filter classes on whose attributes the cube has dimensions.
+    DIMENSIONS = (DateFilter, HazardousFilter, DistanceFilter, DiameterFilter)
+
+    def __init__(self, approaches, distance_buckets=DISTANCE_BUCKETS,
+                 diameter_buckets=DIAMETER_BUCKETS):
+        """Create a new `RollupCube`.
+
+        :param approaches: A sequence of linked `CloseApproach`es.
+        :param distance_buckets: Ascending edges of the distance buckets, in au.
+        :param diameter_buckets: Ascending edges of the diameter buckets, in km.
+        """
+        self.approaches = approaches
+        self.distance_buckets = tuple(distance_buckets)
+        self.diameter_buckets = tuple(diameter_buckets)
+        self.cells = {}
+        for position in range(len(approaches)):
+            self.add(position)
+        # The number of approaches scanned by the latest count.
+        self.scanned = 0
+
+    def add(self, position):
+        """Add the approach at one position of the sequence of approaches to its cell.
+
+        :param position: The position of a `CloseApproach`, linked to its NEO or not.
+        """
+        approach = self.approaches[position]
+        key = (approach.time.year, HazardousFilter.get(approach),
+               bucket_of(self.distance_buckets, approach.distance),
+               bucket_of(self.diameter_buckets, DiameterFilter.get(approach)))
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = array('l')
+        cell.append(position)
+
+    def _coverage(self, key, filters):
+        """Determine how much of one cell satisfies every one of some filters."""
+        year, hazardous, distance, diameter = key
+        ranges = {
+            DateFilter: (datetime.date(year, 1, 1), datetime.date(year, 12, 31)),
+            HazardousFilter: (hazardous, hazardous),
+            DistanceFilter: bucket_bounds(self.distance_buckets, distance),
+            DiameterFilter: bucket_bounds(self.diameter_buckets, diameter),
+        }
+        covered = ALL
+        for f in filters:
+            covered = min(covered, coverage(f, *ranges[type(f)]))
+            if covered == NONE:
+                break
+        return covered
+
+    def supports(self, filters):
+        """Return whether every one of some filters is on a dimension of the cube."""
+        return all(type(f) in self.DIMENSIONS for f in filters)
+
+    def count(self, filters):
+        """Count the approaches that match a collection of filters on the cube's dimensions.
+
+        Cells which entirely satisfy the filters are counted at once, and only
+        the approaches in cells at the edges of the filtered ranges are scanned.
+
+        :param filters: A collection of filters on the cube's dimensions.
+        :return: The number of matching close approaches.
+        """
+        total = 0
+        self.scanned = 0
+        for key, positions in self.cells.items():
+            covered = self._coverage(key, filters)
+            if covered == ALL:
+                total += len(positions)
+            elif covered == SOME:
+                self.scanned += len(positions)
+                total += sum(1 for position in positions
+                             if all(f(self.approaches[position]) for f in filters))
+        return total
+
+
+class ZoneMap:
+    """Per-block minima and maxima of the attributes of close approaches.
+
+    The approaches are split into consecutive blocks of `block_size` positions.
+    For each block and each of the date, distance, velocity and diameter, the
+    zone map records the smallest and largest value in the block (ignoring
+    NaN). Since the approaches are largely sorted by time, blocks are narrow
+    in time, and date filters in particular skip most of them.
+    """
+    # The filter classes on whose attributes the zone map records ranges.
+    ATTRIBUTES = (DateFilter, DistanceFilter, VelocityFilter, DiameterFilter)
+
+    def __init__(self, approaches, block_size=BLOCK_SIZE):
+        """Create a new `ZoneMap`.
+
+        :param approaches: A sequence of `CloseApproach`es. Those without an NEO have no diameter.
+        :param block_size: The number of approaches in each block.
+        """
+        self.size = len(approaches)
+        self.block_size = block_size
+        self.zones = {cls: [] for cls in self.ATTRIBUTES}
+        for start in range(0, self.size, block_size):
+            block = approaches[start:start + block_size]
+            for cls, zones in self.zones.items():
+                values = [value for value in map(cls.get, block) if value == value]
+                zones.append((min(values), max(values)) if values else (None, None))
+        # The number of blocks skipped and the total number of blocks visited by the latest scan.
+        self.skipped = 0
+        self.visited = 0
+
+    def __len__(self):
+        """Return the number of blocks."""
+        return len(self.zones[DateFilter])
+
+    def blocks(self, filters):
+        """Generate the blocks that might hold approaches matching some filters.
+
+        Filters on attributes without zones never cause a block to be skipped.
+        While the stream is consumed, `skipped` and `visited` count the blocks.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of `(start, stop)` position ranges of the blocks.
+        """
+        zoned = [(f, self.zones[type(f)]) for f in filters if type(f) in self.zones]
+        self.skipped = 0
+        self.visited = 0
+        for block in range(len(self)):
+            self.visited += 1
+            if any(coverage(f, *zones[block]) == NONE for f, zones in zoned):
+                self.skipped += 1
+                continue
+            start = block * self.block_size
+            yield start, min(start + self.block_size, self.size)
+
+
+class BitmapIndex:
+    """Bitmaps of close approach positions by hazard flag and by attribute bucket.
+
+    For the hazard flag, there is one bitmap per flag. For each of the
+    diameter, distance and velocity, there is one bitmap per bucket of the
+    attribute, with buckets laid out as by `bucket_of`. The bitmap of a filter
+    is the union of the bitmaps of the buckets it entirely satisfies, and of
+    the positions in the buckets it partially satisfies that match it - so it's
+    exact, and never needs to be rechecked.
+    """
+    def __init__(self, approaches, diameter_buckets=DIAMETER_BUCKETS,
+                 distance_buckets=DISTANCE_BUCKETS, velocity_buckets=VELOCITY_BUCKETS):
+        """Create a new `BitmapIndex`.
+
+        :param approaches: A sequence of `CloseApproach`es. Those without an NEO have a hazard
+                           flag of None and a NaN diameter, which no filter matches.
+        :param diameter_buckets: Ascending edges of the diameter buckets, in km.
+        :param distance_buckets: Ascending edges of the distance buckets, in au.
+        :param velocity_buckets: Ascending edges of the velocity buckets, in km/s.
+        """
+        self.approaches = approaches
+        # The bucket edges of each filter class, or None for the categorical hazard flag.
+        self.edges = {
+            HazardousFilter: None,
+            DiameterFilter: tuple(diameter_buckets),
+            DistanceFilter: tuple(distance_buckets),
+            VelocityFilter: tuple(velocity_buckets),
+        }
+        self.positions = {cls: {} for cls in self.edges}
+        for position, approach in enumerate(approaches):
+            for cls, edges in self.edges.items():
+                value = cls.get(approach)
+                key = value if edges is None else bucket_of(edges, value)
+                positions = self.positions[cls].get(key)
+                if positions is None:
+                    positions = self.positions[cls][key] = array('l')
+                positions.append(position)
+        self.bitmaps = {cls: {key: to_bitmap(positions) for key, positions in buckets.items()}
+                        for cls, buckets in self.positions.items()}
+
+    def supports(self, f):
+        """Return whether a filter is on an attribute with bitmaps."""
+        return type(f) in self.edges
+
+    def bitmap(self, f):
+        """Compute the exact bitmap of the approach positions that match a filter.
+
+        :param f: A filter on an attribute with bitmaps.
+        :return: A bitmap, as an int, of the positions of the matching approaches.
+        """
+        edges = self.edges[type(f)]
+        result = 0
+        for key, positions in self.positions[type(f)].items():
+            bounds = (key, key) if edges is None else bucket_bounds(edges, key)
+            covered = coverage(f, *bounds)
+            if covered == ALL:
+                result |= self.bitmaps[type(f)][key]
+            elif covered == SOME:
+                result |= to_bitmap(position for position in positions
+                                    if f(self.approaches[position]))
+        return result
+
+
+class BitmapCache:
+    """A least-recently-used cache of the bitmaps of filters, bounded by memory.
+
+    Bitmaps are keyed by the class, comparator and reference value of their
+    filter, so that a filter shared by several queries is only computed once.
+    """
+    def __init__(self, max_mb=BITMAP_CACHE_MB):
+        """Create a new `BitmapCache`.
+
+        :param max_mb: The memory cap of the cached bitmaps, in megabytes.
+        """
+        self.max_bytes = max_mb * 1024 * 1024
+        self._bitmaps = collections.OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        """Return the number of cached bitmaps."""
+        return len(self._bitmaps)
+
+    @staticmethod
+    def key(f):
+        """Return the cache key of a filter."""
+        return type(f), f.op, f.value
+
+    def get(self, f, compute):
+        """Return the bitmap of a filter, computing and caching it if necessary.
+
+        :param f: A filter.
+        :param compute: A function of the filter that returns its bitmap, or None if it has none.
+        :return: The bitmap of the filter, or None.
+        """
+        key = self.key(f)
+        if key in self._bitmaps:
+            self.hits += 1
+            self._bitmaps.move_to_end(key)
+            return self._bitmaps[key][0]
+        self.misses += 1
+        bitmap = compute(f)
+        if bitmap is None:
+            return None
+        size = (bitmap.bit_length() + 7) // 8
+        if size <= self.max_bytes:
+            self._bitmaps[key] = (bitmap, size)
+            self.used += size
+            while self.used > self.max_bytes:
+                _, (_, evicted) = self._bitmaps.popitem(last=False)
+                self.used -= evicted
+                self.evictions += 1
+        return bitmap
+
+    def clear(self):
+        """Drop every cached bitmap."""
+        self._bitmaps.clear()
+        self.used = 0
+
+    @property
+    def stats(self):
+        """Return the numbers of hits, misses and evictions, and the size of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bitmaps": len(self), "bytes": self.used}
+
+
+class ResultCache:
+    """A least-recently-used cache of the matching positions of queries.
+
+    Results are keyed by a normalized form of their collection of filters, in
+    which the order and repetition of the filters don't matter. The positions
+    are kept in compact typed arrays rather than as lists of objects.
+    """
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        """Create a new `ResultCache`.
+
+        :param size: The maximum number of cached results, or 0 to cache nothing.
+        """
+        self.size = size
+        self._results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Return the number of cached results."""
+        return len(self._results)
+
+    @staticmethod
+    def key(filters):
+        """Return the normalized cache key of a collection of filters."""
+        return tuple(sorted({(type(f).__name__, f.op.__name__, repr(f.value)) for f in filters}))
+
+    def get(self, key):
+        """Return the cached positions of the matches of a key, or None.
+
+        :param key: A key returned by `key`.
+        :return: An `array` of the matching positions in internal order, or None.
+        """
+        positions = self._results.get(key)
+        if positions is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return positions
+
+    def put(self, key, positions):
+        """Cache the positions of the matches of a key, evicting the least recently used result.
+
+        :param key: A key returned by `key`.
+        :param positions: An `array` of the matching positions in internal order.
+        """
+        if self.size <= 0:
+            return
+        self._results[key] = positions
+        self._results.move_to_end(key)
+        while len(self._results) > self.size:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result."""
+        self._results.clear()
+
+    @property
+    def stats(self):
+        """Return the numbers of hits and misses, and the number of cached results."""
+        return {"hits": self.hits, "misses": self.misses, "results": len(self)}
+
+
+class KDTree:
+    """A k-d tree over the distance, velocity, diameter and time of close approaches.
+
+    Each coordinate is normalized to the range [0, 1] by the minimum and
+    maximum of its attribute, so that every attribute weighs the same in
+    nearest-neighbor searches. A NaN attribute is placed at -1, below every
+    known value. Leaves hold up to `leaf_size` approach positions.
+    """
+    # The filter classes whose attributes are the dimensions of the tree, in order.
+    DIMENSIONS = (DistanceFilter, VelocityFilter, DiameterFilter, DateFilter)
+    # The coordinate of a NaN attribute.
+    MISSING = -1.0
+    # The epoch of the time dimension.
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, approaches, leaf_size=32):
+        """Create a new `KDTree`.
+
+        :param approaches: A sequence of linked `CloseApproach`es.
+        :param leaf_size: The maximum number of approach positions in a leaf.
+        """
+        columns = [
+            [approach.distance for approach in approaches],
+            [approach.velocity for approach in approaches],
+            [approach.neo.diameter if approach.neo else math.nan for approach in approaches],
+            [self._days(approach.time) for approach in approaches],
+        ]
+        self.scales = []
+        for column in columns:
+            known = [value for value in column if value == value]
+            low = min(known) if known else 0.0
+            span = (max(known) - low) if known else 0.0
+            self.scales.append((low, span or 1.0))
+        self.points = [tuple(self._normalize(axis, column[position])
+                             for axis, column in enumerate(columns))
+                       for position in range(len(approaches))]
+        self.leaf_size = leaf_size
+
+        # Nodes are stored in parallel lists; a leaf has an axis of -1.
+        self._axis, self._split, self._left, self._right, self._leaves = [], [], [], [], []
+        self._root = self._build(list(range(len(approaches))), 0)
+
+    @classmethod
+    def _days(cls, time):
+        """Return a naive `datetime` as fractional days since the epoch."""
+        return (time - cls.EPOCH) / datetime.timedelta(days=1)
+
+    def _normalize(self, axis, value):
+        """Return the normalized coordinate of an attribute value along one axis."""
+        if value != value:
+            return self.MISSING
+        low, span = self.scales[axis]
+        return (value - low) / span
+
+    def _build(self, positions, depth):
+        """Build the subtree over some positions, and return the index of its root node."""
+        node = len(self._axis)
+        self._axis.append(-1)
+        self._split.append(0.0)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._leaves.append(None)
+        if len(positions) <= self.leaf_size:
+            self._leaves[node] = array('l', positions)
+            return node
+
+        axis = depth % len(self.DIMENSIONS)
+        positions.sort(key=lambda position: self.points[position][axis])
+        middle = len(positions) // 2
+        self._axis[node] = axis
+        self._split[node] = self.points[positions[middle]][axis]
+        self._left[node] = self._build(positions[:middle], depth + 1)
+        self._right[node] = self._build(positions[middle:], depth + 1)
+        return node
+
+    def supports(self, filters):
+        """Return whether some filters constrain at least two dimensions of the tree."""
+        return len({type(f) for f in filters if type(f) in self.DIMENSIONS}) >= 2
+
+    def _box(self, filters):
+        """Return the normalized `(low, high)` bounds that contain every match of the filters.
+
+        The bounds are closed and may be loose - candidates are rechecked.
+        """
+        lows = [-math.inf] * len(self.DIMENSIONS)
+        highs = [math.inf] * len(self.DIMENSIONS)
+        for f in filters:
+            if type(f) not in self.DIMENSIONS:
+                continue
+            axis = self.DIMENSIONS.index(type(f))
+            if type(f) is DateFilter:
+                day = datetime.datetime.combine(f.value, datetime.time())
+                low, high = self._days(day), self._days(day + datetime.timedelta(days=1))
+            else:
+                low = high = f.value
+            if f.op in (operator.eq, operator.ge, operator.gt):
+                lows[axis] = max(lows[axis], self._normalize(axis, low))
+            if f.op in (operator.eq, operator.le, operator.lt):
+                highs[axis] = min(highs[axis], self._normalize(axis, high))
+        return lows, highs
+
+    def box(self, filters):
+        """Find candidate positions for filters on the dimensions of the tree.
+
+        Every position whose approach matches all of the filters is found, but
+        others might be as well, so the filters must be rechecked.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of candidate positions, in no particular order.
+        """
+        lows, highs = self._box(filters)
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            axis = self._axis[node]
+            if axis == -1:
+                found.extend(position for position in self._leaves[node]
+                             if all(low <= coordinate <= high for low, coordinate, high
+                                    in zip(lows, self.points[position], highs)))
+                continue
+            # Points equal to the split value may lie on either side of it.
+            if lows[axis] <= self._split[node]:
+                stack.append(self._left[node])
+            if highs[axis] >= self._split[node]:
+                stack.append(self._right[node])
+        return found
+
+    def nearest(self, position, k):
+        """Find the `k` positions whose points are nearest to that of a given position.
+
+        The given position itself is excluded. Distances are Euclidean in the
+        normalized space.
+
+        :param position: The position of the approach whose neighbors to find.
+        :param k: The number of neighbors to find.
+        :return: A list of `(distance, position)` tuples, nearest first.
+        """
+        target = self.points[position]
+        # A max-heap (by negated squared distance) of the best candidates so far.
+        best = []
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            axis = self._axis[node]
+            if axis == -1:
+                for other in self._leaves[node]:
+                    if other == position:
+                        continue
+                    squared = sum((a - b) ** 2 for a, b in zip(target, self.points[other]))
+                    if len(best) < k:
+                        heapq.heappush(best, (-squared, other))
+                    elif squared < -best[0][0]:
+                        heapq.heapreplace(best, (-squared, other))
+                continue
+            difference = target[axis] - self._split[node]
+            near, far = (self._left[node], self._right[node]) if difference < 0 \
+                else (self._right[node], self._left[node])
+            # Visit the near side first, so push it last.
+            stack.append((far, max(bound, difference * difference)))
+            stack.append((near, bound))
+        return [(math.sqrt(-squared), other) for squared, other in sorted(best, reverse=True)]
+
+
+class PrefixIndex:
+    """An index of NEOs by the case-folded prefixes of a string attribute.
+
+    NEOs whose attribute is None are left out of the index.
+    """
+    def __init__(self, neos, get):
+        """Create a new `PrefixIndex`.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param get: A function of an NEO that returns the string to index, or None.
+        """
+        entries = sorted((value.casefold(), value, i) for i, value in
+                         enumerate(map(get, neos)) if value is not None)
+        self.keys = [key for key, _, _ in entries]
+        self.values = [value for _, value, _ in entries]
+        self.neos = [neos[i] for _, _, i in entries]
+
+    def __len__(self):
+        """Return the number of indexed NEOs."""
+        return len(self.keys)
+
+    def span(self, prefix):
+        """Return the `(start, stop)` span of the keys that start with a prefix, ignoring case."""
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self.keys, prefix)
+        # Every key that starts with the prefix sorts before the prefix followed by
+        # the largest code point.
+        stop = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return start, stop
+
+    def search(self, prefix, limit=None):
+        """Find the NEOs whose attribute starts with a prefix, ignoring case.
+
+        :param prefix: The prefix to search for.
+        :param limit: The maximum number of NEOs to return, or None for all of them.
+        :return: A list of `(value, NearEarthObject)` tuples, sorted by value.
+        """
+        start, stop = self.span(prefix)
+        if limit is not None:
+            stop = min(stop, start + limit)
+        return list(zip(self.values[start:stop], self.neos[start:stop]))
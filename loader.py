@@ -0,0 +1,239 @@
+"""Load an NEO database in a background thread, so that it's usable while loading.
+
+A `BackgroundNEODatabase` offers the same interface as an `NEODatabase`, but
+returns immediately and loads the data files in a daemon thread: first the
+NEOs, and then the close approaches, one chunk at a time. The close approach
+file is streamed, so the first chunk is published as soon as it's read, rather
+than once the whole file is decoded (unless its "fields" come after its "data").
+
+- NEOs are looked up (by designation, by name or by prefix) as soon as the NEO
+  file is loaded, although their close approaches are only linked once the
+  close approach file is entirely loaded.
+- Since the close approach data file is sorted by time, the approaches loaded
+  so far cover every day before the latest loaded approach's day. A query whose
+  date range ends before that watermark is answered from the loaded approaches.
+- Anything else waits until the whole database is built.
+"""
+import operator
+import threading
+
+from aggregate import aggregate
+from columnar import columns_of
+from database import BATCH_SIZE, NEODatabase
+from extract import load_neos, parse_approach, stream_approach_rows
+from filters import DateFilter, batched
+
+
+# The number of close approaches parsed between two updates of the progress and the watermark.
+CHUNK_SIZE = 10000
+
+
+class BackgroundNEODatabase:
+    """A database of NEOs and their close approaches, loaded in a background thread."""
+    # Similarity search waits until the whole database is built.
+    supports_similar = True
+
+    def __init__(self, neo_csv_path, cad_json_path, chunk_size=CHUNK_SIZE, **options):
+        """Create a new `BackgroundNEODatabase`.
+
+        Nothing is loaded until the database is `start`ed.
+
+        :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+        :param cad_json_path: A path to a JSON file containing data about close approaches.
+        :param chunk_size: The number of close approaches parsed between two progress updates.
+        :param options: Keyword arguments passed to the `NEODatabase` constructor.
+        """
+        self._neo_csv_path = neo_csv_path
+        self._cad_json_path = cad_json_path
+        self._chunk_size = chunk_size
+        self._options = options
+
+        # The NEOs (without their close approaches), once loaded.
+        self._neos = None
+        # The close approaches loaded so far, and the latest time among them.
+        self._approaches = []
+        self._watermark = None
+        # Whether the close approaches loaded so far are sorted by time.
+        self._ordered = True
+        self._total = None
+        # The whole database, once built, or the error that stopped loading.
+        self._database = None
+        self._error = None
+
+        self.neos_loaded = threading.Event()
+        self.loaded = threading.Event()
+        self._thread = threading.Thread(target=self._load, name='neo-loader', daemon=True)
+
+    def start(self):
+        """Start loading the data files in the background, and return this database."""
+        self._thread.start()
+        return self
+
+    def _load(self):
+        """Load the data files and build the database, in the background thread."""
+        try:
+            neos = load_neos(self._neo_csv_path)
+            self._neos = NEODatabase(neos, [])
+            self.neos_loaded.set()
+
+            header = {}
+            for rows in batched(stream_approach_rows(self._cad_json_path, header), self._chunk_size):
+                if self._total is None and 'count' in header:
+                    self._total = int(header['count'])
+                chunk = [parse_approach(header['fields'], row) for row in rows]
+                watermark = self._watermark
+                for approach in chunk:
+                    approach.neo = self._neos.get_neo_by_designation(approach._designation)
+                    if watermark is not None and approach.time < watermark:
+                        self._ordered = False
+                    else:
+                        watermark = approach.time
+                # Publish the chunk before advancing the watermark past it.
+                self._approaches.extend(chunk)
+                self._watermark = watermark
+            self._total = len(self._approaches)
+            self._database = NEODatabase(neos, self._approaches, **self._options)
+        except Exception as err:
+            self._error = err
+        finally:
+            self.neos_loaded.set()
+            self.loaded.set()
+
+    @property
+    def is_loaded(self):
+        """Return whether the whole database is built."""
+        return self.loaded.is_set()
+
+    @property
+    def supports_positions(self):
+        """Return whether positions of close approaches are known, once the whole database is built."""
+        return self.is_loaded and self._database is not None
+
+    @property
+    def progress(self):
+        """Return the numbers of NEOs and close approaches loaded, and the total of approaches.
+
+        :return: A tuple of the number of loaded NEOs, of loaded close approaches, and the
+                 number of close approaches in the file (or None, until its count is read).
+        """
+        neos = len(self._neos._neos) if self._neos is not None else 0
+        return neos, len(self._approaches), self._total
+
+    @property
+    def watermark(self):
+        """Return the time up to which the loaded close approaches cover every day, or None."""
+        return self._watermark if self._ordered else None
+
+    def _wait(self):
+        """Wait until the whole database is built, and return it."""
+        self.loaded.wait()
+        if self._error is not None:
+            raise self._error
+        return self._database
+
+    def _neo_index(self):
+        """Wait until the NEOs are loaded, and return a database to look them up."""
+        if self._database is not None:
+            return self._database
+        self.neos_loaded.wait()
+        if self._error is not None:
+            raise self._error
+        return self._database or self._neos
+
+    def covers(self, filters):
+        """Return whether the close approaches loaded so far hold every match of some filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: Whether the filters' date range ends before the watermark.
+        """
+        if self.is_loaded:
+            return True
+        watermark = self.watermark
+        if watermark is None:
+            return False
+        # Every approach of a day before the watermark's day is loaded.
+        day = watermark.date()
+        return any(type(f) is DateFilter and ((f.op in (operator.eq, operator.le) and f.value < day)
+                                              or (f.op is operator.lt and f.value <= day))
+                   for f in filters)
+
+    def get_neo_by_designation(self, designation):
+        """Find and return an NEO by its primary designation, as soon as the NEOs are loaded."""
+        return self._neo_index().get_neo_by_designation(designation)
+
+    def get_neo_by_name(self, name):
+        """Find and return an NEO by its name, as soon as the NEOs are loaded."""
+        return self._neo_index().get_neo_by_name(name)
+
+    def get_neos_by_designations(self, designations):
+        """Find many NEOs by their primary designations, as soon as the NEOs are loaded."""
+        return self._neo_index().get_neos_by_designations(designations)
+
+    def search_prefix(self, prefix, limit=10, field=None):
+        """Find NEOs by a prefix of their designation or name, as soon as the NEOs are loaded."""
+        return self._neo_index().search_prefix(prefix, limit=limit, field=field)
+
+    def query(self, filters=()):
+        """Query close approaches to generate those that match a collection of filters.
+
+        If the whole database isn't built yet, but the approaches loaded so far
+        cover the date range of the filters, they're scanned instead of waiting.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        if not self.is_loaded and self.covers(filters):
+            # Only scan the approaches published when the query started.
+            loaded = len(self._approaches)
+            for position in range(loaded):
+                approach = self._approaches[position]
+                if approach.neo is not None and all(f(approach) for f in filters):
+                    yield approach
+            return
+        yield from self._wait().query(filters)
+
+    def query_batches(self, filters=(), batch_size=BATCH_SIZE, columns=False):
+        """Query close approaches to generate batches of those that match a collection of filters.
+
+        If the whole database isn't built yet, but the approaches loaded so far
+        cover the date range of the filters, batches of them are generated
+        instead of waiting.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param batch_size: The maximum number of close approaches in each batch.
+        :param columns: Whether to generate dictionaries of columns instead of lists
+                        of `CloseApproach` objects.
+        :return: A stream of non-empty batches of matching close approaches.
+        """
+        if not self.is_loaded and self.covers(filters):
+            for batch in batched(self.query(filters), batch_size):
+                yield columns_of(batch) if columns else batch
+            return
+        yield from self._wait().query_batches(filters, batch_size, columns)
+
+    def count(self, filters=()):
+        """Count the close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        if not self.is_loaded and self.covers(filters):
+            return sum(1 for _ in self.query(filters))
+        return self._wait().count(filters)
+
+    def aggregate(self, filters=(), group_by=(), field='distance', bins=None):
+        """Aggregate the close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param group_by: A sequence of group-by key names.
+        :param field: The name of the field to aggregate.
+        :param bins: An optional ascending sequence of histogram bin edges.
+        :return: A dictionary mapping tuples of group-by values to `Aggregate`s.
+        """
+        return aggregate(self.query_batches(filters), group_by=group_by, field=field, bins=bins)
+
+    def __getattr__(self, name):
+        """Delegate anything else to the whole database, once it's built."""
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._wait(), name)
@@ -5,7 +5,7 @@ See `README.md` for a detailed discussion of this project.
 
 This script can be invoked from the command line::
 
-    $ python3 main.py {inspect,query,interactive} [args]
+    $ python3 main.py {inspect,query,aggregate,upcoming,similar,interactive} [args]
 
 The `inspect` subcommand looks up an NEO by name or by primary designation, and
 optionally lists all of that NEO's known close approaches:
@@ -13,6 +13,19 @@ optionally lists all of that NEO's known close approaches:
     $ python3 main.py inspect --pdes 1P
     $ python3 main.py inspect --name Halley
     $ python3 main.py inspect --verbose --name Halley
+    $ python3 main.py inspect --summary --after 2020-01-01 --name Halley
+
+An NEO can also be looked up by a case-insensitive prefix of its name or
+designation. If several NEOs match, they're listed instead:
+
+    $ python3 main.py inspect --name-prefix hal
+
+A whole list of primary designations, one per line, can be looked up at once,
+and the matching NEOs (with all of their close approaches, if `--verbose`)
+saved to an output file in CSV or JSON format:
+
+    $ python3 main.py inspect --pdes-file watchlist.txt
+    $ python3 main.py inspect --verbose --pdes-file watchlist.txt --outfile watchlist.json
 
 The `query` subcommand searches for close approaches that match given criteria:
 
@@ -23,18 +36,152 @@ The `query` subcommand searches for close approaches that match given criteria:
     $ python3 main.py query --start-date 2000-01-01 --max-diameter 0.1 --not-hazardous
     $ python3 main.py query --hazardous --max-distance 0.05 --min-velocity 30
 
-The set of results can be limited in size and/or saved to an output file in CSV
-or JSON format:
+The set of results can be limited in size and/or saved to an output file in CSV,
+JSON or NDJSON (one JSON object per line) format:
 
     $ python3 main.py query --limit 5 --outfile results.csv
     $ python3 main.py query --limit 15 --outfile results.json
 
+An output file whose name ends with `.gz`, `.bz2` or `.xz` is compressed on the
+fly. Likewise, the data files can be compressed in any of those formats, and are
+decompressed as they're read:
+
+    $ python3 main.py --neofile data/neos.csv.gz --cadfile data/cad.json.xz query --outfile results.csv.gz
+
+For analytics jobs, the results can instead be saved as typed columns in an
+`.npz` file, which `numpy.load` reads without parsing any text, or in an Arrow
+IPC file if `pyarrow` is installed:
+
+    $ python3 main.py query --start-date 2020-01-01 --outfile results.npz
+    $ python3 main.py query --hazardous --outfile results.arrow
+
+With a memory-mapped binary `--cadfile`, the columns are sliced from the mapped
+columns without building any close approach objects.
+
+A large CSV, JSON or NDJSON output file can be split into part files, written
+concurrently, either into a given number of parts or into parts of a given
+number of rows. A manifest (such as `results.manifest.json`) lists the parts
+and their row counts, and is updated as each part is finished:
+
+    $ python3 main.py query --outfile results.csv --parts 8
+    $ python3 main.py query --outfile results.ndjson.gz --part-size 100000
+
+Alternatively, a single large output file can be written in a pipeline: the
+query, the formatting of the results in `--jobs` processes, and the writes
+(and compression) on a thread all run at the same time, connected by bounded
+queues so that memory stays bounded:
+
+    $ python3 main.py query --outfile results.csv.gz --jobs 4
+
+Alternatively, only the number of matching close approaches can be printed:
+
+    $ python3 main.py query --start-date 2020-01-01 --max-distance 0.025 --count
+
+The `aggregate` subcommand accepts the same filters as `query`, and summarizes
+the matching close approaches in groups with counts, extrema, means and
+optional histograms:
+
+    $ python3 main.py aggregate --hazardous --group-by year
+    $ python3 main.py aggregate --start-date 2020-01-01 --group-by month --field distance
+    $ python3 main.py aggregate --hazardous --field velocity --bins 0,10,20,30,40
+
+The `upcoming` subcommand accepts the same filters as `query`, and lists the next
+close approaches after a time (by default, now), or the last ones before it:
+
+    $ python3 main.py upcoming --number 5 --hazardous
+    $ python3 main.py upcoming --time 2020-06-01 --previous --max-distance 0.05
+
+The `similar` subcommand lists the close approaches most similar to one close
+approach of an NEO (by default, its closest), in distance, velocity, diameter
+and time:
+
+    $ python3 main.py similar --pdes 433 --date 2019-01-23 -k 5
+    $ python3 main.py similar --name Halley
+
 The `interactive` subcommand loads the NEO database and spawns an interactive
-command shell that can repeatedly execute `inspect` and `query` commands without
-having to wait to reload the database each time. However, it doesn't hot-reload.
+command shell that can repeatedly execute `inspect`, `query`, `aggregate`,
+`upcoming` and `similar` commands without having to wait to reload the database each time.
+However, it doesn't hot-reload the code.
+
+The shell starts right away, while the data files load in the background, with
+the progress shown in the prompt and by the `status` command. NEOs can be
+inspected as soon as the NEO file is loaded, and queries whose date range ends
+before the latest loaded day are answered before the whole close approach file
+is loaded.
+
+With `--watch`, the shell watches the data files. When they change, they're read
+again in the background, and only the NEOs and close approaches which were added
+or removed are applied to the database, between two commands:
+
+    $ python3 main.py interactive --watch
+
+With `--tail`, the shell follows an NDJSON file of close approach records (one
+JSON object per line, with the fields of the close approach data file), and
+appends the records written to it to the database, between two commands. The
+close approaches of NEOs which aren't known yet are held back until they are:
+
+    $ python3 main.py interactive --watch --tail data/cad-updates.ndjson
+
+Within the interactive shell, a query whose filters narrow those of the previous
+query (by adding filters or tightening ranges) only rescans the previous matches,
+and the `refine` command adds filters to the previous query explicitly:
+
+    (neo) query --start-date 2020-01-01
+    (neo) refine --hazardous
+    (neo) query --start-date 2020-06-01 --hazardous --max-distance 0.05
 
 If needed, the script can load data from data files other than the default with
-`--neofile` or `--cadfile`.
+`--neofile` or `--cadfile`. Several close approach data files (or glob patterns)
+can be given, and they're loaded and merged by time, keeping only
+one of the close approaches of an NEO at the same time found in several files:
+
+    $ python3 main.py --cadfile data/cad-history.json --cadfile 'data/cad-20*.json' query --date 2020-03-14
+
+The `partition` subcommand splits the close approach data file into one file per
+year. When `--cadfile` names such a directory of partitions, only the years that
+overlap the date range of a query are loaded, and the loaded years are kept in
+memory within `--memory-budget` megabytes:
+
+    $ python3 main.py partition data/cad
+    $ python3 main.py --cadfile data/cad query --start-date 2020-01-01 --end-date 2020-12-31
+
+The `import` subcommand builds an SQLite database file from the data files once.
+With `--sqlite`, NEOs and close approaches are then read from that file instead
+of being loaded into memory:
+
+    $ python3 main.py import data/neos.sqlite
+    $ python3 main.py --sqlite data/neos.sqlite query --date 2020-03-14 --hazardous
+
+The `convert` subcommand writes the close approaches into a compact binary file
+of fixed-width columns. When `--cadfile` names such a file, it's memory-mapped
+instead of parsed, so that startup is nearly instant:
+
+    $ python3 main.py convert data/cad.bin
+    $ python3 main.py --cadfile data/cad.bin query --date 2020-03-14
+
+With `--rollup`, close approaches are additionally pre-aggregated by year, hazard,
+distance and diameter buckets at load time, so that counts aligned with those
+buckets are answered almost instantly:
+
+    $ python3 main.py --rollup query --start-date 2020-01-01 --hazardous --max-distance 0.05 --count
+
+With `--spatial`, close approaches are additionally indexed by a k-d tree at load
+time, so that queries combining distance, velocity, diameter and date ranges only
+test the close approaches within those ranges:
+
+    $ python3 main.py --spatial query --min-distance 0.2 --max-velocity 10 --min-diameter 1
+
+With `--bitmaps`, close approaches are additionally indexed by bitmaps of their
+hazard flag and diameter, distance and velocity buckets. The bitmap of each
+filter is cached (within `--bitmap-cache` megabytes), so that queries in an
+interactive session which share filters combine their bitmaps instead of
+scanning again:
+
+    $ python3 main.py --bitmaps interactive
+
+The results of the latest `--result-cache` distinct queries are cached, so that
+repeating a query in an interactive session (say, to preview it and then save
+it with `--outfile`) doesn't run it again.
 """
 import argparse
 import cmd
@@ -44,10 +191,22 @@ import shlex
 import sys
 import time
 
-from extract import load_neos, load_approaches
+from extract import expand_paths, load_approaches, load_merged_approaches, load_neos
+from aggregate import FIELDS, GROUP_KEYS
+from columnar import columns_of, write_to_arrow, write_to_npz
 from database import NEODatabase
-from filters import create_filters, limit
-from write import write_to_csv, write_to_json
+from loader import BackgroundNEODatabase
+from mapped import MappedNEODatabase, convert_to_binary, is_binary_file
+from indexes import BITMAP_CACHE_MB, RESULT_CACHE_SIZE
+from pipeline import write_pipelined
+from partitions import (MEMORY_BUDGET_MB, PartitionedNEODatabase, is_partition_directory,
+                        partition_cad_file)
+from sqlitedb import SQLiteNEODatabase, import_to_sqlite
+from streams import base_suffix, open_stream
+from watch import DataFileWatcher, NDJSONFollower
+from filters import create_filters, limit, narrows
+from write import (manifest_path, write_neos_to_csv, write_neos_to_json, write_parts,
+                   write_to_csv, write_to_json, write_to_ndjson)
 
 
 # Paths to the root of the project and the `data` subfolder.
@@ -55,6 +214,10 @@ PROJECT_ROOT = pathlib.Path(__file__).parent.resolve()
 DATA_ROOT = PROJECT_ROOT / 'data'
 # The current time, for use with the kill-on-change feature of the interactive shell.
 _START = time.time()
+# The maximum number of NEOs listed when several match a prefix.
+PREFIX_MATCHES = 10
+# The maximum number of completions offered by the interactive shell.
+COMPLETIONS = 50
 
 
 def date_fromisoformat(date_string):
@@ -72,42 +235,47 @@ def date_fromisoformat(date_string):
         raise argparse.ArgumentTypeError(f"'{date_string}' is not a valid date. Use YYYY-MM-DD.")
 
 
-def make_parser():
-    """Create an ArgumentParser for this script.
+def datetime_fromisoformat(datetime_string):
+    """Return a `datetime.datetime` corresponding to a string in YYYY-MM-DD[ HH:MM] format.
 
-    :return: A tuple of the top-level, inspect, and query parsers.
+    :param datetime_string: A date in the format YYYY-MM-DD, optionally followed by a time.
+    :return: A naive `datetime.datetime` corresponding to the given string.
     """
-    parser = argparse.ArgumentParser(
-        description="Explore past and future close approaches of near-Earth objects."
-    )
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(datetime_string, fmt)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"'{datetime_string}' is not a valid date and time. "
+                                     "Use YYYY-MM-DD or 'YYYY-MM-DD HH:MM'.")
 
-    # Add arguments for custom data files.
-    parser.add_argument('--neofile', default=(DATA_ROOT / 'neos.csv'),
-                        type=pathlib.Path,
-                        help="Path to CSV file of near-Earth objects.")
-    parser.add_argument('--cadfile', default=(DATA_ROOT / 'cad.json'),
-                        type=pathlib.Path,
-                        help="Path to JSON file of close approach data.")
-    subparsers = parser.add_subparsers(dest='cmd')
 
-    # Add the `inspect` subcommand parser.
-    inspect = subparsers.add_parser('inspect',
-                                    description="Inspect an NEO by primary designation or by name.")
-    inspect.add_argument('-v', '--verbose', action='store_true',
-                         help="Additionally, print all known close approaches of this NEO.")
-    inspect_id = inspect.add_mutually_exclusive_group(required=True)
-    inspect_id.add_argument('-p', '--pdes',
-                            help="The primary designation of the NEO to inspect (e.g. '433').")
-    inspect_id.add_argument('-n', '--name',
-                            help="The IAU name of the NEO to inspect (e.g. 'Halley').")
+def bins_fromstring(bins_string):
+    """Return a list of histogram bin edges from a comma-separated string.
 
-    # Add the `query` subcommand parser.
-    query = subparsers.add_parser('query',
-                                  description="Query for close approaches that "
-                                              "match a collection of filters.")
-    filters = query.add_argument_group('Filters',
-                                       description="Filter close approaches by their attributes "
-                                                   "or the attributes of their NEOs.")
+    :param bins_string: Ascending bin edges, such as '0,0.01,0.05,0.1'.
+    :return: A list of the bin edges, as floats.
+    """
+    try:
+        bins = [float(edge) for edge in bins_string.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{bins_string}' is not a list of numbers.")
+    if len(bins) < 2 or bins != sorted(bins):
+        raise argparse.ArgumentTypeError(f"'{bins_string}' is not at least two ascending edges.")
+    return bins
+
+
+def add_filter_arguments(parser):
+    """Add the group of close approach filter arguments to a parser.
+
+    The same filters are shared by every subcommand that selects close
+    approaches, such as `query` and `aggregate`.
+
+    :param parser: An `argparse.ArgumentParser` to which to add the filters.
+    """
+    filters = parser.add_argument_group('Filters',
+                                        description="Filter close approaches by their attributes "
+                                                    "or the attributes of their NEOs.")
     filters.add_argument('-d', '--date', type=date_fromisoformat,
                          help="Only return close approaches on the given date, "
                               "in YYYY-MM-DD format (e.g. 2020-12-31).")
@@ -143,43 +311,219 @@ def make_parser():
     filters.add_argument('--not-hazardous', dest='hazardous', default=None, action='store_false',
                          help="If specified, only return close approaches of NEOs that "
                               "are not potentially hazardous.")
+
+
+def make_parser():
+    """Create an ArgumentParser for this script.
+
+    :return: A tuple of the top-level, inspect, query, aggregate, upcoming, and similar parsers.
+    """
+    parser = argparse.ArgumentParser(
+        description="Explore past and future close approaches of near-Earth objects."
+    )
+
+    # Add arguments for custom data files.
+    parser.add_argument('--neofile', default=(DATA_ROOT / 'neos.csv'),
+                        type=pathlib.Path,
+                        help="Path to CSV file of near-Earth objects.")
+    parser.add_argument('--cadfile', action='append', dest='cadfiles', type=pathlib.Path,
+                        metavar='CADFILE',
+                        help="Path to JSON file of close approach data, or to a directory "
+                             "of yearly partitions written by the `partition` subcommand. "
+                             "Several files (or glob patterns) can be given, in which case "
+                             "their close approaches are merged by time.")
+    parser.add_argument('--memory-budget', type=int, default=MEMORY_BUDGET_MB,
+                        help="In megabytes. The memory budget of the yearly partitions loaded "
+                             f"from a partition directory. Defaults to {MEMORY_BUDGET_MB}.")
+    parser.add_argument('--sqlite', type=pathlib.Path,
+                        help="Path to an SQLite database file built by the `import` subcommand. "
+                             "If given, NEOs and close approaches are read from this file "
+                             "instead of from the data files.")
+    parser.add_argument('--rollup', action='store_true',
+                        help="Pre-aggregate close approaches by year, hazard, distance and "
+                             "diameter at load time to speed up `query --count`.")
+    parser.add_argument('--spatial', action='store_true',
+                        help="Index close approaches by distance, velocity, diameter and time "
+                             "in a k-d tree at load time to speed up multi-attribute queries.")
+    parser.add_argument('--bitmaps', action='store_true',
+                        help="Index close approaches by bitmaps of their hazard flag and diameter, "
+                             "distance and velocity buckets, and cache the bitmaps of filters.")
+    parser.add_argument('--bitmap-cache', type=int, default=BITMAP_CACHE_MB,
+                        help="In megabytes. The memory cap of the cached filter bitmaps. "
+                             f"Defaults to {BITMAP_CACHE_MB}.")
+    parser.add_argument('--result-cache', type=int, default=RESULT_CACHE_SIZE,
+                        help="The number of recent query results to cache, or 0 to disable "
+                             f"the cache. Defaults to {RESULT_CACHE_SIZE}.")
+    subparsers = parser.add_subparsers(dest='cmd')
+
+    # Add the `inspect` subcommand parser.
+    inspect = subparsers.add_parser('inspect',
+                                    description="Inspect an NEO by primary designation or by name.")
+    inspect.add_argument('-v', '--verbose', action='store_true',
+                         help="Additionally, print all known close approaches of this NEO. "
+                              "With a directory of partitions, only those of the years "
+                              "loaded by earlier queries are known.")
+    inspect.add_argument('--summary', action='store_true',
+                         help="Additionally, print a summary of this NEO's close approaches, "
+                              "which are only those of the loaded years with partitions.")
+    inspect.add_argument('--after', type=date_fromisoformat,
+                         help="With --summary, find the next close approach after the given "
+                              "date, in YYYY-MM-DD format. Defaults to today.")
+    inspect_id = inspect.add_mutually_exclusive_group(required=True)
+    inspect_id.add_argument('-p', '--pdes',
+                            help="The primary designation of the NEO to inspect (e.g. '433').")
+    inspect_id.add_argument('-n', '--name',
+                            help="The IAU name of the NEO to inspect (e.g. 'Halley').")
+    inspect_id.add_argument('--name-prefix',
+                            help="A case-insensitive prefix of the name or primary designation "
+                                 "of the NEO to inspect (e.g. 'hal').")
+    inspect_id.add_argument('--pdes-file', type=pathlib.Path,
+                            help="A file of primary designations of NEOs to inspect, "
+                                 "one per line.")
+    inspect.add_argument('-o', '--outfile', type=pathlib.Path,
+                         help="With --pdes-file, file in which to save the matching NEOs in "
+                              "CSV or JSON format. If omitted, they're printed to standard output.")
+
+    # Add the `query` subcommand parser.
+    query = subparsers.add_parser('query',
+                                  description="Query for close approaches that "
+                                              "match a collection of filters.")
+    add_filter_arguments(query)
     query.add_argument('-l', '--limit', type=int,
                        help="The maximum number of matches to return. "
                             "Defaults to 10 if no --outfile is given.")
     query.add_argument('-o', '--outfile', type=pathlib.Path,
                        help="File in which to save structured results. "
                             "If omitted, results are printed to standard output.")
+    query_parts = query.add_mutually_exclusive_group()
+    query_parts.add_argument('--parts', type=int, metavar='N',
+                             help="Split the --outfile into N part files, written concurrently, "
+                                  "and list them in a manifest.")
+    query_parts.add_argument('--part-size', type=int, metavar='ROWS',
+                             help="Split the --outfile into part files of ROWS rows each, "
+                                  "written concurrently, and list them in a manifest.")
+    query.add_argument('-j', '--jobs', type=int, metavar='N',
+                       help="Format the CSV, JSON or NDJSON --outfile in N processes, "
+                            "pipelined with the query and the writes.")
+    query.add_argument('-c', '--count', action='store_true',
+                       help="Only print the number of matching close approaches.")
+    query.add_argument('--stats', action='store_true',
+                       help="Additionally, report how many blocks of close approaches "
+                            "the query skipped.")
+
+    # Add the `aggregate` subcommand parser.
+    aggregate = subparsers.add_parser('aggregate',
+                                      description="Summarize the close approaches that match "
+                                                  "a collection of filters, optionally in groups.")
+    add_filter_arguments(aggregate)
+    aggregate.add_argument('-g', '--group-by', nargs='+', default=[], choices=sorted(GROUP_KEYS),
+                           help="Group the matching close approaches by these keys.")
+    aggregate.add_argument('-f', '--field', default='distance', choices=sorted(FIELDS),
+                           help="The field to summarize. Defaults to distance.")
+    aggregate.add_argument('-b', '--bins', type=bins_fromstring,
+                           help="Comma-separated ascending histogram bin edges "
+                                "(e.g. 0,0.01,0.05,0.1).")
+
+    # Add the `upcoming` subcommand parser.
+    upcoming = subparsers.add_parser('upcoming',
+                                     description="List the next close approaches after a time "
+                                                 "that match a collection of filters.")
+    add_filter_arguments(upcoming)
+    upcoming.add_argument('-t', '--time', type=datetime_fromisoformat,
+                          help="The time around which to look, in YYYY-MM-DD or "
+                               "'YYYY-MM-DD HH:MM' format. Defaults to now.")
+    upcoming.add_argument('-n', '--number', type=int, default=10,
+                          help="The number of close approaches to list. Defaults to 10.")
+    upcoming.add_argument('--previous', action='store_true',
+                          help="List the last close approaches before the time instead, "
+                               "latest first.")
+
+    # Add the `similar` subcommand parser.
+    similar = subparsers.add_parser('similar',
+                                    description="List the close approaches most similar to "
+                                                "a close approach of an NEO.")
+    similar_id = similar.add_mutually_exclusive_group(required=True)
+    similar_id.add_argument('-p', '--pdes',
+                            help="The primary designation of the NEO (e.g. '433').")
+    similar_id.add_argument('-n', '--name',
+                            help="The IAU name of the NEO (e.g. 'Halley').")
+    similar.add_argument('-d', '--date', type=date_fromisoformat,
+                         help="The date of the NEO's close approach, in YYYY-MM-DD format. "
+                              "Defaults to the NEO's closest approach.")
+    similar.add_argument('-k', '--number', type=int, default=10,
+                         help="The number of similar close approaches to list. Defaults to 10.")
+
+    # Add the `partition` subcommand parser.
+    partition = subparsers.add_parser('partition',
+                                      description="Split the close approach data file into "
+                                                  "one file per year.")
+    partition.add_argument('directory', type=pathlib.Path,
+                           help="The directory in which to write the yearly partitions.")
+
+    # Add the `import` subcommand parser.
+    sqlite = subparsers.add_parser('import',
+                                   description="Build an SQLite database file from the NEO "
+                                               "and close approach data files.")
+    sqlite.add_argument('sqlite_file', type=pathlib.Path,
+                        help="The SQLite database file to build.")
+
+    # Add the `convert` subcommand parser.
+    convert = subparsers.add_parser('convert',
+                                    description="Write the close approaches into a compact binary "
+                                                "file that can be memory-mapped as `--cadfile`.")
+    convert.add_argument('binary_file', type=pathlib.Path,
+                         help="The binary close approach file to write.")
 
     repl = subparsers.add_parser('interactive',
                                  description="Start an interactive command session "
                                              "to repeatedly run `interact` and `query` commands.")
     repl.add_argument('-a', '--aggressive', action='store_true',
                       help="If specified, kill the session whenever a project file is modified.")
-    return parser, inspect, query
+    repl.add_argument('-w', '--watch', action='store_true',
+                      help="If specified, apply the changes to the data files to the database.")
+    repl.add_argument('-t', '--tail', type=pathlib.Path, metavar='NDJSON_FILE',
+                      help="Append the close approach records written to an NDJSON file.")
+    return parser, inspect, query, aggregate, upcoming, similar
 
 
-def inspect(database, pdes=None, name=None, verbose=False):
+def inspect(database, pdes=None, name=None, verbose=False, summary=False, after=None,
+            name_prefix=None):
     """Perform the `inspect` subcommand.
 
     This function fetches an NEO by designation or by name. If a matching NEO is
     found, information about the NEO is printed (additionally, information for
-    all of the NEO's known close approaches is printed if `verbose=True`).
+    all of the NEO's known close approaches is printed if `verbose=True`, and a
+    summary of them including the next approach after `after` if `summary=True`).
     Otherwise, a message is printed noting that there are no matching NEOs.
 
-    At least one of `pdes` and `name` must be given. If both are given, prefer
-    to look up the NEO by the primary designation.
+    At least one of `pdes`, `name` and `name_prefix` must be given. If several
+    are given, prefer to look up the NEO by the primary designation, and then
+    by the name. If several NEOs match a prefix, they're listed instead.
 
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param pdes: The primary designation of an NEO for which to search.
     :param name: The name of an NEO for which to search.
     :param verbose: Whether to additionally print all of a matching NEO's close approaches.
+    :param summary: Whether to additionally print a summary of a matching NEO's close approaches.
+    :param after: The date after which to find the next close approach. Defaults to today.
+    :param name_prefix: A prefix of the name or primary designation of an NEO for which to search.
     :return: The matching `NearEarthObject`, or None if not found.
     """
     # Fetch the NEO of interest.
     if pdes:
         neo = database.get_neo_by_designation(pdes)
-    else:
+    elif name:
         neo = database.get_neo_by_name(name)
+    else:
+        candidates = database.search_prefix(name_prefix, limit=PREFIX_MATCHES + 1)
+        if len(candidates) > 1:
+            print(f"Several NEOs match '{name_prefix}':")
+            for candidate in candidates[:PREFIX_MATCHES]:
+                print(f"- {candidate.designation} ({candidate.name})")
+            if len(candidates) > PREFIX_MATCHES:
+                print("- ...")
+            return None
+        neo = candidates[0] if candidates else None
 
     # Ensure that we have received an NEO.
     if not neo:
@@ -188,49 +532,303 @@ def inspect(database, pdes=None, name=None, verbose=False):
 
     # Display information about this NEO, and optionally its close approaches if verbose.
     print(neo)
+    if summary:
+        stats = neo.summary
+        print(f"- {stats.count} known close approaches.")
+        if stats.closest is not None:
+            print(f"- Closest: {stats.closest}")
+            print(f"- Maximum velocity: {stats.max_velocity:.2f} km/s.")
+        after = datetime.datetime.combine(after or datetime.date.today(), datetime.time())
+        upcoming = neo.next_approach(after)
+        print(f"- Next after {after.date()}: {upcoming or 'none known.'}")
     if verbose:
         for approach in neo.approaches:
             print(f"- {approach}")
     return neo
 
 
-def query(database, args):
-    """Perform the `query` subcommand.
+def read_designations(path):
+    """Read primary designations from a file, one per line.
 
-    Create a collection of filters with `create_filters` and supply them to the
-    database's `query` method to produce a stream of matching results.
+    Blank lines and lines starting with '#' are skipped.
 
-    If an output file wasn't given, print these results to stdout, limiting to
-    10 entries if no limit was specified. If an output file was given, use the
-    file's extension to infer whether the file should hold CSV or JSON data, and
-    then write the results to the output file in that format.
+    :param path: A path to a text file of primary designations.
+    :return: A list of the primary designations, in order.
+    """
+    with open_stream(path) as file:
+        lines = (line.strip() for line in file)
+        return [line for line in lines if line and not line.startswith('#')]
+
+
+def inspect_many(database, args):
+    """Perform the `inspect` subcommand for a file of primary designations.
+
+    Look up all of the designations at once. If an output file was given, use
+    its extension to write the matching NEOs (and their close approaches, if
+    verbose) in CSV or JSON format. Otherwise, print them. Finally, report how
+    many designations matched, and which didn't.
 
     :param database: The `NEODatabase` containing data on NEOs and their close approaches.
     :param args: All arguments from the command line, as parsed by the top-level parser.
     """
-    # Construct a collection of filters from arguments supplied at the command line.
-    filters = create_filters(
+    try:
+        designations = read_designations(args.pdes_file)
+    except OSError as err:
+        print(err, file=sys.stderr)
+        return
+    matches = database.get_neos_by_designations(designations)
+
+    if not args.outfile:
+        for neo in matches.values():
+            print(neo)
+            if args.verbose:
+                for approach in neo.approaches:
+                    print(f"- {approach}")
+    elif base_suffix(args.outfile) == '.csv':
+        write_neos_to_csv(matches.values(), args.outfile, approaches=args.verbose)
+    elif base_suffix(args.outfile) == '.json':
+        write_neos_to_json(matches.values(), args.outfile, approaches=args.verbose)
+    else:
+        print("Please use an output file that ends with `.csv` or `.json` "
+              "(optionally followed by `.gz`, `.bz2` or `.xz`).", file=sys.stderr)
+        return
+
+    unique = list(dict.fromkeys(designations))
+    print(f"Matched {len(matches)} of {len(unique)} designations.", file=sys.stderr)
+    missing = [designation for designation in unique if designation not in matches]
+    if missing:
+        print(f"No matching NEOs for: {', '.join(missing)}", file=sys.stderr)
+
+
+def filters_from_args(args):
+    """Create a collection of filters from the parsed filter arguments.
+
+    :param args: Arguments parsed by a parser to which `add_filter_arguments` was applied.
+    :return: A collection of filters, as produced by `create_filters`.
+    """
+    return create_filters(
         date=args.date, start_date=args.start_date, end_date=args.end_date,
         distance_min=args.distance_min, distance_max=args.distance_max,
         velocity_min=args.velocity_min, velocity_max=args.velocity_max,
         diameter_min=args.diameter_min, diameter_max=args.diameter_max,
         hazardous=args.hazardous
     )
+
+
+def print_stats(database):
+    """Report how many blocks the latest scan skipped, and how the caches of a database fared.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    """
+    stats = database.scan_stats
+    print(f"Skipped {stats['skipped']} of {stats['blocks']} blocks of close approaches.",
+          file=sys.stderr)
+    results = getattr(database, 'result_stats', None)
+    if results is not None:
+        print(f"Query results: {results['hits']} hits, {results['misses']} misses, "
+              f"{results['results']} cached.", file=sys.stderr)
+    bitmaps = getattr(database, 'bitmap_stats', None)
+    if bitmaps is not None:
+        print(f"Filter bitmaps: {bitmaps['hits']} hits, {bitmaps['misses']} misses, "
+              f"{bitmaps['evictions']} evictions, {bitmaps['bitmaps']} cached "
+              f"({bitmaps['bytes']} bytes).", file=sys.stderr)
+
+
+def query(database, args, results=None):
+    """Perform the `query` subcommand.
+
+    Create a collection of filters with `create_filters` and supply them to the
+    database's `query` method to produce a stream of matching results, unless
+    the matching results were already found.
+
+    If only a count was requested, print the number of matching close approaches
+    instead. If an output file wasn't given, print these results to stdout,
+    limiting to 10 entries if no limit was specified. If an output file was
+    given, use the file's extension to infer whether the file should hold CSV,
+    JSON or NDJSON data, or columns in an `.npz` or Arrow file, and then write
+    the results to the output file in that format. The columns of a
+    `MappedNEODatabase` are sliced from its mapped columns. If parts were
+    requested, write the CSV, JSON or NDJSON results to part files instead,
+    concurrently, along with their manifest. If jobs were requested, write
+    them in a pipeline, formatting them in that many processes.
+    If statistics were requested, finally report how many blocks were skipped,
+    and how the caches of query results and of filter bitmaps fared, whether
+    the results or only their count were requested.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param results: An optional list of the matching `CloseApproach`es, if already found.
+    """
+    # Construct a collection of filters from arguments supplied at the command line.
+    filters = filters_from_args(args)
+    if args.count:
+        # Count the matches without generating any results.
+        print(database.count(filters) if results is None else len(results))
+        if args.stats:
+            print_stats(database)
+        return
+
+    suffix = args.outfile.suffix.lower() if args.outfile else None
+    sizes = [size for size in (args.parts, args.part_size) if size is not None]
+    if sizes:
+        if not args.outfile or suffix in ('.npz', '.arrow'):
+            print("Please use --parts or --part-size with a CSV, JSON or NDJSON --outfile.",
+                  file=sys.stderr)
+            return
+        if sizes[0] < 1:
+            print("Please ask for at least one part, of at least one row.", file=sys.stderr)
+            return
+    if args.jobs is not None:
+        if not args.outfile or suffix in ('.npz', '.arrow') or sizes:
+            print("Please use --jobs with a CSV, JSON or NDJSON --outfile, without parts.",
+                  file=sys.stderr)
+            return
+        if args.jobs < 1:
+            print("Please ask for at least one job.", file=sys.stderr)
+            return
+
+    total = None
+    if args.outfile and args.parts:
+        # Size the parts by counting the matches, rather than holding them all in memory.
+        total = database.count(filters) if results is None else len(results)
+        if args.limit:
+            total = min(total, args.limit)
+
+    if suffix in ('.npz', '.arrow'):
+        # Write the results to a file of columns.
+        if results is None and isinstance(database, MappedNEODatabase):
+            columns = database.columns(filters, args.limit)
+        else:
+            columns = columns_of(limit(database.query(filters) if results is None else results,
+                                       args.limit))
+        if suffix == '.npz':
+            write_to_npz(columns, args.outfile)
+        else:
+            try:
+                write_to_arrow(columns, args.outfile)
+            except ImportError:
+                print("Please install `pyarrow` to write Arrow files, "
+                      "or use an output file that ends with `.npz`.", file=sys.stderr)
+                return
+        results = ()
+
     # Query the database with the collection of filters.
-    results = database.query(filters)
+    if results is None and args.outfile and not args.limit and not sizes:
+        # A whole output file is written from batches of results, a batch at a time.
+        results = database.query_batches(filters)
+    elif results is None:
+        results = database.query(filters)
 
     if not args.outfile:
         # Write the results to stdout, limiting to 10 entries if not specified.
         for result in limit(results, args.limit or 10):
             print(result)
-    else:
-        # Write the results to a file.
-        if args.outfile.suffix == '.csv':
-            write_to_csv(limit(results, args.limit), args.outfile)
-        elif args.outfile.suffix == '.json':
-            write_to_json(limit(results, args.limit), args.outfile)
+    elif suffix not in ('.npz', '.arrow'):
+        # Write the results to a file, or to part files.
+        writer = {'.csv': write_to_csv, '.json': write_to_json,
+                  '.ndjson': write_to_ndjson}.get(base_suffix(args.outfile))
+        if writer is None:
+            print("Please use an output file that ends with `.csv`, `.json` or `.ndjson` "
+                  "(optionally followed by `.gz`, `.bz2` or `.xz`), `.npz` or `.arrow`.",
+                  file=sys.stderr)
+            return
+        if args.jobs:
+            write_pipelined(limit(results, args.limit), args.outfile, processes=args.jobs)
+        elif sizes:
+            manifest = write_parts(limit(results, args.limit), args.outfile, writer,
+                                   parts=args.parts, part_size=args.part_size, total=total)
+            print(f"Wrote {manifest['rows']} close approaches into {len(manifest['parts'])} "
+                  f"parts, listed in {manifest_path(args.outfile)}.")
         else:
-            print("Please use an output file that ends with `.csv` or `.json`.", file=sys.stderr)
+            writer(limit(results, args.limit), args.outfile)
+
+    if args.stats:
+        print_stats(database)
+
+
+def aggregate(database, args):
+    """Perform the `aggregate` subcommand.
+
+    Create a collection of filters with `create_filters` and supply them, along
+    with the group-by keys, the field and the histogram bins, to the database's
+    `aggregate` method. Print one line of statistics per group, ordered by the
+    group-by values.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    filters = filters_from_args(args)
+    groups = database.aggregate(filters, group_by=args.group_by, field=args.field, bins=args.bins)
+    if not groups:
+        print("No matching close approaches exist in the database.", file=sys.stderr)
+        return
+
+    for group in sorted(groups, key=lambda values: tuple(map(str, values))):
+        stats = groups[group]
+        label = ', '.join(f"{key}={value}" for key, value in zip(args.group_by, group)) or 'all'
+        line = f"{label}: count={stats.count}, min={stats.minimum:.4f}, " \
+               f"max={stats.maximum:.4f}, mean={stats.mean:.4f}"
+        if stats.histogram is not None:
+            line += f", histogram={stats.histogram}"
+        print(line)
+
+
+def upcoming(database, args):
+    """Perform the `upcoming` subcommand.
+
+    Find the next close approaches after the given time (or the last ones
+    before it) that match the filters, and print them.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    filters = filters_from_args(args)
+    # The times of close approaches are naive, in UTC.
+    t = args.time or datetime.datetime.now(datetime.timezone.utc).replace(
+        tzinfo=None, second=0, microsecond=0)
+    if args.previous:
+        results = database.prev_approaches(t, args.number, filters)
+    else:
+        results = database.next_approaches(t, args.number, filters)
+    if not results:
+        print("No matching close approaches exist in the database.", file=sys.stderr)
+    for result in results:
+        print(result)
+
+
+def similar(database, args):
+    """Perform the `similar` subcommand.
+
+    Find the NEO by designation or by name, and its close approach on the given
+    date (or its closest approach). Print that close approach, and then the
+    close approaches most similar to it with their similarity distances.
+
+    :param database: The `NEODatabase` containing data on NEOs and their close approaches.
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    if not database.supports_similar:
+        print("Similarity search isn't supported by this database engine.", file=sys.stderr)
+        return
+    if args.pdes:
+        neo = database.get_neo_by_designation(args.pdes)
+    else:
+        neo = database.get_neo_by_name(args.name)
+    if not neo:
+        print("No matching NEOs exist in the database.", file=sys.stderr)
+        return
+
+    if args.date:
+        approach = next((a for a in neo.approaches if a.time.date() == args.date), None)
+    else:
+        approach = neo.summary.closest
+    if approach is None:
+        print("No matching close approaches exist in the database.", file=sys.stderr)
+        return
+
+    results = database.similar(approach, args.number)
+    print(approach)
+    for distance, result in results:
+        print(f"- ({distance:.4f}) {result}")
 
 
 class NEOShell(cmd.Cmd):
@@ -249,7 +847,9 @@ class NEOShell(cmd.Cmd):
              "Type `help` or `?` to list commands and `exit` to exit.\n")
     prompt = '(neo) '
 
-    def __init__(self, database, inspect_parser, query_parser, aggressive=False, **kwargs):
+    def __init__(self, database, inspect_parser, query_parser, aggregate_parser,
+                 upcoming_parser, similar_parser, aggressive=False, watcher=None, follower=None,
+                 **kwargs):
         """Create a new `NEOShell`.
 
         Creating this object doesn't start the session - for that, use `.cmdloop()`.
@@ -257,14 +857,26 @@ class NEOShell(cmd.Cmd):
         :param database: The `NEODatabase` containing data on NEOs and their close approaches.
         :param inspect_parser: The subparser for the `inspect` subcommand.
         :param query_parser: The subparser for the `query` subcommand.
+        :param aggregate_parser: The subparser for the `aggregate` subcommand.
+        :param upcoming_parser: The subparser for the `upcoming` subcommand.
+        :param similar_parser: The subparser for the `similar` subcommand.
         :param aggressive: Whether to kill the session whenever a project file is changed.
+        :param watcher: An optional `DataFileWatcher` of the database's data files.
+        :param follower: An optional `NDJSONFollower` of new close approach records.
         :param kwargs: A dictionary of excess keyword arguments passed to the superclass.
         """
         super().__init__(**kwargs)
         self.db = database
         self.inspect = inspect_parser
         self.query = query_parser
+        self.aggregate = aggregate_parser
+        self.upcoming = upcoming_parser
+        self.similar = similar_parser
+        # The filters of the latest query, and the positions of its matches once they're found.
+        self.last = None
         self.aggressive = aggressive
+        self.watcher = watcher
+        self.follower = follower
 
     @classmethod
     def parse_arg_with(cls, arg, parser):
@@ -308,15 +920,65 @@ class NEOShell(cmd.Cmd):
         Additionally, list all known close approaches:
 
             (neo) inspect --verbose --name Eros
+
+        Or summarize them, with the next one after a date:
+
+            (neo) inspect --summary --after 2020-06-01 --name Eros
+
+        Or look an NEO up by a prefix of its name or designation:
+
+            (neo) inspect --name-prefix er
+
+        Or look up a file of primary designations at once, optionally saving
+        the matching NEOs and their close approaches:
+
+            (neo) inspect --verbose --pdes-file watchlist.txt --outfile watchlist.csv
+
+        Press Tab after `--name` or `--pdes` to complete a name or designation.
         """
         args = self.parse_arg_with(arg, self.inspect)
         if not args:
             return
 
         # Run the `inspect` subcommand.
+        if (args.verbose or args.summary) and not getattr(self.db, 'is_loaded', True):
+            print("Close approaches are still loading, and aren't linked to NEOs yet.",
+                  file=sys.stderr)
+        if args.pdes_file:
+            inspect_many(self.db, args)
+            return
         inspect(self.db,
                 pdes=args.pdes, name=args.name,
-                verbose=args.verbose)
+                verbose=args.verbose, summary=args.summary, after=args.after,
+                name_prefix=args.name_prefix)
+
+    def complete_inspect(self, text, line, begidx, endidx):
+        """Complete the name or designation after `--name`, `--pdes` or `--name-prefix`.
+
+        The candidates are found by binary search in the database's prefix
+        indexes, so that completion stays fast on the full data set.
+        """
+        try:
+            words = shlex.split(line[:begidx])
+        except ValueError:
+            return []
+        option = words[-1] if words else ''
+        if option in ('-n', '--name'):
+            field = 'name'
+        elif option in ('-p', '--pdes'):
+            field = 'designation'
+        elif option == '--name-prefix':
+            field = None
+        else:
+            return [o for o in ('--verbose', '--summary', '--after', '--pdes', '--name',
+                                '--name-prefix', '--pdes-file', '--outfile') if o.startswith(text)]
+        neos = self.db.search_prefix(text, limit=COMPLETIONS, field=field)
+        if field is None:
+            return [neo.name if neo.name and neo.name.casefold().startswith(text.casefold())
+                    else neo.designation for neo in neos]
+        return [getattr(neo, field) for neo in neos]
+
+    complete_i = complete_inspect
 
     def do_q(self, arg):
         """Shorthand for `query`."""
@@ -343,13 +1005,155 @@ class NEOShell(cmd.Cmd):
 
             (neo) query --limit 5 --outfile results.csv
             (neo) query --limit 5 --outfile results.json
+            (neo) query --limit 5 --outfile results.npz
+
+        A large output file can be split into part files, written concurrently:
+
+            (neo) query --outfile results.csv --parts 4
+
+        The number of matches can be printed instead of the matches themselves
+        with `--count`:
+
+            (neo) query --hazardous --count
         """
         args = self.parse_arg_with(arg, self.query)
         if not args:
             return
 
-        # Run the `inspect` subcommand.
-        query(self.db, args)
+        # Run the `query` subcommand, over the previous matches if the filters narrow them.
+        filters = filters_from_args(args)
+        if self.last is not None and filters and narrows(filters, self.last[0]):
+            self.run_query(args, filters, narrow=True)
+        else:
+            self.run_query(args, filters)
+
+    def do_r(self, arg):
+        """Shorthand for `refine`."""
+        self.do_refine(arg)
+
+    def do_refine(self, arg):
+        """Refine the previous query with additional filters within the REPL session.
+
+        This command accepts the same arguments as `query`, and adds its filters
+        to those of the previous query. Only the previous matches are tested
+        against them, rather than every close approach:
+
+            (neo) query --start-date 2020-01-01
+            (neo) refine --hazardous
+            (neo) refine --max-distance 0.05 --limit 5
+        """
+        args = self.parse_arg_with(arg, self.query)
+        if not args:
+            return
+        if self.last is None:
+            print("There is no previous query to refine.", file=sys.stderr)
+            return
+
+        # Only test the additional filters over the previous matches.
+        self.run_query(args, self.last[0] + filters_from_args(args),
+                       new_filters=filters_from_args(args), narrow=True)
+
+    def run_query(self, args, filters, new_filters=None, narrow=False):
+        """Run the `query` subcommand, remembering its filters for later refinement.
+
+        A query that doesn't narrow the previous one streams its results, as the
+        `query` subcommand does, and only its filters are remembered. Once a
+        later query narrows it, the positions of its matches are found, as a
+        compact array, and only those are rescanned - by that query and by any
+        further ones. Databases that don't locate approaches by position simply
+        run the query.
+
+        :param args: The arguments of the `query` command, as parsed by the query parser.
+        :param filters: The collection of filters of the query.
+        :param new_filters: The filters to test over the previous matches. Defaults to all of them.
+        :param narrow: Whether the filters narrow those of the previous query.
+        """
+        if not self.db.supports_positions:
+            self.last = None
+            query(self.db, args)
+            return
+        if not narrow:
+            self.last = (list(filters), None)
+            query(self.db, args)
+            return
+
+        previous, within = self.last
+        if within is None:
+            within = self.db.positions(previous)
+        positions = self.db.positions(filters if new_filters is None else new_filters,
+                                      within=within)
+        print(f"Refined the previous {len(within)} matches to {len(positions)}, "
+              f"rescanning only {len(within)} rows.", file=sys.stderr)
+        self.last = (list(filters), positions)
+        query(self.db, args, results=self.db.approaches_at(positions))
+
+    def do_a(self, arg):
+        """Shorthand for `aggregate`."""
+        self.do_aggregate(arg)
+
+    def do_aggregate(self, arg):
+        """Perform the `aggregate` subcommand within the REPL session.
+
+        This command accepts the same filters as `query`, and summarizes the
+        matching close approaches instead of listing them. For example, to
+        count the approaches of hazardous NEOs per year:
+
+            (neo) aggregate --hazardous --group-by year
+
+        The summarized field and histogram bin edges can be chosen:
+
+            (neo) aggregate --group-by month --field velocity --bins 0,10,20,30
+        """
+        args = self.parse_arg_with(arg, self.aggregate)
+        if not args:
+            return
+
+        # Run the `aggregate` subcommand.
+        aggregate(self.db, args)
+
+    def do_u(self, arg):
+        """Shorthand for `upcoming`."""
+        self.do_upcoming(arg)
+
+    def do_upcoming(self, arg):
+        """Perform the `upcoming` subcommand within the REPL session.
+
+        List the next close approaches after a time, optionally filtered:
+
+            (neo) upcoming --time 2020-06-01 --number 5 --hazardous
+
+        Or the last close approaches before it, latest first:
+
+            (neo) upcoming --time "2020-06-01 12:00" --previous
+        """
+        args = self.parse_arg_with(arg, self.upcoming)
+        if not args:
+            return
+
+        # Run the `upcoming` subcommand.
+        upcoming(self.db, args)
+
+    def do_s(self, arg):
+        """Shorthand for `similar`."""
+        self.do_similar(arg)
+
+    def do_similar(self, arg):
+        """Perform the `similar` subcommand within the REPL session.
+
+        List the close approaches most similar to an NEO's closest approach:
+
+            (neo) similar --name Eros
+
+        Or to its close approach on a date:
+
+            (neo) similar --pdes 433 --date 2019-01-23 -k 5
+        """
+        args = self.parse_arg_with(arg, self.similar)
+        if not args:
+            return
+
+        # Run the `similar` subcommand.
+        similar(self.db, args)
 
     def do_EOF(self, _arg):
         """Exit the interactive session."""
@@ -359,8 +1163,60 @@ class NEOShell(cmd.Cmd):
     do_exit = do_EOF
     do_quit = do_EOF
 
+    def preloop(self):
+        """Show the loading progress in the prompt."""
+        self.update_prompt()
+
+    def postcmd(self, stop, line):
+        """Show the loading progress in the prompt."""
+        self.update_prompt()
+        return stop
+
+    def update_prompt(self):
+        """Show the progress of a database that is loading in the background in the prompt."""
+        if getattr(self.db, 'is_loaded', True):
+            self.prompt = type(self).prompt
+            return
+        _, approaches, total = self.db.progress
+        percent = f"{100 * approaches // total}%" if total else "starting"
+        self.prompt = f"(neo loading {percent}) "
+
+    def do_status(self, _arg):
+        """Print how much of the database is loaded.
+
+        While the database loads in the background, NEOs can be inspected as
+        soon as they're loaded, and queries whose date range ends before the
+        latest loaded day are answered right away. Other commands wait until
+        the database is loaded.
+        """
+        if getattr(self.db, 'is_loaded', True):
+            held = getattr(self.db, 'held_back', 0)
+            print("The database is loaded."
+                  + (f" {held} close approaches are held back until their NEO is known."
+                     if held else ""))
+            return
+        neos, approaches, total = self.db.progress
+        watermark = self.db.watermark
+        print(f"Loaded {neos} NEOs and {approaches} of {total or '?'} close approaches"
+              + (f", covering every day before {watermark.date()}." if watermark else "."))
+
     def precmd(self, line):
-        """Watch for changes to the files in this project."""
+        """Watch for changes to the files in this project, and to the data files if watched."""
+        if self.watcher is not None:
+            message = self.watcher.poll()
+            if message:
+                print(message, file=sys.stderr)
+                if self.watcher.database is not self.db and self.follower is not None:
+                    # A reloaded database has none of the followed records.
+                    self.follower.rewind()
+                self.db = self.watcher.database
+                # The positions of the previous matches are stale.
+                self.last = None
+        if self.follower is not None and getattr(self.db, 'is_loaded', True):
+            message = self.follower.poll(self.db)
+            if message:
+                print(message, file=sys.stderr)
+                self.last = None
         changed = [f for f in PROJECT_ROOT.glob('*.py') if f.stat().st_mtime > _START]
         if changed:
             print("The following file(s) have been modified since this interactive session began: "
@@ -375,21 +1231,144 @@ class NEOShell(cmd.Cmd):
         return line
 
 
+def database_options(args):
+    """Return the keyword arguments of the `NEODatabase` constructor chosen on the command line.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :return: A dictionary of keyword arguments.
+    """
+    return {"rollup": args.rollup, "spatial": args.spatial, "bitmaps": args.bitmaps,
+            "bitmap_cache_mb": args.bitmap_cache, "result_cache": args.result_cache}
+
+
+def load_database(args, background=False):
+    """Extract data from the data files into an `NEODatabase`.
+
+    If an SQLite database file was given, the data is read from it by a
+    `SQLiteNEODatabase` instead. If several close approach data files were
+    given, they're loaded and merged by time. If the close approach data file is a directory
+    of yearly partitions, its partitions are loaded lazily by a
+    `PartitionedNEODatabase`. If it's a binary file written by the `convert`
+    subcommand, it's memory-mapped by a `MappedNEODatabase`. Otherwise, if
+    requested, the data files are loaded by a `BackgroundNEODatabase`, which
+    is returned immediately.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    :param background: Whether to load plain data files in a background thread.
+    :return: An `NEODatabase` of the NEOs and their close approaches.
+    """
+    if args.sqlite:
+        return SQLiteNEODatabase(args.sqlite)
+    if len(args.cadfiles) > 1:
+        return NEODatabase(load_neos(args.neofile), load_merged_approaches(args.cadfiles),
+                           **database_options(args))
+    if background and not is_partition_directory(args.cadfile) \
+            and not is_binary_file(args.cadfile):
+        return BackgroundNEODatabase(args.neofile, args.cadfile,
+                                     **database_options(args)).start()
+    neos = load_neos(args.neofile)
+    if is_partition_directory(args.cadfile):
+        return PartitionedNEODatabase(neos, args.cadfile, memory_budget=args.memory_budget,
+                                      rollup=args.rollup)
+    if is_binary_file(args.cadfile):
+        return MappedNEODatabase(neos, args.cadfile)
+    return NEODatabase(neos, load_approaches(args.cadfile), **database_options(args))
+
+
+def partition(args):
+    """Perform the `partition` subcommand.
+
+    Split the close approach data file into one file per year, and print the
+    number of close approaches in each year's partition.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    counts = partition_cad_file(args.cadfile, args.directory)
+    for year, count in counts.items():
+        print(f"{year}: {count} close approaches")
+
+
+def convert(args):
+    """Perform the `convert` subcommand.
+
+    Load and link the data files, and write the close approaches into a binary
+    close approach file.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    neos = load_neos(args.neofile)
+    approaches = load_merged_approaches(args.cadfiles) if len(args.cadfiles) > 1 \
+        else load_approaches(args.cadfile)
+    NEODatabase(neos, approaches)
+    count = convert_to_binary(neos, approaches, args.binary_file)
+    print(f"Wrote {count} close approaches into {args.binary_file}.")
+
+
+def import_sqlite(args):
+    """Perform the `import` subcommand.
+
+    Build an SQLite database file from the NEO and close approach data files.
+
+    :param args: All arguments from the command line, as parsed by the top-level parser.
+    """
+    neos, approaches = import_to_sqlite(args.neofile, args.cadfile, args.sqlite_file)
+    print(f"Imported {neos} NEOs and {approaches} close approaches into {args.sqlite_file}.")
+
+
 def main():
     """Run the main script."""
-    parser, inspect_parser, query_parser = make_parser()
+    (parser, inspect_parser, query_parser, aggregate_parser, upcoming_parser,
+     similar_parser) = make_parser()
     args = parser.parse_args()
+    args.cadfiles = expand_paths(args.cadfiles or [DATA_ROOT / 'cad.json'])
+    args.cadfile = args.cadfiles[0]
+
+    # The `partition`, `import` and `convert` subcommands only convert the data files.
+    if args.cmd in ('partition', 'import') and len(args.cadfiles) > 1:
+        parser.error(f"The `{args.cmd}` subcommand needs a single close approach data file.")
+    if args.cmd == 'partition':
+        partition(args)
+        return
+    if args.cmd == 'import':
+        import_sqlite(args)
+        return
+    if args.cmd == 'convert':
+        convert(args)
+        return
 
     # Extract data from the data files into structured Python objects.
-    database = NEODatabase(load_neos(args.neofile), load_approaches(args.cadfile))
+    # The interactive shell starts right away, while the data files load in the background.
+    database = load_database(args, background=(args.cmd == 'interactive'))
+    watcher = follower = None
+    if args.cmd == 'interactive' and (args.watch or args.tail):
+        if args.sqlite or is_partition_directory(args.cadfile) or is_binary_file(args.cadfile):
+            parser.error("Only plain data files can be watched or appended to.")
+        if args.watch and len(args.cadfiles) > 1:
+            parser.error("Only a single close approach data file can be watched.")
+        if args.watch:
+            watcher = DataFileWatcher(database, args.neofile, args.cadfile,
+                                      **database_options(args)).start()
+        if args.tail:
+            follower = NDJSONFollower(args.tail)
 
     # Run the chosen subcommand.
-    if args.cmd == 'inspect':
-        inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose)
+    if args.cmd == 'inspect' and args.pdes_file:
+        inspect_many(database, args)
+    elif args.cmd == 'inspect':
+        inspect(database, pdes=args.pdes, name=args.name, verbose=args.verbose,
+                summary=args.summary, after=args.after, name_prefix=args.name_prefix)
     elif args.cmd == 'query':
         query(database, args)
+    elif args.cmd == 'aggregate':
+        aggregate(database, args)
+    elif args.cmd == 'upcoming':
+        upcoming(database, args)
+    elif args.cmd == 'similar':
+        similar(database, args)
     elif args.cmd == 'interactive':
-        NEOShell(database, inspect_parser, query_parser, aggressive=args.aggressive).cmdloop()
+        NEOShell(database, inspect_parser, query_parser, aggregate_parser, upcoming_parser,
+                 similar_parser, aggressive=args.aggressive, watcher=watcher,
+                 follower=follower).cmdloop()
 
 
 if __name__ == '__main__':
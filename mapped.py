@@ -0,0 +1,414 @@
+"""Store close approaches in a compact fixed-width binary file opened with `mmap`.
+
+The `convert_to_binary` function writes linked close approaches, sorted by
+time, into a binary file of typed columns:
+
+    offset          contents
+    0               the magic bytes b'NEOCAD1\0'
+    8               the number of close approaches, as a uint64
+    16              the number of NEOs in the NEO file, as a uint64
+    24              time, as int64 minutes since 1970-01-01 00:00 (UTC)
+    24 + 8n         distance in au, as float64
+    24 + 16n        velocity in km/s, as float64
+    24 + 24n        position of the NEO in the NEO file, as int32
+
+All values are little-endian, where `n` is the number of close approaches.
+
+A `MappedNEODatabase` opens such a file with `mmap`, so that startup doesn't
+read the file at all. Queries evaluate filters directly on the mapped columns,
+so that only the pages touched by a query are faulted in, and only the
+matching close approaches are materialized as `CloseApproach` objects. Since
+the pages are mapped read-only, concurrent processes share the page cache.
+"""
+import bisect
+import datetime
+import mmap
+import operator
+import struct
+import sys
+import types
+from array import array
+
+from aggregate import aggregate
+from columnar import EPOCH, MINUTE, empty_columns
+from database import BATCH_SIZE, NEODatabase
+from filters import DateFilter, DistanceFilter, VelocityFilter, batched
+from models import CloseApproach
+
+
+MAGIC = b'NEOCAD1\0'
+HEADER = struct.Struct('<8sQQ')
+
+
+def is_binary_file(path):
+    """Return whether a path is a binary close approach file written by `convert_to_binary`."""
+    try:
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _little_endian(column):
+    """Return a typed array in little-endian byte order."""
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def convert_to_binary(neos, approaches, binary_path):
+    """Write linked close approaches into a binary close approach file.
+
+    The close approaches are written sorted by time. Close approaches of
+    unknown NEOs are skipped, as they are by `NEODatabase`.
+
+    :param neos: The collection of `NearEarthObject`s, in the order of the NEO file.
+    :param approaches: A collection of `CloseApproach`es linked to those NEOs.
+    :param binary_path: A path to the binary file to write.
+    :return: The number of close approaches written.
+    """
+    positions = {id(neo): i for i, neo in enumerate(neos)}
+    linked = sorted((approach for approach in approaches if approach.neo is not None),
+                    key=lambda approach: approach.time)
+
+    times = array('q', ((approach.time - EPOCH) // MINUTE for approach in linked))
+    distances = array('d', (approach.distance for approach in linked))
+    velocities = array('d', (approach.velocity for approach in linked))
+    neo_positions = array('i', (positions[id(approach.neo)] for approach in linked))
+
+    with open(binary_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(linked), len(neos)))
+        for column in (times, distances, velocities, neo_positions):
+            file.write(_little_endian(column).tobytes())
+    return len(linked)
+
+
+class MappedNEODatabase(NEODatabase):
+    """A database of NEOs whose close approaches are mapped from a binary file.
+
+    The `.approaches` attribute of an NEO is only filled in once the NEO is
+    fetched by designation or by name.
+    """
+    # The mapped column compared by each filter class, other than dates.
+    COLUMNS = {DistanceFilter: 'distances', VelocityFilter: 'velocities'}
+    # The k-d tree of similarity search isn't built over the mapped columns.
+    supports_similar = False
+
+    def __init__(self, neos, binary_path):
+        """Create a new `MappedNEODatabase`.
+
+        :param neos: The collection of `NearEarthObject`s, in the order of the NEO file.
+        :param binary_path: A path to a binary file written by `convert_to_binary`.
+        """
+        if sys.byteorder == 'big':
+            raise ValueError("Binary close approach files can only be mapped "
+                             "on little-endian hosts.")
+        super().__init__(neos, [])
+        with open(binary_path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, neo_count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{binary_path} is not a binary close approach file.")
+        if neo_count != len(neos):
+            raise ValueError(f"{binary_path} was written for {neo_count} NEOs, not {len(neos)}.")
+
+        self._count = count
+        # The designations, names, diameters and hazardous flags of the NEOs, once needed.
+        self._neo_table = None
+        # The offsets of each NEO's span of positions, and the positions grouped by NEO, once needed.
+        self._neo_spans = None
+        view = memoryview(self._map)
+        start = HEADER.size
+        self.times = view[start:start + 8 * count].cast('q')
+        self.distances = view[start + 8 * count:start + 16 * count].cast('d')
+        self.velocities = view[start + 16 * count:start + 24 * count].cast('d')
+        self.neo_positions = view[start + 24 * count:start + 28 * count].cast('i')
+
+    def __len__(self):
+        """Return the number of mapped close approaches."""
+        return self._count
+
+    def _approach(self, i):
+        """Materialize the close approach at one position as a linked `CloseApproach`."""
+        neo = self._neos[self.neo_positions[i]]
+        return CloseApproach(_designation=neo.designation,
+                             time=EPOCH + self.times[i] * MINUTE,
+                             distance=self.distances[i], velocity=self.velocities[i], neo=neo)
+
+    def _time_span(self, filters):
+        """Find the span of positions that satisfies every date filter, by binary search."""
+        start, stop = 0, self._count
+        for f in filters:
+            if type(f) is not DateFilter:
+                continue
+            day = (datetime.datetime.combine(f.value, datetime.time()) - EPOCH) // MINUTE
+            next_day = day + 24 * 60
+            if f.op in (operator.eq, operator.ge):
+                start = max(start, bisect.bisect_left(self.times, day))
+            if f.op is operator.gt:
+                start = max(start, bisect.bisect_left(self.times, next_day))
+            if f.op in (operator.eq, operator.le):
+                stop = min(stop, bisect.bisect_left(self.times, next_day))
+            if f.op is operator.lt:
+                stop = min(stop, bisect.bisect_left(self.times, day))
+        return start, max(start, stop)
+
+    def _positions(self, filters):
+        """Generate the positions of the close approaches that match some filters.
+
+        Date filters narrow the scan to a span of the time-sorted column. The
+        distance and velocity filters are evaluated on their mapped columns,
+        and the NEO filters on a precomputed table of matching NEOs.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of matching positions, in time order.
+        """
+        start, stop = self._time_span(filters)
+        columns = [(getattr(self, self.COLUMNS[type(f)]), f.op, f.value)
+                   for f in filters if type(f) in self.COLUMNS]
+        neo_filters = [f for f in filters
+                       if type(f) is not DateFilter and type(f) not in self.COLUMNS]
+        matching_neos = None
+        if neo_filters:
+            # NEO filters only look at the `.neo` of an approach, so test each NEO once.
+            matching_neos = []
+            for neo in self._neos:
+                probe = types.SimpleNamespace(neo=neo)
+                matching_neos.append(all(f(probe) for f in neo_filters))
+
+        for i in range(start, stop):
+            if matching_neos is not None and not matching_neos[self.neo_positions[i]]:
+                continue
+            if all(op(column[i], value) for column, op, value in columns):
+                yield i
+
+    def query(self, filters=()):
+        """Query close approaches to generate those that match a collection of filters.
+
+        The `CloseApproach` objects are generated in time order, and only the
+        matching ones are materialized.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        for i in self._positions(filters):
+            yield self._approach(i)
+
+    def count(self, filters=()):
+        """Count the close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        return sum(1 for _ in self._positions(filters))
+
+    def _spans(self, filters, batch_size):
+        """Generate the positions of the matches of some filters, in batches.
+
+        If only date filters are given, the matches are a span of the mapped
+        columns, so each batch is a `range` of positions.
+        """
+        if all(type(f) is DateFilter for f in filters):
+            start, stop = self._time_span(filters)
+            for i in range(start, stop, batch_size):
+                yield range(i, min(i + batch_size, stop))
+        else:
+            yield from batched(self._positions(filters), batch_size)
+
+    def _columns_at(self, positions):
+        """Gather the close approaches at some positions into columns.
+
+        A `range` of positions is copied by slicing the mapped columns.
+        Otherwise, the values at the positions are gathered one by one. The NEO
+        columns are looked up by the NEO column, in tables of the NEOs' values.
+        """
+        columns = empty_columns()
+        if isinstance(positions, range) and positions.step == 1:
+            start, stop = positions.start, positions.stop
+            columns['time'].frombytes(self.times[start:stop].cast('B'))
+            columns['distance'].frombytes(self.distances[start:stop].cast('B'))
+            columns['velocity'].frombytes(self.velocities[start:stop].cast('B'))
+        else:
+            columns['time'].extend(self.times[i] for i in positions)
+            columns['distance'].extend(self.distances[i] for i in positions)
+            columns['velocity'].extend(self.velocities[i] for i in positions)
+
+        if self._neo_table is None:
+            self._neo_table = ([neo.designation for neo in self._neos],
+                               [neo.name or '' for neo in self._neos],
+                               array('d', (neo.diameter for neo in self._neos)),
+                               array('b', (bool(neo.hazardous) for neo in self._neos)))
+        designations, names, diameters, hazardous = self._neo_table
+        neos = [self.neo_positions[i] for i in positions]
+        columns['designation'] = [designations[neo] for neo in neos]
+        columns['name'] = [names[neo] for neo in neos]
+        columns['diameter'].extend(diameters[neo] for neo in neos)
+        columns['hazardous'].extend(hazardous[neo] for neo in neos)
+        return columns
+
+    def columns(self, filters=(), limit=None):
+        """Gather the close approaches that match a collection of filters into columns.
+
+        If only date filters are given, the matches are a span of the mapped
+        columns, which are copied by slicing. Otherwise, the values at the
+        matching positions are gathered from the mapped columns. The NEO
+        columns are looked up by the NEO column. No `CloseApproach` objects
+        are materialized either way.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param limit: The maximum number of matches to gather, or None for all of them.
+        :return: A dictionary of columns, as written by `columnar.write_to_npz`.
+        """
+        if all(type(f) is DateFilter for f in filters):
+            start, stop = self._time_span(filters)
+            positions = range(start, min(stop, start + limit) if limit else stop)
+        else:
+            positions = array('l', self._positions(filters))
+            if limit:
+                positions = positions[:limit]
+        return self._columns_at(positions)
+
+    def query_batches(self, filters=(), batch_size=BATCH_SIZE, columns=False):
+        """Query close approaches to generate batches of those that match a collection of filters.
+
+        Batches of columns are gathered from the mapped columns, as by
+        `columns`, without materializing any `CloseApproach` objects.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param batch_size: The maximum number of close approaches in each batch.
+        :param columns: Whether to generate dictionaries of columns instead of lists
+                        of `CloseApproach` objects.
+        :return: A stream of non-empty batches of matching close approaches, in time order.
+        """
+        for positions in self._spans(filters, batch_size):
+            if columns:
+                yield self._columns_at(positions)
+            else:
+                yield [self._approach(i) for i in positions]
+
+    def aggregate(self, filters=(), group_by=(), field='distance', bins=None):
+        """Aggregate the close approaches that match a collection of filters.
+
+        The matches are aggregated from batches of columns, so no `CloseApproach`
+        objects are materialized.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param group_by: A sequence of group-by key names.
+        :param field: The name of the field to aggregate.
+        :param bins: An optional ascending sequence of histogram bin edges.
+        :return: A dictionary mapping tuples of group-by values to `Aggregate`s.
+        """
+        return aggregate(self.query_batches(filters, columns=True),
+                         group_by=group_by, field=field, bins=bins)
+
+    def positions(self, filters=(), within=None):
+        """Find the positions of the mapped close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param within: An optional sequence of candidate positions, in time order.
+        :return: An `array` of the matching positions, in time order.
+        """
+        if within is not None:
+            return array('l', (i for i in within
+                               if all(f(self._approach(i)) for f in filters)))
+        return array('l', self._positions(filters))
+
+    def approaches_at(self, positions):
+        """Materialize the close approaches at some positions.
+
+        :param positions: A sequence of positions, such as those found by `positions`.
+        :return: A list of `CloseApproach` objects, in the same order.
+        """
+        return [self._approach(i) for i in positions]
+
+    def next_approaches(self, t, n, filters=()):
+        """Find the next close approaches strictly after a time that match some filters.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, in time order.
+        """
+        results = []
+        for i in range(bisect.bisect_right(self.times, (t - EPOCH) // MINUTE), self._count):
+            if len(results) >= n:
+                break
+            approach = self._approach(i)
+            if approach.time > t and all(f(approach) for f in filters):
+                results.append(approach)
+        return results
+
+    def prev_approaches(self, t, n, filters=()):
+        """Find the last close approaches strictly before a time that match some filters.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, latest first.
+        """
+        results = []
+        for i in range(bisect.bisect_left(self.times, -((EPOCH - t) // MINUTE)) - 1, -1, -1):
+            if len(results) >= n:
+                break
+            approach = self._approach(i)
+            if all(f(approach) for f in filters):
+                results.append(approach)
+        return results
+
+    def _approaches_of(self, neo):
+        """Materialize the close approaches of an NEO, in time order.
+
+        The positions of the close approaches are grouped by NEO by a single
+        pass over the mapped NEO column, the first time any NEO's are needed,
+        in the same way as `NEODatabase` groups its approaches.
+        """
+        if self._neo_spans is None:
+            offsets = array('l', [0]) * (len(self._neos) + 1)
+            for position in self.neo_positions:
+                offsets[position + 1] += 1
+            for i in range(len(self._neos)):
+                offsets[i + 1] += offsets[i]
+            grouped = array('l', [0]) * self._count
+            cursors = array('l', offsets)
+            for i, position in enumerate(self.neo_positions):
+                grouped[cursors[position]] = i
+                cursors[position] += 1
+            self._neo_spans = (offsets, grouped)
+        offsets, grouped = self._neo_spans
+        position = self._neo_positions[id(neo)]
+        return [self._approach(i) for i in grouped[offsets[position]:offsets[position + 1]]]
+
+    def _with_approaches(self, neo):
+        """Fill in the `.approaches` of an NEO from the mapped columns, once."""
+        if neo is not None and not neo.approaches:
+            neo.approaches = self._approaches_of(neo)
+            # The summary precomputed over no approaches doesn't apply.
+            neo._summary = None
+        return neo
+
+    def get_neo_by_designation(self, designation):
+        """Find and return an NEO by its primary designation, with its close approaches.
+
+        :param designation: The primary designation of the NEO to search for.
+        :return: The `NearEarthObject` with the desired primary designation, or `None`.
+        """
+        return self._with_approaches(super().get_neo_by_designation(designation))
+
+    def get_neos_by_designations(self, designations):
+        """Find many NEOs by their primary designations at once, with their close approaches.
+
+        :param designations: An iterable of primary designations to search for.
+        :return: A dictionary mapping each matched designation to its `NearEarthObject`, in order.
+        """
+        matches = super().get_neos_by_designations(designations)
+        for neo in matches.values():
+            self._with_approaches(neo)
+        return matches
+
+    def get_neo_by_name(self, name):
+        """Find and return an NEO by its name, with its close approaches.
+
+        :param name: The name, as a string, of the NEO to search for.
+        :return: The `NearEarthObject` with the desired name, or `None`.
+        """
+        return self._with_approaches(super().get_neo_by_name(name))
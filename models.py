@@ -1,5 +1,89 @@
+import collections.abc
+import datetime
+
 from helpers import cd_to_datetime, datetime_to_str
 
+
+class ApproachesView(collections.abc.Sequence):
+    """A read-only view over a slice of a shared sequence of close approaches.
+
+    An `NEODatabase` keeps the close approaches of all NEOs grouped by NEO in
+    one contiguous list, and each NEO's `.approaches` is a view over its own
+    slice of that list, sorted by time.
+    """
+    __slots__ = ('_approaches', '_start', '_stop')
+
+    def __init__(self, approaches, start, stop):
+        """Create a new `ApproachesView` over `approaches[start:stop]`.
+
+        :param approaches: The shared sequence of close approaches.
+        :param start: The position of the first close approach of the view.
+        :param stop: The position after the last close approach of the view.
+        """
+        self._approaches = approaches
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        """Return `len(self)`."""
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        """Return `self[index]`, for an integer index or a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("approach index out of range")
+        return self._approaches[self._start + index]
+
+    def __iter__(self):
+        """Return `iter(self)`."""
+        for position in range(self._start, self._stop):
+            yield self._approaches[position]
+
+    def __repr__(self):
+        return f"ApproachesView({list(self)!r})"
+
+
+class ApproachSummary(collections.namedtuple('ApproachSummary',
+                                             ('count', 'closest', 'max_velocity'))):
+    """A summary of the close approaches of one NEO.
+
+    It holds the number of close approaches, the closest one (or None), and the
+    largest relative velocity among them (or NaN). Approaches whose distance or
+    velocity is NaN don't take part in the closest approach or the velocity.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, approaches):
+        """Summarize a collection of close approaches in a single pass.
+
+        :param approaches: A collection of `CloseApproach`es of one NEO.
+        :return: The `ApproachSummary` of those close approaches.
+        """
+        return cls(0, None, float('nan')).extend(approaches)
+
+    def extend(self, approaches):
+        """Summarize more close approaches along with those already summarized.
+
+        :param approaches: A collection of further `CloseApproach`es of the same NEO.
+        :return: The `ApproachSummary` of all of those close approaches.
+        """
+        count, closest, max_velocity = self
+        for approach in approaches:
+            count += 1
+            # NaN is the only value which isn't equal to itself, and is skipped.
+            if approach.distance == approach.distance and \
+                    (closest is None or approach.distance < closest.distance):
+                closest = approach
+            if approach.velocity == approach.velocity and not max_velocity >= approach.velocity:
+                max_velocity = approach.velocity
+        return type(self)(count, closest, max_velocity)
+
+
 class NearEarthObject:
     """A near-Earth object (NEO).
 
@@ -22,7 +106,9 @@ class NearEarthObject:
         self.hazardous = False if info.get('hazardous', '') == '' else info.get('hazardous')
   
         # Create an empty initial collection of linked approaches.
-        self.approaches =[]
+        self.approaches = ()
+        # The summary of the linked approaches, if precomputed by the `NEODatabase`.
+        self._summary = None
     @property
     def fullname(self):
         """Return a representation of the full name of this NEO."""
@@ -30,6 +116,31 @@ class NearEarthObject:
             return None
         else:
             return self.designation
+    @property
+    def summary(self):
+        """Return the `ApproachSummary` of this NEO's close approaches."""
+        if self._summary is not None:
+            return self._summary
+        return ApproachSummary.of(self.approaches)
+
+    def next_approach(self, after):
+        """Return this NEO's first close approach strictly after a time, or None.
+
+        The close approaches are assumed to be sorted by time, so that they can
+        be searched by bisection.
+
+        :param after: A naive `datetime`.
+        :return: The first `CloseApproach` after the given time, or None.
+        """
+        low, high = 0, len(self.approaches)
+        while low < high:
+            middle = (low + high) // 2
+            if self.approaches[middle].time <= after:
+                low = middle + 1
+            else:
+                high = middle
+        return self.approaches[low] if low < len(self.approaches) else None
+
     def strHazardous(self):
         """Return Hazardous Convert to a sentence that will fit into the __str__"""
         if self.hazardous:
@@ -79,7 +190,9 @@ class CloseApproach:
         self.time = info.get('time', '')  # TODO: Use the cd_to_datetime function for this attribute. cd_to_datetime이용해 문제 풀이
         self.distance = float('nan') if info.get('distance', '') == '' else info.get('distance')
         self.velocity = float('nan') if float(info.get('velocity', '')) == '' else float(info.get('velocity'))
-        self.time = cd_to_datetime(self.time)
+        # The time may also be given as an already converted `datetime`.
+        if not isinstance(self.time, datetime.datetime):
+            self.time = cd_to_datetime(self.time)
 
         # 참조된 NEO(근지 천체)를 위한 속성을 생성합니다. 원래 None이었습니다.
         self.neo = info.get('neo',None)
@@ -0,0 +1,266 @@
+"""Store close approach data as one file per year and load the years lazily.
+
+The `partition_cad_file` function splits a monolithic close approach JSON file
+(such as `cad.json`) into a directory of files named `cad-YYYY.json`, each in
+the same format as the original file but holding only one year's approaches.
+
+A `PartitionedNEODatabase` is an `NEODatabase` over such a directory. It only
+loads the partitions that overlap the date range of a query, on demand, and
+keeps the loaded partitions in a least-recently-used cache bounded by a memory
+budget. Each loaded partition is a small `NEODatabase` of its own, so queries
+within a partition benefit from its indexes and zone maps.
+"""
+import collections
+import json
+import operator
+import pathlib
+
+from database import BATCH_SIZE, NEODatabase
+from extract import load_approaches
+from filters import DateFilter
+from streams import open_stream
+
+
+# The file name pattern of the partitions in a partition directory.
+PARTITION_PATTERN = 'cad-*.json'
+# A rough estimate of the memory used by one loaded close approach, in bytes.
+APPROACH_BYTES = 600
+# The default memory budget of the loaded partitions, in megabytes.
+MEMORY_BUDGET_MB = 512
+
+
+def partition_cad_file(cad_json_path, directory):
+    """Split a close approach JSON file into one file per year.
+
+    The rows of the input file are copied verbatim - they aren't converted
+    into `CloseApproach` objects along the way.
+
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param directory: A path to the directory in which to write the partitions.
+    :return: A dictionary mapping each year to the number of approaches in its partition.
+    """
+    with open_stream(cad_json_path, "r") as file:
+        data = json.load(file)
+    fields = data['fields']
+    cd = fields.index('cd')
+
+    years = collections.defaultdict(list)
+    for entry in data['data']:
+        # The calendar date is in YYYY-bb-DD hh:mm format.
+        years[int(entry[cd][:4])].append(entry)
+
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for year, entries in years.items():
+        with open(directory / f"cad-{year:04d}.json", "w") as file:
+            json.dump({"count": len(entries), "fields": fields, "data": entries}, file)
+    return {year: len(entries) for year, entries in sorted(years.items())}
+
+
+def is_partition_directory(path):
+    """Return whether a path is a directory of close approach partitions."""
+    return pathlib.Path(path).is_dir()
+
+
+class PartitionedNEODatabase(NEODatabase):
+    """A database of NEOs whose close approaches are loaded one year at a time.
+
+    The `.approaches` attribute of each `NearEarthObject` only holds the close
+    approaches of the partitions which are currently loaded, so inspecting an
+    NEO only shows those. Each loaded partition is an `NEODatabase` over the
+    NEOs with close approaches in its year only, so that the memory and the
+    time taken by a partition grow with its year's approaches, not with every
+    NEO.
+    """
+    # Positions aren't stable while partitions are loaded and evicted, and similarity is
+    # relative to every close approach, but only some partitions are loaded.
+    supports_positions = False
+    supports_similar = False
+
+    def __init__(self, neos, directory, memory_budget=MEMORY_BUDGET_MB, rollup=False):
+        """Create a new `PartitionedNEODatabase`.
+
+        No close approaches are loaded until they're queried.
+
+        :param neos: A collection of `NearEarthObject`s.
+        :param directory: A path to a directory of partitions written by `partition_cad_file`.
+        :param memory_budget: The memory budget of the loaded partitions, in megabytes.
+        :param rollup: Whether to pre-aggregate each loaded partition into a `RollupCube`.
+        """
+        super().__init__(neos, [])
+        self._rollup_partitions = rollup
+        self._paths = {int(path.stem.split('-')[-1]): path
+                       for path in pathlib.Path(directory).glob(PARTITION_PATTERN)}
+        self._budget = memory_budget * 1024 * 1024
+        # Loaded partition databases, from the least to the most recently used.
+        self._loaded = collections.OrderedDict()
+        self._used = 0
+        self._scanned = []
+
+    @property
+    def years(self):
+        """Return the sorted years of the available partitions."""
+        return sorted(self._paths)
+
+    @property
+    def loaded_years(self):
+        """Return the years of the loaded partitions, from least to most recently used."""
+        return list(self._loaded)
+
+    def _years_for(self, filters):
+        """Return the sorted years of the partitions that overlap the date filters."""
+        first, last = None, None
+        for f in filters:
+            if type(f) is not DateFilter:
+                continue
+            if f.op in (operator.eq, operator.ge, operator.gt):
+                first = f.value.year if first is None else max(first, f.value.year)
+            if f.op in (operator.eq, operator.le, operator.lt):
+                last = f.value.year if last is None else min(last, f.value.year)
+        return [year for year in self.years
+                if (first is None or year >= first) and (last is None or year <= last)]
+
+    def _partition(self, year):
+        """Return the database of one year's partition, loading it if necessary."""
+        if year in self._loaded:
+            self._loaded.move_to_end(year)
+            return self._loaded[year]
+
+        approaches = load_approaches(self._paths[year])
+        # Only index the NEOs with close approaches in this year, looked up in this database.
+        neos = {}
+        for approach in approaches:
+            neo = self._neos_by_designation.get(approach._designation)
+            if neo is not None:
+                neos[id(neo)] = neo
+        partition = NEODatabase(list(neos.values()), approaches, rollup=self._rollup_partitions)
+        self._loaded[year] = partition
+        self._used += len(partition._approaches) * APPROACH_BYTES
+        # Evict the least recently used partitions, but never the one just loaded.
+        changed = [partition]
+        while self._used > self._budget and len(self._loaded) > 1:
+            changed.append(self._evict(next(iter(self._loaded))))
+        self._relink(changed)
+        return partition
+
+    def _evict(self, year):
+        """Unload one year's partition, and return it."""
+        partition = self._loaded.pop(year)
+        self._used -= len(partition._approaches) * APPROACH_BYTES
+        return partition
+
+    def _relink(self, changed):
+        """Point the `.approaches` of the NEOs of some partitions at those of the loaded partitions.
+
+        Each partition database links its own NEOs to its own approaches only,
+        so the approaches of an NEO across the loaded partitions are chained in
+        chronological order. Only the NEOs of the partitions just loaded or
+        evicted are relinked.
+
+        :param changed: The partition databases just loaded or evicted.
+        """
+        partitions = [self._loaded[year] for year in sorted(self._loaded)]
+        neos = {id(neo): neo for partition in changed for neo in partition._neos}
+        for key, neo in neos.items():
+            views = [partition._approaches_of(neo) for partition in partitions
+                     if key in partition._neo_positions]
+            views = [view for view in views if view]
+            if len(views) == 1:
+                neo.approaches = views[0]
+            else:
+                neo.approaches = [approach for view in views for approach in view]
+            # The summary precomputed by the latest partition doesn't apply.
+            neo._summary = None
+
+    def query(self, filters=()):
+        """Query close approaches to generate those that match a collection of filters.
+
+        Only the partitions that overlap the date range of the filters are
+        loaded and queried, in chronological order.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        self._scanned = []
+        for year in self._years_for(filters):
+            partition = self._partition(year)
+            self._scanned.append(partition)
+            yield from partition.query(filters)
+
+    def query_batches(self, filters=(), batch_size=BATCH_SIZE, columns=False):
+        """Query close approaches to generate batches of those that match a collection of filters.
+
+        The batches of each loaded partition are generated in turn, so a batch
+        never spans two partitions.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param batch_size: The maximum number of close approaches in each batch.
+        :param columns: Whether to generate dictionaries of columns instead of lists
+                        of `CloseApproach` objects.
+        :return: A stream of non-empty batches of matching close approaches.
+        """
+        self._scanned = []
+        for year in self._years_for(filters):
+            partition = self._partition(year)
+            self._scanned.append(partition)
+            yield from partition.query_batches(filters, batch_size, columns)
+
+    def count(self, filters=()):
+        """Count the close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        self._scanned = []
+        total = 0
+        for year in self._years_for(filters):
+            partition = self._partition(year)
+            self._scanned.append(partition)
+            total += partition.count(filters)
+        return total
+
+    def next_approaches(self, t, n, filters=()):
+        """Find the next close approaches strictly after a time that match some filters.
+
+        Partitions are loaded from the year of `t` onwards, only until `n`
+        matches are found.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, in time order.
+        """
+        results = []
+        for year in self._years_for(filters):
+            if year < t.year or len(results) >= n:
+                continue
+            results.extend(self._partition(year).next_approaches(t, n - len(results), filters))
+        return results
+
+    def prev_approaches(self, t, n, filters=()):
+        """Find the last close approaches strictly before a time that match some filters.
+
+        Partitions are loaded from the year of `t` backwards, only until `n`
+        matches are found.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, latest first.
+        """
+        results = []
+        for year in reversed(self._years_for(filters)):
+            if year > t.year or len(results) >= n:
+                continue
+            results.extend(self._partition(year).prev_approaches(t, n - len(results), filters))
+        return results
+
+    @property
+    def scan_stats(self):
+        """Return statistics about the latest scan over the approach blocks of all partitions.
+
+        :return: A dictionary with the number of `blocks` visited and the number of those `skipped`.
+        """
+        stats = [partition.scan_stats for partition in self._scanned]
+        return {"blocks": sum(s["blocks"] for s in stats),
+                "skipped": sum(s["skipped"] for s in stats)}
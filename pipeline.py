@@ -0,0 +1,103 @@
+"""Export close approaches in a pipeline of stages connected by bounded queues.
+
+`write_to_csv`, `write_to_json` and `write_to_ndjson` scan, serialize and
+write each close approach in turn, on one thread. `write_pipelined` splits that work
+into three stages, which run at the same time:
+
+1. The scan stage, on the calling thread, generates the matching close
+   approaches and gathers their attributes into batches of plain tuples,
+   which are cheap to send to another process. Batches of close approaches
+   from `NEODatabase.query_batches` are turned into tuples a batch at a time.
+2. The format stage, in a pool of processes, turns each batch into a chunk of
+   CSV, JSON or NDJSON text. This is the CPU-heavy part of an export.
+3. The write stage, on a thread, writes the chunks to the output file in
+   order, compressing them if the file's extension says so.
+
+The batches in flight are held in a bounded queue, so that a slow disk or
+slow formatting blocks the scan, instead of piling up batches in memory. The
+output file is the same as the one written by the corresponding writer.
+"""
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from streams import base_suffix, open_stream
+from write import FIELDNAMES, format_csv, format_json, format_ndjson, row_batches
+
+
+# The number of close approaches in each batch.
+BATCH_SIZE = 2000
+# The maximum number of batches in flight between the scan and write stages.
+QUEUE_SIZE = 8
+# The formatter of each output file extension, with the text before, between and after its chunks.
+FORMATS = {
+    '.csv': (format_csv, ",".join(FIELDNAMES) + "\r\n", "", ""),
+    '.json': (format_json, "[", ", ", "]"),
+    '.ndjson': (format_ndjson, "", "", ""),
+}
+
+
+def _write(chunks, filename, prefix, separator, suffix, errors):
+    """Run the write stage: write the formatted chunks from a queue, in order.
+
+    The queue holds futures of chunks, and ends with None. After an error, the
+    queue is still drained, so that the scan stage is never blocked forever.
+    """
+    try:
+        with open_stream(filename, 'w', newline='') as output:
+            output.write(prefix)
+            first = True
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                text = chunk.result()
+                if text:
+                    output.write(text if first else separator + text)
+                    first = False
+            output.write(suffix)
+    except BaseException as error:
+        errors.append(error)
+        while chunks.get() is not None:
+            pass
+
+
+def write_pipelined(results, filename, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE,
+                    processes=None):
+    """Write an iterable of `CloseApproach` objects to an output file, in a pipeline of stages.
+
+    The format of the output file is chosen by its extension (`.csv`, `.json`
+    or `.ndjson`, optionally followed by `.gz`, `.bz2` or `.xz`).
+
+    :param results: An iterable of `CloseApproach` objects, or of batches of them.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param batch_size: The number of close approaches in each batch.
+    :param queue_size: The maximum number of batches in flight.
+    :param processes: The number of formatting processes. Defaults to the number of CPUs.
+    :return: The number of close approaches written.
+    :raises ValueError: If the output file's extension isn't a supported format.
+    """
+    if base_suffix(filename) not in FORMATS:
+        raise ValueError(f"{filename} isn't a CSV, JSON or NDJSON output file.")
+    formatter, prefix, separator, suffix = FORMATS[base_suffix(filename)]
+
+    chunks = queue.Queue(maxsize=queue_size)
+    errors = []
+    writer = threading.Thread(target=_write, name='export-writer',
+                              args=(chunks, filename, prefix, separator, suffix, errors))
+    writer.start()
+    count = 0
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for batch in row_batches(results, batch_size):
+                if errors:
+                    break
+                # Blocks while the queue is full, until the write stage catches up.
+                chunks.put(pool.submit(formatter, batch))
+                count += len(batch)
+    finally:
+        chunks.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
+    return count
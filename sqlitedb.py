@@ -0,0 +1,393 @@
+"""Keep NEOs and their close approaches in a local SQLite database file.
+
+The `import_to_sqlite` function builds an SQLite database file from the NEO CSV
+file and the close approach JSON file, once. It holds a table of NEOs and a
+table of close approaches, indexed on the designation, name, time, distance and
+velocity.
+
+A `SQLiteNEODatabase` answers the same questions as an `NEODatabase` from such
+a file instead of from in-memory Python objects: the filters from
+`create_filters` are translated into a parameterized SQL query, and the
+matching rows are streamed back as `CloseApproach` objects.
+"""
+import datetime
+import math
+import operator
+import sqlite3
+
+from aggregate import aggregate
+from columnar import columns_of
+from database import BATCH_SIZE
+from extract import load_neos, load_approaches
+from filters import (DateFilter, DiameterFilter, DistanceFilter, HazardousFilter, VelocityFilter,
+                     batched)
+from helpers import datetime_to_str
+from models import NearEarthObject, CloseApproach
+
+
+SCHEMA = """
+CREATE TABLE neos (
+    id INTEGER PRIMARY KEY,
+    designation TEXT NOT NULL,
+    name TEXT,
+    diameter REAL,
+    hazardous INTEGER NOT NULL
+);
+CREATE TABLE approaches (
+    id INTEGER PRIMARY KEY,
+    neo_id INTEGER REFERENCES neos (id),
+    cd TEXT NOT NULL,
+    time TEXT NOT NULL,
+    distance REAL,
+    velocity REAL
+);
+CREATE UNIQUE INDEX neos_designation ON neos (designation);
+CREATE INDEX neos_name ON neos (name);
+CREATE INDEX approaches_neo ON approaches (neo_id, time);
+CREATE INDEX approaches_time ON approaches (time);
+CREATE INDEX approaches_distance ON approaches (distance);
+CREATE INDEX approaches_velocity ON approaches (velocity);
+"""
+
+# The column compared by each filter class.
+COLUMNS = {
+    DistanceFilter: 'a.distance',
+    VelocityFilter: 'a.velocity',
+    DiameterFilter: 'n.diameter',
+    HazardousFilter: 'n.hazardous',
+}
+
+# The SQL comparison for each filter comparator.
+OPERATORS = {
+    operator.eq: '=',
+    operator.ge: '>=',
+    operator.gt: '>',
+    operator.le: '<=',
+    operator.lt: '<',
+}
+
+# The number of designations looked up by each query of a bulk lookup, well
+# within SQLite's limit on the number of parameters.
+LOOKUP_CHUNK = 500
+
+# The close approach columns selected for every query, joined with their NEO.
+SELECT = "SELECT n.id, n.designation, n.name, n.diameter, n.hazardous, " \
+         "a.cd, a.distance, a.velocity " \
+         "FROM approaches a JOIN neos n ON n.id = a.neo_id"
+
+
+def _real(value):
+    """Return an SQLite REAL for a float, with NaN as NULL."""
+    return None if math.isnan(value) else value
+
+
+def _float(value):
+    """Return a float for an SQLite REAL, with NULL as NaN."""
+    return float('nan') if value is None else value
+
+
+def import_to_sqlite(neo_csv_path, cad_json_path, sqlite_path):
+    """Build an SQLite database file from the NEO and close approach data files.
+
+    Any existing tables in the database file are replaced. Close approaches of
+    unknown NEOs are skipped, as they are by `NEODatabase`.
+
+    :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+    :param cad_json_path: A path to a JSON file containing data about close approaches.
+    :param sqlite_path: A path to the SQLite database file to build.
+    :return: A tuple of the numbers of imported NEOs and close approaches.
+    """
+    neos = load_neos(neo_csv_path)
+    approaches = load_approaches(cad_json_path)
+
+    connection = sqlite3.connect(str(sqlite_path))
+    try:
+        with connection:
+            connection.executescript("DROP TABLE IF EXISTS approaches; DROP TABLE IF EXISTS neos;")
+            connection.executescript(SCHEMA)
+            connection.executemany(
+                "INSERT INTO neos (id, designation, name, diameter, hazardous) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((i, neo.designation, neo.name, _real(neo.diameter), int(neo.hazardous))
+                 for i, neo in enumerate(neos))
+            )
+            ids = {neo.designation: i for i, neo in enumerate(neos)}
+            rows = [(ids[approach._designation], approach.time.strftime("%Y-%b-%d %H:%M"),
+                     approach.time_str, _real(approach.distance), _real(approach.velocity))
+                    for approach in approaches if approach._designation in ids]
+            connection.executemany(
+                "INSERT INTO approaches (neo_id, cd, time, distance, velocity) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+    finally:
+        connection.close()
+    return len(neos), len(rows)
+
+
+class SQLiteNEODatabase:
+    """A database of near-Earth objects and their close approaches in an SQLite file.
+
+    A `SQLiteNEODatabase` offers the same interface as an `NEODatabase`. Each
+    NEO is only built once, when first fetched, and its `.approaches` are
+    loaded from the database file at the same time.
+    """
+    # Close approaches have no positions in memory, and there's no k-d tree to search.
+    supports_positions = False
+    supports_similar = False
+
+    def __init__(self, sqlite_path):
+        """Create a new `SQLiteNEODatabase`.
+
+        :param sqlite_path: A path to an SQLite database file built by `import_to_sqlite`.
+        """
+        self._connection = sqlite3.connect(str(sqlite_path))
+        self._neos = {}
+
+    def close(self):
+        """Close the connection to the database file."""
+        self._connection.close()
+
+    def _neo(self, row):
+        """Return the `NearEarthObject` of a row starting with the NEO columns."""
+        neo = self._neos.get(row[0])
+        if neo is None:
+            neo = self._neos[row[0]] = NearEarthObject(
+                designation=row[1], name=row[2], diameter=_float(row[3]),
+                hazardous=bool(row[4])
+            )
+        return neo
+
+    def _approach(self, row):
+        """Return the linked `CloseApproach` of a row of `SELECT`ed columns."""
+        neo = self._neo(row)
+        return CloseApproach(_designation=neo.designation, time=row[5],
+                             distance=_float(row[6]), velocity=_float(row[7]), neo=neo)
+
+    def _get_neo(self, column, value):
+        """Find an NEO by the value of one column, loading its close approaches."""
+        row = self._connection.execute(
+            f"SELECT id, designation, name, diameter, hazardous FROM neos WHERE {column} = ? "
+            "ORDER BY id LIMIT 1", (value,)
+        ).fetchone()
+        if row is None:
+            return None
+        neo = self._neo(row)
+        if not neo.approaches:
+            neo.approaches = [self._approach(approach_row) for approach_row in
+                              self._connection.execute(f"{SELECT} WHERE n.id = ? ORDER BY a.time",
+                                                       (row[0],))]
+        return neo
+
+    def get_neo_by_designation(self, designation):
+        """Find and return an NEO by its primary designation.
+
+        :param designation: The primary designation of the NEO to search for.
+        :return: The `NearEarthObject` with the desired primary designation, or `None`.
+        """
+        return self._get_neo('designation', designation)
+
+    def get_neos_by_designations(self, designations):
+        """Find many NEOs by their primary designations at once, with their close approaches.
+
+        The designations are looked up in chunks, each with one indexed query
+        for the NEOs and one for all of their close approaches.
+
+        :param designations: An iterable of primary designations to search for.
+        :return: A dictionary mapping each matched designation to its `NearEarthObject`, in order.
+        """
+        designations = list(dict.fromkeys(designations))
+        found = {}
+        for start in range(0, len(designations), LOOKUP_CHUNK):
+            chunk = designations[start:start + LOOKUP_CHUNK]
+            marks = ', '.join('?' * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT id, designation, name, diameter, hazardous FROM neos "
+                f"WHERE designation IN ({marks})", chunk
+            ).fetchall()
+            neos = {row[0]: self._neo(row) for row in rows}
+            missing = [i for i, neo in neos.items() if not neo.approaches]
+            if missing:
+                approaches = {i: [] for i in missing}
+                for row in self._connection.execute(
+                        f"{SELECT} WHERE n.id IN ({', '.join('?' * len(missing))}) "
+                        "ORDER BY a.time", missing):
+                    approaches[row[0]].append(self._approach(row))
+                for i in missing:
+                    neos[i].approaches = approaches[i]
+            found.update((neo.designation, neo) for neo in neos.values())
+        return {designation: found[designation] for designation in designations
+                if designation in found}
+
+    def get_neo_by_name(self, name):
+        """Find and return an NEO by its name.
+
+        :param name: The name, as a string, of the NEO to search for.
+        :return: The `NearEarthObject` with the desired name, or `None`.
+        """
+        if not name:
+            return None
+        return self._get_neo('name', name)
+
+    def search_prefix(self, prefix, limit=10, field=None):
+        """Find NEOs whose designation or name starts with a prefix, ignoring ASCII case.
+
+        :param prefix: The prefix, as a string, to search for.
+        :param limit: The maximum number of NEOs to return, or None for all of them.
+        :param field: 'designation' or 'name' to only search one of them, or None for both.
+        :return: A list of matching `NearEarthObject`s, sorted by their matching value.
+        """
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        matches = []
+        for column in [field] if field else ['designation', 'name']:
+            rows = self._connection.execute(
+                f"SELECT id, designation, name, diameter, hazardous FROM neos "
+                f"WHERE {column} LIKE ? ESCAPE '\\' ORDER BY {column} COLLATE NOCASE LIMIT ?",
+                (pattern, -1 if limit is None else limit)
+            )
+            matches.extend((row[2 if column == 'name' else 1].casefold(), row[0], row)
+                           for row in rows)
+        results, seen = [], set()
+        for _, i, row in sorted(matches, key=lambda match: match[:2]):
+            if i not in seen:
+                seen.add(i)
+                results.append(self._neo(row))
+        return results[:limit] if limit is not None else results
+
+    @staticmethod
+    def _where(filters):
+        """Translate a collection of filters into an SQL condition.
+
+        Date filters are translated into ranges of the indexed time column.
+        Filters that can't be translated are returned to be applied in Python.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A tuple of the SQL condition, its parameters, and the untranslated filters.
+        """
+        conditions, parameters, remaining = [], [], []
+        for f in filters:
+            if type(f) is DateFilter and f.op in OPERATORS:
+                day = f.value.isoformat()
+                next_day = (f.value + datetime.timedelta(days=1)).isoformat()
+                if f.op in (operator.eq, operator.ge):
+                    conditions.append("a.time >= ?")
+                    parameters.append(day)
+                if f.op is operator.gt:
+                    conditions.append("a.time >= ?")
+                    parameters.append(next_day)
+                if f.op in (operator.eq, operator.le):
+                    conditions.append("a.time < ?")
+                    parameters.append(next_day)
+                if f.op is operator.lt:
+                    conditions.append("a.time < ?")
+                    parameters.append(day)
+            elif type(f) in COLUMNS and f.op in OPERATORS:
+                conditions.append(f"{COLUMNS[type(f)]} {OPERATORS[f.op]} ?")
+                parameters.append(f.value)
+            else:
+                remaining.append(f)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, parameters, remaining
+
+    def query(self, filters=()):
+        """Query close approaches to generate those that match a collection of filters.
+
+        The `CloseApproach` objects are generated in the order of the database
+        file, which is the order of the imported close approach data file.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A stream of matching `CloseApproach` objects.
+        """
+        where, parameters, remaining = self._where(filters)
+        for row in self._connection.execute(f"{SELECT}{where} ORDER BY a.id", parameters):
+            approach = self._approach(row)
+            if all(f(approach) for f in remaining):
+                yield approach
+
+    def query_batches(self, filters=(), batch_size=BATCH_SIZE, columns=False):
+        """Query close approaches to generate batches of those that match a collection of filters.
+
+        The rows are fetched from SQLite a batch at a time, with `fetchmany`,
+        and the filters that aren't translated into SQL are applied to them.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param batch_size: The maximum number of close approaches in each batch.
+        :param columns: Whether to generate dictionaries of columns instead of lists
+                        of `CloseApproach` objects.
+        :return: A stream of non-empty batches of matching close approaches.
+        """
+        where, parameters, remaining = self._where(filters)
+        cursor = self._connection.execute(f"{SELECT}{where} ORDER BY a.id", parameters)
+        approaches = (approach for rows in iter(lambda: cursor.fetchmany(batch_size), [])
+                      for approach in map(self._approach, rows)
+                      if all(f(approach) for f in remaining))
+        for batch in batched(approaches, batch_size):
+            yield columns_of(batch) if columns else batch
+
+    def count(self, filters=()):
+        """Count the close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: The number of matching close approaches.
+        """
+        where, parameters, remaining = self._where(filters)
+        if remaining:
+            return sum(1 for _ in self.query(filters))
+        return self._connection.execute(
+            f"SELECT COUNT(*) FROM approaches a JOIN neos n ON n.id = a.neo_id{where}", parameters
+        ).fetchone()[0]
+
+    def _around(self, t, n, filters, comparison, order):
+        """Find at most `n` matching close approaches on one side of a time, in an order."""
+        where, parameters, remaining = self._where(filters)
+        where = f"{where} AND" if where else " WHERE"
+        results = []
+        rows = self._connection.execute(
+            f"{SELECT}{where} a.time {comparison} ? ORDER BY a.time {order}, a.id {order}",
+            parameters + [datetime_to_str(t)]
+        )
+        for row in rows:
+            if len(results) >= n:
+                break
+            approach = self._approach(row)
+            if all(f(approach) for f in remaining):
+                results.append(approach)
+        return results
+
+    def next_approaches(self, t, n, filters=()):
+        """Find the next close approaches strictly after a time that match some filters.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, in time order.
+        """
+        return self._around(t, n, filters, '>', 'ASC')
+
+    def prev_approaches(self, t, n, filters=()):
+        """Find the last close approaches strictly before a time that match some filters.
+
+        :param t: A naive `datetime`.
+        :param n: The maximum number of close approaches to find.
+        :param filters: A collection of filters capturing user-specified criteria.
+        :return: A list of at most `n` matching `CloseApproach`es, latest first.
+        """
+        return self._around(t, n, filters, '<', 'DESC')
+
+    def aggregate(self, filters=(), group_by=(), field='distance', bins=None):
+        """Aggregate the close approaches that match a collection of filters.
+
+        :param filters: A collection of filters capturing user-specified criteria.
+        :param group_by: A sequence of group-by key names.
+        :param field: The name of the field to aggregate.
+        :param bins: An optional ascending sequence of histogram bin edges.
+        :return: A dictionary mapping tuples of group-by values to `Aggregate`s.
+        """
+        return aggregate(self.query_batches(filters), group_by=group_by, field=field, bins=bins)
+
+    @property
+    def scan_stats(self):
+        """Return statistics about the latest scan, which SQLite doesn't split into blocks.
+
+        :return: A dictionary with the number of `blocks` visited and the number of those `skipped`.
+        """
+        return {"blocks": 0, "skipped": 0}
@@ -0,0 +1,78 @@
+"""Open data files and output files as text streams, (de)compressing them on the fly.
+
+Files compressed by gzip, bz2 or xz are supported, by the standard library's
+`gzip`, `bz2` and `lzma` modules:
+
+- An input file is decompressed if it starts with the magic bytes of one of
+  those formats, whatever its extension.
+- An output file is compressed if its extension (`.gz`, `.bz2` or `.xz`, as in
+  `results.csv.gz`) names one of those formats.
+
+The file is never decompressed to disk: it's decompressed as it's read.
+"""
+import bz2
+import gzip
+import lzma
+import pathlib
+
+
+# The compression modules, by the extension of the files they compress.
+COMPRESSIONS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+# The magic bytes which start the files of each compression module.
+MAGIC = ((b'\x1f\x8b', gzip), (b'BZh', bz2), (b'\xfd7zXZ\x00', lzma))
+# The compression level of output files, trading some size for speed.
+COMPRESS_LEVEL = 6
+
+
+def compression_of(path):
+    """Return the compression module named by the extension of a path, or None.
+
+    :param path: A Path-like object, or None.
+    :return: The `gzip`, `bz2` or `lzma` module, or None for an uncompressed file.
+    """
+    if path is None:
+        return None
+    return COMPRESSIONS.get(pathlib.PurePath(path).suffix.lower())
+
+
+def sniff(path):
+    """Detect the compression of an existing file by its magic bytes.
+
+    :param path: A Path-like object pointing to a file.
+    :return: The `gzip`, `bz2` or `lzma` module, or None for an uncompressed file.
+    """
+    with open(path, 'rb') as file:
+        head = file.read(6)
+    for magic, module in MAGIC:
+        if head.startswith(magic):
+            return module
+    return None
+
+
+def base_suffix(path):
+    """Return the extension of a path, ignoring the extension of its compression.
+
+    :param path: A Path-like object.
+    :return: The extension, such as '.csv' for both `results.csv` and `results.csv.gz`.
+    """
+    path = pathlib.PurePath(path)
+    if compression_of(path) is not None:
+        path = path.with_suffix('')
+    return path.suffix.lower()
+
+
+def open_stream(path, mode='r', newline=None):
+    """Open a file as a text stream, decompressing or compressing it on the fly.
+
+    :param path: A Path-like object pointing to a file.
+    :param mode: 'r' to read, or 'w' to write.
+    :param newline: How to translate line endings, as for the built-in `open`.
+    :return: A text file object.
+    """
+    module = sniff(path) if 'r' in mode else compression_of(path)
+    if module is None:
+        return open(path, mode, newline=newline)
+    if 'w' in mode:
+        level = {'preset': COMPRESS_LEVEL} if module is lzma else {'compresslevel': COMPRESS_LEVEL}
+        return module.open(path, mode + 't', newline=newline, **level)
+    return module.open(path, mode + 't', newline=newline)
@@ -0,0 +1,81 @@
+"""Check that `aggregate`ing an `NEODatabase` summarizes matching close approaches.
+
+The aggregates computed in a single pass by `NEODatabase.aggregate` are
+compared against the same statistics computed naively from the list of
+matching close approaches.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_aggregate
+"""
+import datetime
+import math
+import pathlib
+import unittest
+
+from aggregate import Aggregate, UnsupportedAggregateError
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestAggregate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def test_aggregate_without_groups_summarizes_all_approaches(self):
+        groups = self.db.aggregate()
+        self.assertEqual(list(groups), [()])
+        stats = groups[()]
+        distances = [approach.distance for approach in self.approaches]
+        self.assertEqual(stats.count, len(self.approaches))
+        self.assertEqual(stats.minimum, min(distances))
+        self.assertEqual(stats.maximum, max(distances))
+        self.assertAlmostEqual(stats.mean, sum(distances) / len(distances))
+
+    def test_aggregate_by_month_with_filters(self):
+        filters = create_filters(start_date=datetime.date(2020, 6, 1), hazardous=True)
+        groups = self.db.aggregate(filters, group_by=('month', 'hazardous'), field='velocity')
+
+        expected = {}
+        for approach in self.db.query(filters):
+            key = (approach.time.strftime('%Y-%m'), True)
+            expected.setdefault(key, []).append(approach.velocity)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(set(groups), set(expected))
+        for key, velocities in expected.items():
+            self.assertEqual(groups[key].count, len(velocities))
+            self.assertEqual(groups[key].maximum, max(velocities))
+
+    def test_aggregate_diameter_ignores_unknown_sizes(self):
+        groups = self.db.aggregate(group_by=('neo',), field='diameter')
+        unknown = self.db.get_neo_by_designation('2020 BS')
+        stats = groups[(unknown.designation,)]
+        self.assertEqual(stats.count, len(unknown.approaches))
+        self.assertTrue(math.isnan(stats.mean))
+
+    def test_aggregate_histogram(self):
+        stats = Aggregate(bins=(0, 1, 2))
+        for value in (0, 0.5, 1, 2, 3, math.nan):
+            stats.add(value)
+        self.assertEqual(stats.count, 6)
+        self.assertEqual(stats.histogram, [2, 2])
+        self.assertEqual(stats.maximum, 3)
+
+    def test_aggregate_rejects_unknown_keys(self):
+        with self.assertRaises(UnsupportedAggregateError):
+            self.db.aggregate(group_by=('weekday',))
+        with self.assertRaises(UnsupportedAggregateError):
+            self.db.aggregate(field='albedo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Check that every engine generates batches of the close approaches that `query` generates.
+
+The batches, as lists of close approaches or as dictionaries of columns, are
+compared to the stream of `query`, and fed to the writers and to `aggregate`.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_batches
+"""
+import datetime
+import math
+import pathlib
+import tempfile
+import unittest
+
+from aggregate import aggregate
+from columnar import columns_of
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from mapped import MappedNEODatabase, convert_to_binary
+from partitions import PartitionedNEODatabase, partition_cad_file
+from sqlitedb import SQLiteNEODatabase, import_to_sqlite
+from write import write_to_csv, write_to_json, write_to_ndjson
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+CRITERIA = (
+    {},
+    {'start_date': datetime.date(2020, 3, 1), 'end_date': datetime.date(2020, 5, 31)},
+    {'distance_max': 0.1, 'velocity_min': 10},
+    {'hazardous': True},
+)
+
+
+def serialize(approaches):
+    return [(approach.neo.designation, approach.time_str, approach.distance)
+            for approach in approaches]
+
+
+def same(a, b):
+    """Compare two values, where NaN is the same as NaN."""
+    return a == b or (isinstance(a, float) and isinstance(b, float)
+                      and math.isnan(a) and math.isnan(b))
+
+
+class TestQueryBatches(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        root = pathlib.Path(cls.tmp.name)
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        convert_to_binary(cls.db._neos, cls.db._approaches, root / 'cad.bin')
+        import_to_sqlite(TEST_NEO_FILE, TEST_CAD_FILE, root / 'neos.sqlite')
+        partition_cad_file(TEST_CAD_FILE, root / 'partitions')
+        cls.engines = {
+            'memory': cls.db,
+            'mapped': MappedNEODatabase(load_neos(TEST_NEO_FILE), root / 'cad.bin'),
+            'sqlite': SQLiteNEODatabase(root / 'neos.sqlite'),
+            'partitions': PartitionedNEODatabase(load_neos(TEST_NEO_FILE), root / 'partitions'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engines['sqlite'].close()
+        cls.tmp.cleanup()
+
+    def test_batches_match_query(self):
+        for engine, database in self.engines.items():
+            for criteria in CRITERIA:
+                with self.subTest(engine=engine, **criteria):
+                    filters = create_filters(**criteria)
+                    batches = list(database.query_batches(filters, batch_size=100))
+                    self.assertTrue(all(0 < len(batch) <= 100 for batch in batches))
+                    self.assertEqual(serialize(approach for batch in batches for approach in batch),
+                                     serialize(database.query(filters)))
+
+    def test_column_batches_match_query(self):
+        for engine, database in self.engines.items():
+            for criteria in CRITERIA:
+                with self.subTest(engine=engine, **criteria):
+                    filters = create_filters(**criteria)
+                    expected = columns_of(database.query(filters))
+                    actual = {name: [] for name in expected}
+                    for batch in database.query_batches(filters, batch_size=256, columns=True):
+                        for name, values in batch.items():
+                            actual[name].extend(values)
+                    for name in expected:
+                        self.assertEqual(len(actual[name]), len(expected[name]))
+                        self.assertTrue(all(map(same, actual[name], expected[name])), name)
+
+    def test_writers_accept_batches(self):
+        filters = create_filters(distance_max=0.2)
+        results = list(self.db.query(filters))
+        with tempfile.TemporaryDirectory() as directory:
+            root = pathlib.Path(directory)
+            for writer, suffix in ((write_to_csv, '.csv'), (write_to_json, '.json'),
+                                   (write_to_ndjson, '.ndjson')):
+                with self.subTest(suffix=suffix):
+                    writer(results, root / ('expected' + suffix))
+                    writer(self.db.query_batches(filters, batch_size=50),
+                           root / ('lists' + suffix))
+                    writer(self.engines['mapped'].query_batches(filters, columns=True),
+                           root / ('columns' + suffix))
+                    expected = (root / ('expected' + suffix)).read_text()
+                    self.assertEqual((root / ('lists' + suffix)).read_text(), expected)
+                    # The mapped engine generates matches in time order.
+                    self.assertEqual(sorted((root / ('columns' + suffix)).read_text().splitlines()),
+                                     sorted(expected.splitlines()))
+
+    def test_aggregate_accepts_batches(self):
+        expected = aggregate(self.db.query(), group_by=('month', 'hazardous'), field='diameter')
+        for columns in (False, True):
+            with self.subTest(columns=columns):
+                batches = self.db.query_batches(batch_size=300, columns=columns)
+                groups = aggregate(batches, group_by=('month', 'hazardous'), field='diameter')
+                self.assertEqual({group: stats.serialize() for group, stats in groups.items()},
+                                 {group: stats.serialize() for group, stats in expected.items()})
+
+    def test_mapped_aggregate_uses_columns(self):
+        groups = self.engines['mapped'].aggregate(group_by=('year',), field='velocity')
+        expected = self.db.aggregate(group_by=('year',), field='velocity')
+        self.assertEqual(list(groups), list(expected))
+        for group in expected:
+            self.assertEqual(groups[group].count, expected[group].count)
+            self.assertAlmostEqual(groups[group].mean, expected[group].mean)
+
+
+if __name__ == '__main__':
+    unittest.main()
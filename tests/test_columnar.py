@@ -0,0 +1,125 @@
+"""Check that close approaches are written as typed columns to `.npz` files.
+
+The `.npz` files are read back by `read_npz`, and by `numpy.load` if numpy is
+installed. The columns sliced from a `MappedNEODatabase` should match those
+gathered from the close approaches of an `NEODatabase`.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_columnar
+"""
+import ast
+import datetime
+import importlib.util
+import math
+import pathlib
+import tempfile
+import unittest
+import zipfile
+
+from columnar import COLUMNS, NPY_ALIGNMENT, columns_of, read_npz, write_to_arrow, write_to_npz
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from mapped import EPOCH, MINUTE, MappedNEODatabase, convert_to_binary
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def rows(columns):
+    """Zip columns into rows, with NaNs replaced by None so that they compare equal."""
+    return [tuple(None if isinstance(value, float) and math.isnan(value) else value
+                  for value in row)
+            for row in zip(*(columns[name] for name, _, _ in COLUMNS))]
+
+
+class TestColumnarExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.root = pathlib.Path(cls.tmp.name)
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        binary_file = cls.root / 'cad.bin'
+        convert_to_binary(cls.db._neos, cls.db._approaches, binary_file)
+        cls.mapped = MappedNEODatabase(load_neos(TEST_NEO_FILE), binary_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_columns_of_approaches(self):
+        approaches = list(self.db.query())[:20]
+        columns = columns_of(approaches)
+        self.assertEqual(len(columns['time']), 20)
+        for i, approach in enumerate(approaches):
+            self.assertEqual(EPOCH + columns['time'][i] * MINUTE, approach.time)
+            self.assertEqual(columns['designation'][i], approach.neo.designation)
+            self.assertEqual(columns['name'][i], approach.neo.name or '')
+            self.assertEqual(columns['hazardous'][i], approach.neo.hazardous)
+
+    def test_npz_round_trip(self):
+        columns = columns_of(self.db.query())
+        path = self.root / 'results.npz'
+        write_to_npz(columns, path)
+        self.assertEqual(rows(read_npz(path)), rows(columns))
+
+    def test_npy_headers(self):
+        path = self.root / 'headers.npz'
+        write_to_npz(columns_of(list(self.db.query())[:5]), path)
+        with zipfile.ZipFile(path) as archive:
+            self.assertEqual(archive.namelist(), [name + '.npy' for name, _, _ in COLUMNS])
+            raw = archive.read('time.npy')
+        size = int.from_bytes(raw[8:10], 'little')
+        self.assertEqual((10 + size) % NPY_ALIGNMENT, 0)
+        header = ast.literal_eval(raw[10:10 + size].decode('latin1'))
+        self.assertEqual(header, {'descr': '<M8[m]', 'fortran_order': False, 'shape': (5,)})
+
+    def test_mapped_columns_match(self):
+        criteria = (
+            {},
+            {'start_date': datetime.date(2020, 3, 1), 'end_date': datetime.date(2020, 3, 31)},
+            {'distance_max': 0.05, 'hazardous': False},
+            {'velocity_min': 20, 'diameter_min': 0.1},
+        )
+        for kwargs in criteria:
+            with self.subTest(**kwargs):
+                filters = create_filters(**kwargs)
+                expected = sorted(rows(columns_of(self.db.query(filters))),
+                                  key=lambda row: row[:4])
+                actual = rows(self.mapped.columns(filters))
+                self.assertEqual(sorted(actual, key=lambda row: row[:4]), expected)
+
+    def test_mapped_columns_limit(self):
+        filters = create_filters(start_date=datetime.date(2020, 6, 1))
+        columns = self.mapped.columns(filters, limit=7)
+        self.assertEqual(len(columns['time']), 7)
+        self.assertEqual(len(columns['designation']), 7)
+        self.assertEqual(rows(columns), rows(columns_of(list(self.mapped.query(filters))[:7])))
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), "numpy isn't installed")
+    def test_numpy_loads_npz(self):
+        import numpy
+        path = self.root / 'numpy.npz'
+        columns = columns_of(self.db.query())
+        write_to_npz(columns, path)
+        with numpy.load(path) as data:
+            self.assertEqual(data['time'].dtype, numpy.dtype('M8[m]'))
+            self.assertEqual(data['designation'].tolist(), columns['designation'])
+            self.assertEqual(data['hazardous'].tolist(), [bool(h) for h in columns['hazardous']])
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow isn't installed")
+    def test_arrow_file(self):
+        import pyarrow.ipc
+        path = self.root / 'results.arrow'
+        columns = columns_of(self.db.query())
+        write_to_arrow(columns, path)
+        table = pyarrow.ipc.open_file(str(path)).read_all()
+        self.assertEqual(table.num_rows, len(columns['time']))
+        self.assertEqual(table.column('designation').to_pylist(), columns['designation'])
+
+
+if __name__ == '__main__':
+    unittest.main()
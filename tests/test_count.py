@@ -0,0 +1,99 @@
+"""Check that `count`ing close approaches agrees with `query`ing them.
+
+`NEODatabase.count` takes different paths depending on which filters are given
+- index arithmetic, an index-narrowed scan, or a full scan - and each of them
+must agree with the number of results generated by `NEODatabase.query`.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_count
+"""
+import datetime
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestCount(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        # Without a result cache, so that counts never replay the results of queries.
+        cls.db = NEODatabase(cls.neos, cls.approaches, result_cache=0)
+
+    def assertCountMatchesQuery(self, **criteria):
+        filters = create_filters(**criteria)
+        expected = sum(1 for _ in self.db.query(filters))
+        self.assertEqual(self.db.count(filters), expected, msg=f"Count mismatch for {criteria}.")
+
+    def test_count_all(self):
+        self.assertEqual(self.db.count(), len(self.approaches))
+        self.assertCountMatchesQuery()
+
+    def test_count_single_indexed_attribute(self):
+        self.assertCountMatchesQuery(date=datetime.date(2020, 3, 2))
+        self.assertCountMatchesQuery(start_date=datetime.date(2020, 4, 1),
+                                     end_date=datetime.date(2020, 6, 30))
+        self.assertCountMatchesQuery(distance_min=0.1, distance_max=0.4)
+        self.assertCountMatchesQuery(velocity_max=15)
+
+    def test_count_empty_range(self):
+        self.assertEqual(self.db.count(create_filters(distance_min=0.5, distance_max=0.1)), 0)
+
+    def test_count_mixed_attributes(self):
+        self.assertCountMatchesQuery(start_date=datetime.date(2020, 3, 1), velocity_min=20)
+        self.assertCountMatchesQuery(distance_max=0.05, hazardous=True)
+        self.assertCountMatchesQuery(diameter_min=0.5, hazardous=False)
+
+
+class TestRollupCount(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches, rollup=True, result_cache=0)
+
+    def assertCountMatchesQuery(self, **criteria):
+        filters = create_filters(**criteria)
+        expected = sum(1 for _ in self.db.query(filters))
+        self.assertEqual(self.db.count(filters), expected, msg=f"Count mismatch for {criteria}.")
+
+    def test_rollup_count_aligned_with_buckets_scans_nothing(self):
+        self.assertCountMatchesQuery(start_date=datetime.date(2020, 1, 1), hazardous=True,
+                                     distance_max=0.05, diameter_min=0.14)
+        self.assertEqual(self.db._rollup.scanned, 0)
+
+    def test_rollup_count_scans_only_partial_buckets(self):
+        self.assertCountMatchesQuery(start_date=datetime.date(2020, 5, 17), distance_min=0.03,
+                                     diameter_max=0.3, hazardous=False)
+        self.assertGreater(self.db._rollup.scanned, 0)
+        self.assertLess(self.db._rollup.scanned, len(self.approaches))
+
+    def test_rollup_count_ignores_unknown_diameters(self):
+        self.assertCountMatchesQuery(diameter_max=10, hazardous=True)
+        self.assertCountMatchesQuery(diameter_min=0)
+
+
+    def test_rollup_count_skips_approaches_without_an_neo(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        approaches[5]._designation = 'NOT REAL'
+        db = NEODatabase(load_neos(TEST_NEO_FILE), approaches, rollup=True, result_cache=0)
+        self.assertEqual(db.count(create_filters(start_date=datetime.date(2020, 1, 1))),
+                         len(approaches))
+        for criteria in ({'hazardous': False}, {'diameter_min': 0}, {'distance_max': 0.1}):
+            with self.subTest(**criteria):
+                filters = create_filters(**criteria)
+                expected = sum(1 for approach in approaches if all(f(approach) for f in filters))
+                self.assertEqual(db.count(filters), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ To run these tests from the project root, run:
 
 These tests should pass when Task 2 is complete.
 """
+import datetime
 import pathlib
 import math
 import unittest
@@ -54,6 +55,44 @@ class TestDatabase(unittest.TestCase):
                     self.fail(f"{approach} appears in the approaches of multiple NEOs.")
                 seen.add(approach)
 
+    def test_database_construction_sorts_each_neos_approaches_by_time(self):
+        for neo in self.neos:
+            times = [approach.time for approach in neo.approaches]
+            self.assertEqual(times, sorted(times))
+
+    def test_database_construction_groups_approaches_by_neo(self):
+        grouped = [approach for neo in self.neos for approach in neo.approaches]
+        self.assertEqual(grouped, self.db._by_neo)
+        neo = self.db.get_neo_by_designation('2102')
+        self.assertEqual(list(neo.approaches[-1:]), [neo.approaches[len(neo.approaches) - 1]])
+
+    def test_database_construction_summarizes_each_neos_approaches(self):
+        for neo in self.neos:
+            summary = neo.summary
+            self.assertEqual(summary.count, len(neo.approaches))
+            if neo.approaches:
+                self.assertEqual(summary.closest.distance,
+                                 min(approach.distance for approach in neo.approaches))
+                self.assertEqual(summary.max_velocity,
+                                 max(approach.velocity for approach in neo.approaches))
+            else:
+                self.assertIsNone(summary.closest)
+
+    def test_next_approach_after_time(self):
+        neo = max(self.neos, key=lambda neo: len(neo.approaches))
+        first, second = neo.approaches[0], neo.approaches[1]
+        self.assertIs(neo.next_approach(first.time - datetime.timedelta(days=1)), first)
+        self.assertIs(neo.next_approach(first.time), second)
+        self.assertIsNone(neo.next_approach(neo.approaches[-1].time))
+
+    def test_query_neos_by_closest_approach(self):
+        expected = set(neo for neo in self.neos
+                       if any(approach.distance <= 0.01 for approach in neo.approaches))
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(set(self.db.query_neos(closest_max=0.01)), expected)
+        self.assertEqual(set(self.db.query_neos(approaches_min=2)),
+                         set(neo for neo in self.neos if len(neo.approaches) >= 2))
+
     def test_get_neo_by_designation(self):
         cerberus = self.db.get_neo_by_designation('1865')
         self.assertIsNotNone(cerberus)
@@ -114,6 +153,29 @@ class TestDatabase(unittest.TestCase):
         nonexistent = self.db.get_neo_by_name('not-real-name')
         self.assertIsNone(nonexistent)
 
+    def test_get_neos_by_designations(self):
+        designations = ['2020 AJ1', 'not-real-designation', '2102', '2020 AJ1']
+        matches = self.db.get_neos_by_designations(designations)
+        self.assertEqual(list(matches), ['2020 AJ1', '2102'])
+        for designation, neo in matches.items():
+            self.assertIs(neo, self.db.get_neo_by_designation(designation))
+        self.assertEqual(self.db.get_neos_by_designations([]), {})
+
+    def test_search_prefix(self):
+        self.assertEqual([neo.name for neo in self.db.search_prefix('lemm')], ['Lemmon'])
+        self.assertEqual(self.db.search_prefix('not-real-prefix'), [])
+
+        expected = sorted(neo.designation for neo in self.neos
+                          if neo.designation.startswith('2020 B'))
+        received = self.db.search_prefix('2020 b', limit=None, field='designation')
+        self.assertEqual([neo.designation for neo in received], expected)
+        self.assertEqual(len(self.db.search_prefix('2020 B', limit=3)), 3)
+
+    def test_search_prefix_returns_each_neo_once(self):
+        for neo in self.db.search_prefix('', limit=None):
+            self.assertIs(neo, self.db.get_neo_by_designation(neo.designation))
+        self.assertEqual(len(self.db.search_prefix('', limit=None)), len(self.neos))
+
 
 if __name__ == '__main__':
     unittest.main()
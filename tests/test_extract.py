@@ -12,11 +12,16 @@ These tests should pass when Task 2 is complete.
 """
 import collections.abc
 import datetime
+import itertools
+import json
 import pathlib
 import math
+import tempfile
 import unittest
+import unittest.mock
 
-from extract import load_neos, load_approaches
+from extract import (expand_paths, load_approaches, load_merged_approaches, load_neos,
+                     merge_approaches, read_approach_rows, stream_approach_rows)
 from models import NearEarthObject, CloseApproach
 
 
@@ -118,5 +123,93 @@ class TestLoadApproaches(unittest.TestCase):
         self.assertIsInstance(approach.velocity, float)
 
 
+class TestStreamApproachRows(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.fields, cls.rows = read_approach_rows(TEST_CAD_FILE)
+        cls.path = pathlib.Path(cls.tmp.name) / 'cad.json'
+        with open(cls.path, 'w') as f:
+            json.dump({'signature': {'version': '1.1'}, 'count': str(len(cls.rows)),
+                       'fields': cls.fields, 'data': cls.rows}, f, indent=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_rows_match_read_rows(self):
+        for path in (TEST_CAD_FILE, self.path):
+            with self.subTest(path=path.name), unittest.mock.patch('extract.READ_SIZE', 100):
+                header = {}
+                self.assertEqual(list(stream_approach_rows(path, header)), self.rows)
+                self.assertEqual(header['fields'], self.fields)
+                self.assertEqual(int(header['count']), len(self.rows))
+
+    def test_rows_are_streamed(self):
+        # Cut the file off in the middle of its rows.
+        truncated = pathlib.Path(self.tmp.name) / 'truncated.json'
+        truncated.write_text(self.path.read_text()[:20000])
+        with unittest.mock.patch('extract.READ_SIZE', 1000):
+            rows = stream_approach_rows(truncated)
+            self.assertEqual(list(itertools.islice(rows, 10)), self.rows[:10])
+            with self.assertRaises(ValueError):
+                list(rows)
+
+    def test_file_without_fields_fails(self):
+        path = pathlib.Path(self.tmp.name) / 'nofields.json'
+        path.write_text(json.dumps({'data': self.rows[:3]}))
+        with self.assertRaises(KeyError):
+            list(stream_approach_rows(path))
+
+
+class TestMergeApproaches(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        with open(TEST_CAD_FILE) as f:
+            data = json.load(f)
+        rows = data['data']
+        # Split the data into overlapping files: an unsorted one, and two sorted ones.
+        jd = data['fields'].index('jd')
+        parts = {'cad-a.json': rows[:3000][::-1],
+                 'cad-b.json': sorted(rows[2500:4000], key=lambda row: float(row[jd])),
+                 'cad-c.json': sorted(rows[3900:], key=lambda row: float(row[jd]))}
+        cls.paths = []
+        for name, part in parts.items():
+            path = pathlib.Path(cls.tmp.name) / name
+            with open(path, 'w') as f:
+                json.dump({'fields': data['fields'], 'count': len(part), 'data': part}, f)
+            cls.paths.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_glob_patterns_are_expanded(self):
+        pattern = pathlib.Path(self.tmp.name) / 'cad-*.json'
+        self.assertEqual(expand_paths([pattern]), self.paths)
+        self.assertEqual(expand_paths([TEST_CAD_FILE]), [TEST_CAD_FILE])
+
+    def test_merged_approaches_are_sorted_and_distinct(self):
+        merged = load_merged_approaches(self.paths)
+        times = [approach.time for approach in merged]
+        self.assertEqual(times, sorted(times))
+        keys = {(approach._designation, approach.time) for approach in merged}
+        self.assertEqual(len(keys), len(merged))
+        expected = {(approach._designation, approach.time)
+                    for approach in load_approaches(TEST_CAD_FILE)}
+        self.assertEqual(keys, expected)
+
+    def test_merge_is_lazy(self):
+        approaches = load_approaches(self.paths[1])
+
+        def latest():
+            yield approaches[-1]
+            raise AssertionError("The merge read past the next close approach of a stream.")
+        merged = merge_approaches([approaches[:-1], latest()])
+        self.assertEqual([approach.time for approach in itertools.islice(merged, 10)],
+                         [approach.time for approach in approaches[:10]])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,236 @@
+"""Check the auxiliary index structures that speed up `NEODatabase` queries.
+
+Every index must only ever narrow down the close approaches that have to be
+tested against the filters - never lose a matching approach.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_indexes
+"""
+import datetime
+import math
+import operator
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters, DistanceFilter
+from models import CloseApproach, NearEarthObject
+from indexes import (coverage, bitmap_positions, popcount, to_bitmap, BitmapCache, KDTree,
+                     ResultCache, ZoneMap, ALL, NONE, SOME)
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestCoverage(unittest.TestCase):
+    def test_coverage_of_closed_range(self):
+        self.assertEqual(coverage(DistanceFilter(operator.ge, 1), 1, 2), ALL)
+        self.assertEqual(coverage(DistanceFilter(operator.ge, 2), 1, 2), SOME)
+        self.assertEqual(coverage(DistanceFilter(operator.le, 0.5), 1, 2), NONE)
+        self.assertEqual(coverage(DistanceFilter(operator.eq, 1), 1, 1), ALL)
+
+    def test_coverage_of_open_range(self):
+        self.assertEqual(coverage(DistanceFilter(operator.ge, 2), 1, 2, high_inclusive=False), NONE)
+        self.assertEqual(coverage(DistanceFilter(operator.le, 2), 1, 2, high_inclusive=False), ALL)
+        self.assertEqual(coverage(DistanceFilter(operator.le, 1), 1, 2, low_inclusive=False), NONE)
+
+    def test_coverage_of_empty_range(self):
+        self.assertEqual(coverage(DistanceFilter(operator.ge, 0), None, None), NONE)
+
+
+class TestZoneMap(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+        cls.db._zonemap = ZoneMap(cls.approaches, block_size=64)
+
+    def test_zone_map_skips_blocks_outside_date_range(self):
+        date = datetime.date(2020, 3, 2)
+        filters = create_filters(date=date)
+        received = set(self.db.query(filters))
+        expected = set(approach for approach in self.approaches if approach.time.date() == date)
+        self.assertEqual(received, expected)
+
+        stats = self.db.scan_stats
+        self.assertEqual(stats['blocks'], len(self.db._zonemap))
+        self.assertGreater(stats['skipped'], stats['blocks'] // 2)
+
+    def test_zone_map_never_loses_matches(self):
+        filters = create_filters(distance_max=0.01, velocity_min=20, diameter_min=0.1)
+        received = set(self.db.query(filters))
+        expected = set(approach for approach in self.approaches
+                       if approach.distance <= 0.01 and approach.velocity >= 20
+                       and approach.neo.diameter >= 0.1)
+        self.assertEqual(received, expected)
+
+
+    def test_unlinked_approaches_are_accepted(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        approaches[5]._designation = 'NOT REAL'
+        db = NEODatabase(load_neos(TEST_NEO_FILE), approaches)
+        self.assertIsNone(approaches[5].neo)
+        self.assertEqual(len(list(db.query())), len(approaches))
+        filters = create_filters(date=approaches[5].time.date(), diameter_min=0.1)
+        expected = [approach for approach in approaches
+                    if approach.neo is not None and all(f(approach) for f in filters)]
+        self.assertEqual(list(db.query(filters)), expected)
+
+class TestBitmaps(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches, bitmaps=True, result_cache=0)
+
+    def test_bitmap_round_trip(self):
+        positions = [0, 3, 8, 9, 64, 1000]
+        bitmap = to_bitmap(reversed(positions))
+        self.assertEqual(list(bitmap_positions(bitmap)), positions)
+        self.assertEqual(popcount(bitmap), len(positions))
+        self.assertEqual(list(bitmap_positions(to_bitmap([]))), [])
+
+    def test_bitmaps_never_lose_matches(self):
+        for criteria in ({'hazardous': True, 'diameter_min': 0.14},
+                         {'distance_max': 0.05, 'velocity_min': 15, 'hazardous': False},
+                         {'date': datetime.date(2020, 3, 2), 'diameter_max': 0.1},
+                         {'velocity_min': 5, 'velocity_max': 10}):
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                expected = [approach for approach in self.approaches
+                            if all(f(approach) for f in filters)]
+                self.assertEqual(list(self.db.query(filters)), expected)
+                self.assertEqual(self.db.count(filters), len(expected))
+
+    def test_bitmaps_skip_approaches_without_an_neo(self):
+        approaches = load_approaches(TEST_CAD_FILE)
+        approaches[5]._designation = 'NOT REAL'
+        db = NEODatabase(load_neos(TEST_NEO_FILE), approaches, bitmaps=True, result_cache=0)
+        for criteria in ({'hazardous': False}, {'diameter_max': 1, 'distance_max': 0.1},
+                         {'date': approaches[5].time.date(), 'velocity_min': 1}):
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                expected = [approach for approach in approaches
+                            if all(f(approach) for f in filters)]
+                self.assertEqual(list(db.query(filters)), expected)
+                self.assertEqual(db.count(filters), len(expected))
+
+    def test_bitmaps_are_reused_across_queries(self):
+        self.db._bitmap_cache = BitmapCache()
+        self.db.count(create_filters(hazardous=True, diameter_min=0.14))
+        self.assertEqual(self.db.bitmap_stats['misses'], 2)
+        self.db.count(create_filters(hazardous=True, distance_max=0.1))
+        self.assertEqual(self.db.bitmap_stats['hits'], 1)
+        self.assertEqual(self.db.bitmap_stats['bitmaps'], 3)
+
+    def test_bitmap_cache_evicts_under_memory_cap(self):
+        cache = BitmapCache(max_mb=1 / 1024)
+        compute = lambda f: (1 << 5000) - 1
+        for distance in (0.1, 0.2, 0.3):
+            cache.get(DistanceFilter(operator.le, distance), compute)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 2)
+        self.assertLessEqual(cache.used, cache.max_bytes)
+
+
+class TestResultCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+
+    def setUp(self):
+        self.db = NEODatabase(self.neos, self.approaches, result_cache=2)
+
+    def test_repeated_query_hits_cache(self):
+        filters = create_filters(hazardous=True, distance_max=0.1)
+        expected = list(self.db.query(filters))
+        self.assertEqual(list(self.db.query(list(reversed(filters)))), expected)
+        self.assertEqual(self.db.count(filters), len(expected))
+        self.assertEqual(self.db.result_stats, {"hits": 2, "misses": 1, "results": 1})
+
+    def test_partially_consumed_query_is_not_cached(self):
+        filters = create_filters(velocity_min=10)
+        next(iter(self.db.query(filters)))
+        self.assertEqual(self.db.result_stats['results'], 0)
+
+    def test_cache_keeps_most_recent_results(self):
+        for velocity in (10, 20, 30):
+            list(self.db.query(create_filters(velocity_min=velocity)))
+        self.assertEqual(len(self.db._results), 2)
+        self.assertIsNone(self.db._results.get(ResultCache.key(create_filters(velocity_min=10))))
+
+    def test_invalidate_drops_results(self):
+        list(self.db.query(create_filters(velocity_min=10)))
+        self.db.invalidate_caches()
+        self.assertEqual(self.db.result_stats['results'], 0)
+
+
+class TestKDTree(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches, spatial=True, result_cache=0)
+        cls.tree = cls.db._kdtree
+
+    def test_kd_tree_supports_several_dimensions(self):
+        self.assertTrue(self.tree.supports(create_filters(distance_max=0.1, velocity_min=10)))
+        self.assertFalse(self.tree.supports(create_filters(distance_min=0.1, distance_max=0.2)))
+        self.assertFalse(self.tree.supports(create_filters(distance_max=0.1, hazardous=True)))
+
+    def test_kd_tree_box_never_loses_matches(self):
+        for criteria in ({'distance_max': 0.05, 'velocity_min': 20, 'diameter_min': 0.5},
+                         {'date': datetime.date(2020, 3, 2), 'velocity_max': 10},
+                         {'start_date': datetime.date(2020, 2, 1), 'distance_min': 0.3,
+                          'diameter_max': 0.1, 'hazardous': False}):
+            with self.subTest(criteria=criteria):
+                filters = create_filters(**criteria)
+                expected = [approach for approach in self.approaches
+                            if all(f(approach) for f in filters)]
+                self.assertEqual(list(self.db.query(filters)), expected)
+                self.assertEqual(self.db.count(filters), len(expected))
+                self.assertLess(len(self.tree.box(filters)), len(self.approaches))
+
+    def test_kd_tree_nearest_matches_full_scan(self):
+        for position in (0, len(self.approaches) // 2, len(self.approaches) - 1):
+            with self.subTest(position=position):
+                target = self.tree.points[position]
+                expected = sorted(
+                    (math.sqrt(sum((a - b) ** 2 for a, b in zip(target, point))), other)
+                    for other, point in enumerate(self.tree.points) if other != position
+                )[:5]
+                received = self.tree.nearest(position, 5)
+                self.assertEqual([d for d, _ in received], [d for d, _ in expected])
+
+    def test_similar_excludes_the_approach_itself(self):
+        approach = self.approaches[10]
+        results = self.db.similar(approach, k=3)
+        self.assertEqual(len(results), 3)
+        self.assertNotIn(approach, [result for _, result in results])
+        self.assertEqual([d for d, _ in results], sorted(d for d, _ in results))
+
+    def test_kd_tree_box_keeps_points_tied_with_a_split(self):
+        neos = [NearEarthObject(designation=str(i), diameter=i % 3, hazardous=False)
+                for i in range(100)]
+        approaches = [CloseApproach(_designation=str(i % 100), time='2020-Jan-01 00:00',
+                                    distance=i % 5 / 10, velocity=i % 3)
+                      for i in range(600)]
+        db = NEODatabase(neos, approaches, spatial=True, result_cache=0)
+        filters = create_filters(diameter_min=1.0, velocity_min=1.0)
+        expected = [approach for approach in approaches if all(f(approach) for f in filters)]
+        self.assertEqual(sorted(map(id, db.query(filters))), sorted(map(id, expected)))
+        self.assertEqual(db.count(filters), len(expected))
+
+    def test_kd_tree_places_nan_below_known_values(self):
+        tree = KDTree(self.approaches[:10])
+        self.assertEqual(tree._normalize(0, float('nan')), KDTree.MISSING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Check that a `BackgroundNEODatabase` answers queries while and after loading.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_loader
+"""
+import datetime
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from loader import BackgroundNEODatabase
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def serialize(approaches):
+    return [(approach.neo.designation, approach.time_str) for approach in approaches]
+
+
+class TestBackgroundDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    def test_loaded_database_matches_database(self):
+        background = BackgroundNEODatabase(TEST_NEO_FILE, TEST_CAD_FILE, chunk_size=500).start()
+        self.assertTrue(background.loaded.wait(timeout=60))
+        filters = create_filters(start_date=datetime.date(2020, 6, 1), hazardous=True)
+        self.assertEqual(serialize(background.query(filters)), serialize(self.db.query(filters)))
+        self.assertEqual(background.count(filters), self.db.count(filters))
+        self.assertEqual(background.get_neo_by_name('Lemmon').designation, '2013 TL117')
+        self.assertEqual(background.progress[1:], (len(self.db._approaches),) * 2)
+        self.assertTrue(background.supports_positions)
+        self.assertEqual(list(background.positions(filters)), list(self.db.positions(filters)))
+
+    def test_partial_database_serves_covered_queries(self):
+        background = BackgroundNEODatabase(TEST_NEO_FILE, TEST_CAD_FILE)
+        # Simulate a load that stopped halfway through the close approaches.
+        background._neos = NEODatabase(load_neos(TEST_NEO_FILE), [])
+        background.neos_loaded.set()
+        approaches = load_approaches(TEST_CAD_FILE)
+        for approach in approaches:
+            approach.neo = background._neos.get_neo_by_designation(approach._designation)
+        background._approaches = approaches[:len(approaches) // 2]
+        background._watermark = background._approaches[-1].time
+        day = background._watermark.date()
+
+        self.assertFalse(background.is_loaded)
+        self.assertTrue(background.covers(create_filters(end_date=day - datetime.timedelta(days=1))))
+        self.assertFalse(background.covers(create_filters(end_date=day)))
+        self.assertFalse(background.covers(create_filters(start_date=day)))
+
+        filters = create_filters(end_date=day - datetime.timedelta(days=1), distance_max=0.1)
+        self.assertEqual(serialize(background.query(filters)), serialize(self.db.query(filters)))
+        self.assertEqual(background.get_neo_by_designation('2102').name, 'Tantalus')
+        self.assertFalse(background.supports_positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
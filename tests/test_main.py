@@ -0,0 +1,124 @@
+"""Check the command-line interface of `main.py` end to end, on the test data files.
+
+Each test runs `main.py` in a subprocess, as a user would, except those of
+the interactive shell, which drive an `NEOShell` directly.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_main
+"""
+import contextlib
+import datetime
+import io
+import pathlib
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from main import NEOShell, make_parser
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+PROJECT_ROOT = TESTS_ROOT.parent
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def run(*arguments, cadfile=TEST_CAD_FILE):
+    """Run `main.py` with some arguments, and return the completed process."""
+    return subprocess.run([sys.executable, str(PROJECT_ROOT / 'main.py'),
+                           '--neofile', str(TEST_NEO_FILE), '--cadfile', str(cadfile),
+                           *arguments],
+                          cwd=str(PROJECT_ROOT), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+class TestMain(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.root = pathlib.Path(cls.tmp.name)
+        cls.binary_file = cls.root / 'cad.bin'
+        run('convert', str(cls.binary_file)).check_returncode()
+        run('partition', str(cls.root / 'cad')).check_returncode()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_similar(self):
+        process = run('similar', '--pdes', '68347', '--date', '2020-02-08')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertTrue(process.stdout.splitlines()[1].startswith('- ('))
+
+    def test_similar_is_unsupported_by_mapped_and_partitioned_engines(self):
+        for cadfile in (self.binary_file, self.root / 'cad'):
+            with self.subTest(cadfile=cadfile.name):
+                process = run('similar', '--pdes', '68347', '--date', '2020-02-08',
+                              cadfile=cadfile)
+                self.assertEqual(process.returncode, 0, process.stderr)
+                self.assertEqual(process.stdout, '')
+                self.assertIn("isn't supported", process.stderr)
+                self.assertNotIn('Traceback', process.stderr)
+
+    def test_count_with_stats(self):
+        for options in ((), ('--bitmaps',)):
+            with self.subTest(options=options):
+                process = run(*options, 'query', '--max-distance', '0.05', '--min-velocity', '10',
+                              '--count', '--stats')
+                self.assertEqual(process.returncode, 0, process.stderr)
+                self.assertEqual(process.stdout.strip(), '444')
+                self.assertIn('Skipped 0 of 0 blocks', process.stderr)
+                self.assertIn('Query results: 0 hits, 1 misses', process.stderr)
+                if options:
+                    self.assertIn('Filter bitmaps:', process.stderr)
+
+    def test_count_with_stats_reports_scanned_blocks(self):
+        # Without a filter on an indexed attribute, the count scans the zone map blocks.
+        process = run('query', '--hazardous', '--min-diameter', '0.1', '--count', '--stats')
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertRegex(process.stderr, r'Skipped \d+ of [1-9]\d* blocks')
+
+
+
+class TestShell(unittest.TestCase):
+    def setUp(self):
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        _, *parsers = make_parser()
+        self.shell = NEOShell(self.db, *parsers)
+
+    def run_commands(self, *lines):
+        """Run some shell commands, and return what they printed to stdout and stderr."""
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            for line in lines:
+                self.shell.onecmd(line)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_query_streams_without_finding_positions(self):
+        with unittest.mock.patch.object(self.db, 'positions', wraps=self.db.positions) as find:
+            stdout, _ = self.run_commands('query')
+            self.assertEqual(len(stdout.splitlines()), 10)
+            find.assert_not_called()
+
+    def test_upcoming_defaults_to_now(self):
+        stdout, _ = self.run_commands('upcoming --previous --number 3')
+        expected = self.db.prev_approaches(datetime.datetime.now(), 3)
+        self.assertEqual(stdout.splitlines(), [str(approach) for approach in expected])
+
+    def test_refine_finds_the_previous_matches_on_demand(self):
+        with unittest.mock.patch.object(self.db, 'positions', wraps=self.db.positions) as find:
+            self.run_commands('query --start-date 2020-06-01')
+            stdout, stderr = self.run_commands('refine --hazardous --limit 3')
+            self.assertEqual(find.call_count, 2)
+        expected = self.db.count(self.shell.last[0])
+        self.assertIn(f"matches to {expected}", stderr)
+        self.assertEqual(len(stdout.splitlines()), 3)
+        self.assertEqual(len(self.shell.last[1]), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Check that a memory-mapped binary close approach file is queried correctly.
+
+The test data files are converted into a temporary binary file, and the
+results of a `MappedNEODatabase` are compared to those of an `NEODatabase`.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_mapped
+"""
+import datetime
+import pathlib
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from mapped import MappedNEODatabase, convert_to_binary, is_binary_file
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def serialize(approaches):
+    return sorted((approach.neo.designation, approach.time_str, approach.distance,
+                   approach.velocity) for approach in approaches)
+
+
+class TestMappedDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.binary_file = pathlib.Path(cls.tmp.name) / 'cad.bin'
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.written = convert_to_binary(cls.db._neos, cls.db._approaches, cls.binary_file)
+        cls.mapped = MappedNEODatabase(load_neos(TEST_NEO_FILE), cls.binary_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def assertQueryMatches(self, **criteria):
+        filters = create_filters(**criteria)
+        expected = serialize(self.db.query(filters))
+        self.assertEqual(serialize(self.mapped.query(filters)), expected)
+        self.assertEqual(self.mapped.count(filters), len(expected))
+
+    def test_binary_file_is_detected(self):
+        self.assertTrue(is_binary_file(self.binary_file))
+        self.assertFalse(is_binary_file(TEST_CAD_FILE))
+        self.assertEqual(len(self.mapped), self.written)
+
+    def test_mapped_columns_are_sorted_by_time(self):
+        times = self.mapped.times
+        self.assertTrue(all(times[i] <= times[i + 1] for i in range(len(times) - 1)))
+
+    def test_query_all(self):
+        self.assertQueryMatches()
+
+    def test_query_dates(self):
+        self.assertQueryMatches(date=datetime.date(2020, 3, 2))
+        self.assertQueryMatches(start_date=datetime.date(2020, 4, 1),
+                                end_date=datetime.date(2020, 6, 30), distance_max=0.1)
+
+    def test_query_attributes(self):
+        self.assertQueryMatches(velocity_min=20, diameter_min=0.5)
+        self.assertQueryMatches(hazardous=True, distance_max=0.1)
+
+    def test_get_neo_by_designation_fills_approaches(self):
+        neo = self.mapped.get_neo_by_designation('2102')
+        expected = self.db.get_neo_by_designation('2102')
+        self.assertEqual(serialize(neo.approaches), serialize(expected.approaches))
+
+    def test_get_neos_by_designations_fills_approaches(self):
+        designations = ['2102', 'not-real-designation', '2020 AJ1']
+        matches = self.mapped.get_neos_by_designations(designations)
+        self.assertEqual(list(matches), ['2102', '2020 AJ1'])
+        for designation, neo in matches.items():
+            expected = self.db.get_neo_by_designation(designation)
+            self.assertEqual(serialize(neo.approaches), serialize(expected.approaches))
+
+    def test_approaches_of_every_neo_match_in_time_order(self):
+        mapped = MappedNEODatabase(load_neos(TEST_NEO_FILE), self.binary_file)
+        for neo in self.db._neos:
+            other = mapped.get_neo_by_designation(neo.designation)
+            self.assertEqual([(a.time, a.distance) for a in other.approaches],
+                             [(a.time, a.distance) for a in neo.approaches])
+        self.assertEqual(len(mapped._neo_spans[1]), len(mapped))
+
+    def test_next_and_prev_approaches(self):
+        t = datetime.datetime(2020, 6, 1, 12, 0)
+        filters = create_filters(hazardous=True)
+        self.assertEqual(serialize(self.mapped.next_approaches(t, 5, filters)),
+                         serialize(self.db.next_approaches(t, 5, filters)))
+        self.assertEqual(serialize(self.mapped.prev_approaches(t, 5)),
+                         serialize(self.db.prev_approaches(t, 5)))
+
+    def test_summary_counts_the_filled_approaches(self):
+        designation = self.db._approaches[0].neo.designation
+        neo = self.mapped.get_neo_by_designation(designation)
+        self.assertTrue(neo.approaches)
+        self.assertEqual(neo.summary.count, len(neo.approaches))
+        self.assertIsNotNone(neo.summary.closest)
+
+        designations = [approach.neo.designation for approach in self.db._approaches[1:20]]
+        mapped = MappedNEODatabase(load_neos(TEST_NEO_FILE), self.binary_file)
+        for neo in mapped.get_neos_by_designations(designations).values():
+            self.assertEqual(neo.summary.count, len(neo.approaches))
+
+    def test_similar_is_unsupported(self):
+        self.assertFalse(self.mapped.supports_similar)
+        self.assertTrue(self.mapped.supports_positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
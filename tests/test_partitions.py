@@ -0,0 +1,114 @@
+"""Check that a directory of yearly partitions is queried like the monolithic file.
+
+The test close approach file is split into yearly partitions in a temporary
+directory, and the results of a `PartitionedNEODatabase` are compared to those
+of an `NEODatabase` over the monolithic file.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_partitions
+"""
+import datetime
+import json
+import pathlib
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from partitions import PartitionedNEODatabase, partition_cad_file
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def serialize(approaches):
+    return set((approach._designation, approach.time_str) for approach in approaches)
+
+
+class TestPartitions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.directory = pathlib.Path(cls.tmp.name)
+
+        # Move a few approaches into another year, to get more than one partition.
+        with open(TEST_CAD_FILE) as f:
+            data = json.load(f)
+        for entry in data['data'][:100]:
+            entry[3] = '2019' + entry[3][4:]
+        cls.cad_file = cls.directory / 'cad.json'
+        with open(cls.cad_file, 'w') as f:
+            json.dump(data, f)
+        cls.counts = partition_cad_file(cls.cad_file, cls.directory / 'cad')
+
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(cls.cad_file))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_partition_cad_file_writes_one_file_per_year(self):
+        self.assertEqual(self.counts, {2019: 100, 2020: 4600})
+        self.assertTrue((self.directory / 'cad' / 'cad-2019.json').exists())
+        self.assertTrue((self.directory / 'cad' / 'cad-2020.json').exists())
+
+    def test_partitioned_query_loads_only_overlapping_years(self):
+        db = PartitionedNEODatabase(load_neos(TEST_NEO_FILE), self.directory / 'cad')
+        self.assertEqual(db.loaded_years, [])
+
+        filters = create_filters(start_date=datetime.date(2020, 1, 1), distance_max=0.05)
+        self.assertEqual(serialize(db.query(filters)), serialize(self.db.query(filters)))
+        self.assertEqual(db.loaded_years, [2020])
+
+        filters = create_filters(hazardous=True)
+        self.assertEqual(serialize(db.query(filters)), serialize(self.db.query(filters)))
+        self.assertEqual(db.count(filters), self.db.count(filters))
+        self.assertEqual(db.loaded_years, [2019, 2020])
+
+    def test_partitioned_database_evicts_least_recently_used_partitions(self):
+        db = PartitionedNEODatabase(load_neos(TEST_NEO_FILE), self.directory / 'cad',
+                                    memory_budget=0)
+        db.count(create_filters(end_date=datetime.date(2019, 12, 31)))
+        self.assertEqual(db.loaded_years, [2019])
+        db.count(create_filters(start_date=datetime.date(2020, 1, 1)))
+        self.assertEqual(db.loaded_years, [2020])
+
+        neo = db.get_neo_by_designation(self.db._approaches[0]._designation)
+        self.assertTrue(all(approach.time.year == 2020 for approach in neo.approaches))
+
+    def test_partitions_only_index_the_neos_of_their_year(self):
+        db = PartitionedNEODatabase(load_neos(TEST_NEO_FILE), self.directory / 'cad')
+        db.count(create_filters(end_date=datetime.date(2019, 12, 31)))
+        partition = db._partition(2019)
+        designations = {approach._designation for approach in partition._approaches}
+        self.assertEqual({neo.designation for neo in partition._neos}, designations)
+        self.assertLess(len(partition._neos), len(db._neos))
+
+        db.count(create_filters(start_date=datetime.date(2020, 1, 1)))
+        for designation in designations:
+            neo = db.get_neo_by_designation(designation)
+            expected = self.db.get_neo_by_designation(designation)
+            self.assertEqual(serialize(neo.approaches), serialize(expected.approaches))
+            self.assertEqual(neo.summary.count, len(expected.approaches))
+
+
+        db = PartitionedNEODatabase(load_neos(TEST_NEO_FILE), self.directory / 'cad')
+        t = datetime.datetime(2019, 12, 31)
+        self.assertEqual(serialize(db.next_approaches(t, 150)),
+                         serialize(self.db.next_approaches(t, 150)))
+        t = datetime.datetime(2020, 1, 2)
+        self.assertEqual(serialize(db.prev_approaches(t, 150)),
+                         serialize(self.db.prev_approaches(t, 150)))
+
+    def test_similar_and_positions_are_unsupported(self):
+        db = PartitionedNEODatabase(load_neos(TEST_NEO_FILE), self.directory / 'cad')
+        self.assertFalse(db.supports_similar)
+        self.assertFalse(db.supports_positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
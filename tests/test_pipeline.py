@@ -0,0 +1,69 @@
+"""Check that a pipelined export writes the same output files as the writers.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_pipeline
+"""
+import pathlib
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from pipeline import write_pipelined
+from streams import open_stream
+from write import write_to_csv, write_to_json, write_to_ndjson
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+class TestPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        cls.results = list(cls.db.query())[:1000]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, name):
+        with open_stream(self.root / name, newline='') as file:
+            return file.read()
+
+    def test_output_matches_writers(self):
+        for suffix, writer in (('.csv', write_to_csv), ('.json', write_to_json),
+                               ('.ndjson', write_to_ndjson), ('.csv.gz', write_to_csv)):
+            with self.subTest(suffix=suffix):
+                writer(self.results, self.root / ('expected' + suffix))
+                # A tiny queue and batches exercise the back-pressure on the scan.
+                count = write_pipelined(iter(self.results), self.root / ('actual' + suffix),
+                                        batch_size=64, queue_size=2, processes=2)
+                self.assertEqual(count, len(self.results))
+                self.assertEqual(self.read('actual' + suffix), self.read('expected' + suffix))
+
+    def test_empty_results(self):
+        for suffix, writer in (('.csv', write_to_csv), ('.json', write_to_json)):
+            with self.subTest(suffix=suffix):
+                writer([], self.root / ('expected' + suffix))
+                self.assertEqual(write_pipelined([], self.root / ('actual' + suffix)), 0)
+                self.assertEqual(self.read('actual' + suffix), self.read('expected' + suffix))
+
+    def test_unsupported_extension(self):
+        with self.assertRaises(ValueError):
+            write_pipelined(self.results, self.root / 'results.txt')
+
+    def test_write_errors_are_raised(self):
+        with self.assertRaises(OSError):
+            write_pipelined(self.db.query(), self.root / 'missing' / 'results.csv',
+                            batch_size=10, queue_size=1, processes=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,7 +18,7 @@ import unittest
 
 from database import NEODatabase
 from extract import load_neos, load_approaches
-from filters import create_filters
+from filters import create_filters, narrows
 
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
@@ -528,5 +528,33 @@ class TestQuery(unittest.TestCase):
         self.assertEqual(expected, received, msg="Computed results do not match expected results.")
 
 
+class TestRefine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+
+    def test_narrows(self):
+        previous = create_filters(start_date=datetime.date(2020, 1, 1), distance_max=0.1)
+        self.assertTrue(narrows(create_filters(start_date=datetime.date(2020, 1, 1),
+                                               distance_max=0.1, hazardous=True), previous))
+        self.assertTrue(narrows(create_filters(date=datetime.date(2020, 3, 2),
+                                               distance_max=0.05), previous))
+        self.assertFalse(narrows(create_filters(start_date=datetime.date(2019, 12, 1),
+                                                distance_max=0.1), previous))
+        self.assertFalse(narrows(create_filters(start_date=datetime.date(2020, 1, 1)), previous))
+        self.assertTrue(narrows(create_filters(hazardous=True), []))
+        self.assertFalse(narrows(create_filters(hazardous=True), create_filters(hazardous=False)))
+
+    def test_refined_positions_match_full_query(self):
+        previous = self.db.positions(create_filters(start_date=datetime.date(2020, 2, 1)))
+        filters = create_filters(start_date=datetime.date(2020, 3, 1), hazardous=True,
+                                 distance_max=0.1)
+        refined = self.db.positions(filters, within=previous)
+        self.assertEqual(list(refined), list(self.db.positions(filters)))
+        self.assertEqual(self.db.approaches_at(refined), list(self.db.query(filters)))
+
+
 if __name__ == '__main__':
     unittest.main()
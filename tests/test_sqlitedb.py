@@ -0,0 +1,108 @@
+"""Check that a `SQLiteNEODatabase` answers queries like an in-memory `NEODatabase`.
+
+The test data files are imported into a temporary SQLite database file, and
+the results of both engines are compared for a few combinations of filters.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_sqlitedb
+"""
+import datetime
+import math
+import pathlib
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+from sqlitedb import SQLiteNEODatabase, import_to_sqlite
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def serialize(approaches):
+    return [(approach.neo.designation, approach.time_str, approach.distance)
+            for approach in approaches]
+
+
+class TestSQLiteDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.sqlite_file = pathlib.Path(cls.tmp.name) / 'neos.sqlite'
+        cls.imported = import_to_sqlite(TEST_NEO_FILE, TEST_CAD_FILE, cls.sqlite_file)
+        cls.sqlite = SQLiteNEODatabase(cls.sqlite_file)
+        cls.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sqlite.close()
+        cls.tmp.cleanup()
+
+    def assertQueryMatches(self, **criteria):
+        filters = create_filters(**criteria)
+        expected = serialize(self.db.query(filters))
+        self.assertEqual(serialize(self.sqlite.query(filters)), expected)
+        self.assertEqual(self.sqlite.count(filters), len(expected))
+
+    def test_import_counts(self):
+        self.assertEqual(self.imported, (4226, 4700))
+
+    def test_query_all(self):
+        self.assertQueryMatches()
+
+    def test_query_dates(self):
+        self.assertQueryMatches(date=datetime.date(2020, 3, 2))
+        self.assertQueryMatches(start_date=datetime.date(2020, 4, 1),
+                                end_date=datetime.date(2020, 6, 30))
+
+    def test_query_attributes(self):
+        self.assertQueryMatches(distance_max=0.05, velocity_min=20)
+        self.assertQueryMatches(diameter_min=0.5, hazardous=True)
+        self.assertQueryMatches(diameter_max=0.1, hazardous=False)
+
+    def test_get_neo_by_designation_loads_approaches(self):
+        neo = self.sqlite.get_neo_by_designation('2102')
+        self.assertEqual(neo.name, 'Tantalus')
+        self.assertEqual(neo.diameter, 1.649)
+        self.assertTrue(neo.hazardous)
+        expected = self.db.get_neo_by_designation('2102')
+        self.assertEqual(serialize(neo.approaches), serialize(expected.approaches))
+
+    def test_get_neo_by_name(self):
+        neo = self.sqlite.get_neo_by_name('Lemmon')
+        self.assertEqual(neo.designation, '2013 TL117')
+        self.assertTrue(math.isnan(neo.diameter))
+        self.assertIsNone(self.sqlite.get_neo_by_name('not-real-name'))
+
+    def test_get_neos_by_designations_loads_approaches(self):
+        designations = ['2102', 'not-real-designation', '2020 AJ1', '2102']
+        matches = self.sqlite.get_neos_by_designations(designations)
+        self.assertEqual(list(matches), ['2102', '2020 AJ1'])
+        for designation, neo in matches.items():
+            expected = self.db.get_neo_by_designation(designation)
+            self.assertEqual(serialize(neo.approaches), serialize(expected.approaches))
+
+    def test_search_prefix(self):
+        for prefix, field in (('lemm', None), ('2020 b', 'designation'), ('a', 'name'), ('%', None)):
+            with self.subTest(prefix=prefix, field=field):
+                received = self.sqlite.search_prefix(prefix, limit=20, field=field)
+                expected = self.db.search_prefix(prefix, limit=20, field=field)
+                self.assertEqual([neo.designation for neo in received],
+                                 [neo.designation for neo in expected])
+
+    def test_next_and_prev_approaches(self):
+        t = datetime.datetime(2020, 6, 1, 12, 0)
+        filters = create_filters(hazardous=True)
+        self.assertEqual(serialize(self.sqlite.next_approaches(t, 5, filters)),
+                         serialize(self.db.next_approaches(t, 5, filters)))
+        self.assertEqual(serialize(self.sqlite.prev_approaches(t, 5)),
+                         serialize(self.db.prev_approaches(t, 5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
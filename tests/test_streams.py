@@ -0,0 +1,79 @@
+"""Check that compressed data files are read, and compressed output files written, on the fly.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_streams
+"""
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import pathlib
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from streams import base_suffix, compression_of, open_stream, sniff
+from write import write_to_csv, write_to_json
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+COMPRESSIONS = {'.gz': gzip, '.bz2': bz2, '.xz': lzma}
+
+
+class TestStreams(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def compress(self, source, name, module):
+        path = self.root / name
+        with open(source, 'rb') as src, module.open(path, 'wb') as dst:
+            dst.write(src.read())
+        return path
+
+    def test_suffixes(self):
+        self.assertIs(compression_of(pathlib.Path('results.csv.gz')), gzip)
+        self.assertIsNone(compression_of(pathlib.Path('results.csv')))
+        self.assertEqual(base_suffix(pathlib.Path('results.json.xz')), '.json')
+        self.assertEqual(base_suffix(pathlib.Path('results.csv')), '.csv')
+
+    def test_compressed_inputs_are_detected_by_magic_bytes(self):
+        expected = [(a._designation, a.time, a.distance) for a in load_approaches(TEST_CAD_FILE)]
+        for suffix, module in COMPRESSIONS.items():
+            with self.subTest(suffix=suffix):
+                # Even a misleading extension doesn't matter.
+                path = self.compress(TEST_CAD_FILE, 'cad.json', module)
+                self.assertIs(sniff(path), module)
+                approaches = load_approaches(path)
+                self.assertEqual([(a._designation, a.time, a.distance) for a in approaches],
+                                 expected)
+                neos = load_neos(self.compress(TEST_NEO_FILE, 'neos.csv' + suffix, module))
+                self.assertEqual(len(neos), len(load_neos(TEST_NEO_FILE)))
+
+    def test_compressed_outputs(self):
+        db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        results = list(db.query())[:100]
+        for suffix, module in COMPRESSIONS.items():
+            with self.subTest(suffix=suffix):
+                csv_path = self.root / ('results.csv' + suffix)
+                json_path = self.root / ('results.json' + suffix)
+                write_to_csv(results, csv_path)
+                write_to_json(results, json_path)
+                self.assertIs(sniff(csv_path), module)
+                with open_stream(csv_path, newline='') as file:
+                    self.assertEqual(len(list(csv.DictReader(file))), len(results))
+                with module.open(json_path, 'rt') as file:
+                    self.assertEqual(len(json.load(file)), len(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Check that the next and previous close approaches around a time are found.
+
+The results of `NEODatabase.next_approaches` and `prev_approaches` are compared
+against a naive sort of the matching close approaches by time.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_upcoming
+"""
+import datetime
+import pathlib
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches
+from filters import create_filters
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+
+def naive_next(approaches, t, n, filters):
+    matches = [approach for approach in approaches
+               if approach.time > t and all(f(approach) for f in filters)]
+    return sorted(matches, key=lambda approach: approach.time)[:n]
+
+
+def naive_prev(approaches, t, n, filters):
+    matches = [approach for approach in approaches
+               if approach.time < t and all(f(approach) for f in filters)]
+    return sorted(matches, key=lambda approach: approach.time, reverse=True)[:n]
+
+
+def times(approaches):
+    return [approach.time for approach in approaches]
+
+
+class TestUpcoming(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = load_neos(TEST_NEO_FILE)
+        cls.approaches = load_approaches(TEST_CAD_FILE)
+        cls.db = NEODatabase(cls.neos, cls.approaches)
+        cls.t = datetime.datetime(2020, 6, 1, 12, 0)
+
+    def test_next_approaches(self):
+        expected = naive_next(self.approaches, self.t, 10, ())
+        self.assertEqual(times(self.db.next_approaches(self.t, 10)), times(expected))
+
+    def test_next_approaches_with_hazardous_filter(self):
+        filters = create_filters(hazardous=True, distance_max=0.2)
+        expected = naive_next(self.approaches, self.t, 5, filters)
+        received = self.db.next_approaches(self.t, 5, filters)
+        self.assertEqual(times(received), times(expected))
+        self.assertTrue(all(approach.neo.hazardous for approach in received))
+
+    def test_prev_approaches(self):
+        filters = create_filters(hazardous=False)
+        expected = naive_prev(self.approaches, self.t, 7, filters)
+        self.assertEqual(times(self.db.prev_approaches(self.t, 7, filters)), times(expected))
+
+    def test_approaches_beyond_the_data(self):
+        self.assertEqual(self.db.next_approaches(datetime.datetime(2100, 1, 1), 3), [])
+        self.assertEqual(len(self.db.prev_approaches(datetime.datetime(2100, 1, 1), 3)), 3)
+        self.assertEqual(self.db.prev_approaches(datetime.datetime(1900, 1, 1), 3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,307 @@
+"""Check that changes to the data files are applied to a database incrementally.
+
+To run these tests from the project root, run::
+
+    $ python3 -m unittest --verbose tests.test_watch
+"""
+import csv
+import datetime
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from database import NEODatabase
+from extract import load_neos, load_approaches, parse_approach
+from filters import create_filters
+from models import NearEarthObject
+from watch import DataFileWatcher, NDJSONFollower
+
+
+TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
+TEST_NEO_FILE = TESTS_ROOT / 'test-neos-2020.csv'
+TEST_CAD_FILE = TESTS_ROOT / 'test-cad-2020.json'
+
+CRITERIA = (
+    {},
+    {'start_date': datetime.date(2020, 6, 1), 'hazardous': True},
+    {'distance_max': 0.05},
+    {'velocity_min': 20, 'diameter_min': 0.5},
+    {'start_date': datetime.date(2020, 3, 1), 'end_date': datetime.date(2020, 9, 30),
+     'distance_min': 0.1, 'velocity_max': 10},
+)
+
+
+def serialize(approaches):
+    return sorted((approach.neo.designation if approach.neo else approach._designation,
+                   approach.time_str, approach.distance, approach.velocity)
+                  for approach in approaches)
+
+
+class TestApplyDelta(unittest.TestCase):
+    def assertMatchesRebuilt(self, db):
+        rebuilt = NEODatabase(load_neos(TEST_NEO_FILE), [approach for approach in db.query()])
+        for criteria in CRITERIA:
+            with self.subTest(**criteria):
+                filters = create_filters(**criteria)
+                expected = serialize(rebuilt.query(filters))
+                self.assertEqual(serialize(db.query(filters)), expected)
+                self.assertEqual(db.count(filters), len(expected))
+                self.assertEqual(serialize(db.approaches_at(db.positions(filters))), expected)
+        t = datetime.datetime(2020, 6, 1)
+        filters = create_filters(hazardous=False)
+        self.assertEqual([a.time for a in db.next_approaches(t, 20, filters)],
+                         [a.time for a in rebuilt.next_approaches(t, 20, filters)])
+        self.assertEqual([a.time for a in db.prev_approaches(t, 20)],
+                         [a.time for a in rebuilt.prev_approaches(t, 20)])
+
+    def make_database(self, **options):
+        db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE), **options)
+        # Take some approaches of the same NEOs to remove, and add them back at other times.
+        removed = [approach for approach in db.query() if approach.neo is not None][::97]
+        added = load_approaches(TEST_CAD_FILE)[::89]
+        for approach in added:
+            approach.time += datetime.timedelta(days=3)
+        return db, removed, added
+
+    def test_apply_delta_without_compaction(self):
+        for options in ({}, {'rollup': True}, {'bitmaps': True}, {'spatial': True}):
+            with self.subTest(**options):
+                db, removed, added = self.make_database(**options)
+                base = db._base
+                self.assertEqual(db.apply_delta(added=added, removed=removed),
+                                 (len(added), len(removed)))
+                # The changes weren't indexed, but every query reflects them.
+                self.assertEqual(db._base, base)
+                self.assertMatchesRebuilt(db)
+
+    def test_neo_approaches_are_relinked(self):
+        db, removed, added = self.make_database()
+        neo = removed[0].neo
+        db.apply_delta(added=added, removed=removed)
+        self.assertNotIn(removed[0], list(neo.approaches))
+        times = [approach.time for approach in neo.approaches]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(neo.summary.count, len(neo.approaches))
+        self.assertIs(db._approaches_of(neo), neo.approaches)
+
+    def test_compaction_rebuilds_indexes(self):
+        db, removed, added = self.make_database(result_cache=0)
+        db.apply_delta(added=added, removed=removed)
+        db.compact()
+        self.assertEqual(db._base, len(db._approaches))
+        self.assertFalse(db._tombstones)
+        self.assertMatchesRebuilt(db)
+
+    def test_removing_an_unknown_approach_fails(self):
+        db, removed, _ = self.make_database()
+        db.apply_delta(removed=removed[:1])
+        with self.assertRaises(ValueError):
+            db.apply_delta(removed=removed[:2])
+
+    def test_approaches_of_unknown_neos_are_held_back(self):
+        neos = load_neos(TEST_NEO_FILE)
+        missing = neos.pop(0)
+        approaches = load_approaches(TEST_CAD_FILE)
+        theirs = [a for a in approaches if a._designation == missing.designation]
+        db = NEODatabase(neos, [a for a in approaches if a._designation != missing.designation])
+        total = db.count()
+        self.assertEqual(db.apply_delta(added=theirs), (0, 0))
+        self.assertEqual(db.count(), total)
+
+        db.add_neos([missing])
+        self.assertIs(db.get_neo_by_designation(missing.designation), missing)
+        self.assertEqual(db.count(), total + len(theirs))
+        self.assertEqual(serialize(missing.approaches), serialize(theirs))
+        self.assertTrue(all(approach.neo is missing for approach in missing.approaches))
+
+
+class TestAppendApproaches(unittest.TestCase):
+    def setUp(self):
+        with open(TEST_CAD_FILE) as f:
+            data = json.load(f)
+        self.fields = data['fields']
+        rows = sorted(data['data'], key=lambda row: float(row[self.fields.index('jd')]))
+        # Replay the latest approaches as if they arrived later on, in time order.
+        split = len(rows) * 9 // 10
+        self.old, self.new = rows[:split], rows[split:]
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE),
+                              [parse_approach(self.fields, row) for row in self.old],
+                              rollup=True, result_cache=0)
+        self.expected = NEODatabase(load_neos(TEST_NEO_FILE),
+                                    [parse_approach(self.fields, row) for row in rows])
+
+    def records(self, rows):
+        return [dict(zip(self.fields, row)) for row in rows]
+
+    def assertMatchesExpected(self):
+        for criteria in CRITERIA:
+            with self.subTest(**criteria):
+                filters = create_filters(**criteria)
+                expected = serialize(self.expected.query(filters))
+                self.assertEqual(serialize(self.db.query(filters)), expected)
+                self.assertEqual(self.db.count(filters), len(expected))
+        t = datetime.datetime(2020, 11, 1)
+        self.assertEqual(serialize(self.db.next_approaches(t, 30)),
+                         serialize(self.expected.next_approaches(t, 30)))
+
+    def test_append_in_batches(self):
+        for start in range(0, len(self.new), 50):
+            batch = self.new[start:start + 50]
+            self.assertEqual(self.db.append_approaches(self.records(batch)), len(batch))
+        # The batches were appended without compacting the database.
+        self.assertEqual(self.db._base, len(self.old))
+        self.assertMatchesExpected()
+
+    def test_append_sequence_rows(self):
+        self.db.append_approaches(self.new, fields=self.fields)
+        self.assertMatchesExpected()
+
+    def test_neo_approaches_and_summaries_are_extended(self):
+        self.db.append_approaches(self.records(self.new))
+        for neo in self.expected._neos:
+            other = self.db.get_neo_by_designation(neo.designation)
+            self.assertEqual([a.time for a in other.approaches], [a.time for a in neo.approaches])
+            self.assertEqual(other.summary.count, neo.summary.count)
+            self.assertEqual(other.summary.closest is None, neo.summary.closest is None)
+
+    def test_out_of_order_approaches_are_merged(self):
+        # Append the latest approaches first, then the rest in reverse time order.
+        self.db.append_approaches(self.records(self.new[len(self.new) // 2:]))
+        self.db.append_approaches(self.records(self.new[:len(self.new) // 2][::-1]))
+        for neo in self.expected._neos:
+            other = self.db.get_neo_by_designation(neo.designation)
+            self.assertEqual([a.time for a in other.approaches], [a.time for a in neo.approaches])
+            self.assertEqual(other.summary.count, len(other.approaches))
+        self.assertMatchesExpected()
+
+    def test_unknown_designations_are_held_back(self):
+        records = self.records(self.new)
+        records[0]['des'] = 'NOT REAL'
+        self.assertEqual(self.db.append_approaches(records), len(records) - 1)
+        self.assertEqual(self.db.held_back, 1)
+
+        neo = NearEarthObject(designation='NOT REAL', diameter=1.0, hazardous=True)
+        self.db.add_neos([neo])
+        self.assertEqual(self.db.held_back, 0)
+        self.assertEqual(len(neo.approaches), 1)
+
+
+class TestNDJSONFollower(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name) / 'updates.ndjson'
+        with open(TEST_CAD_FILE) as f:
+            data = json.load(f)
+        self.lines = [json.dumps(dict(zip(data['fields'], row))) for row in data['data'][:30]]
+        self.db = NEODatabase(load_neos(TEST_NEO_FILE), load_approaches(TEST_CAD_FILE))
+        self.total = self.db.count()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_follow_appended_lines(self):
+        follower = NDJSONFollower(self.path)
+        self.assertIsNone(follower.poll(self.db))
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(self.lines[:10]) + '\n' + self.lines[10][:20])
+        self.assertIn("Appended 10 new", follower.poll(self.db))
+        self.assertIsNone(follower.poll(self.db))
+        # The incomplete line is appended once it's complete.
+        with open(self.path, 'a') as f:
+            f.write(self.lines[10][20:] + '\nnot json\n')
+        message = follower.poll(self.db)
+        self.assertIn("Appended 1 new", message)
+        self.assertIn("skipping 1 malformed lines", message)
+        self.assertEqual(self.db.count(), self.total + 11)
+
+    def test_invalid_records_are_skipped(self):
+        follower = NDJSONFollower(self.path)
+        invalid = ['{"des": "2102", "cd": "2020-Jan-01 00:00"}',
+                   json.dumps(dict(json.loads(self.lines[1]), cd='not a date')),
+                   json.dumps(dict(json.loads(self.lines[2]), dist=None))]
+        self.path.write_text('\n'.join(self.lines[:5] + invalid + ['[1, 2]']) + '\n')
+        message = follower.poll(self.db)
+        self.assertIn("Appended 5 new", message)
+        self.assertIn("skipping 4 malformed lines", message)
+        self.assertEqual(self.db.count(), self.total + 5)
+        self.assertIsNone(follower.poll(self.db))
+
+    def test_truncated_file_is_followed_from_its_start(self):
+        follower = NDJSONFollower(self.path)
+        self.path.write_text('\n'.join(self.lines) + '\n')
+        follower.poll(self.db)
+        self.path.write_text(self.lines[0] + '\n')
+        follower.poll(self.db)
+        self.assertEqual(self.db.count(), self.total + len(self.lines) + 1)
+
+
+class TestDataFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = pathlib.Path(self.tmp.name)
+        self.neo_file = root / 'neos.csv'
+        self.cad_file = root / 'cad.json'
+        shutil.copy(TEST_NEO_FILE, self.neo_file)
+        shutil.copy(TEST_CAD_FILE, self.cad_file)
+        db = NEODatabase(load_neos(self.neo_file), load_approaches(self.cad_file))
+        self.watcher = DataFileWatcher(db, self.neo_file, self.cad_file).start()
+        self.watcher._thread.join()
+        self.assertIsNone(self.watcher.poll())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def poll(self, path):
+        # Make sure that the change is noticed, however coarse the file system's clock.
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(self.watcher.poll())
+        self.watcher._thread.join()
+        return self.watcher.poll()
+
+    def assertMatchesFiles(self):
+        expected = NEODatabase(load_neos(self.neo_file), load_approaches(self.cad_file))
+        self.assertEqual(serialize(self.watcher.database.query()), serialize(expected.query()))
+
+    def test_changed_close_approaches_are_applied(self):
+        with open(self.cad_file) as f:
+            data = json.load(f)
+        data['data'] = data['data'][10:] + data['data'][:3]
+        with open(self.cad_file, 'w') as f:
+            json.dump(data, f)
+        database = self.watcher.database
+        message = self.poll(self.cad_file)
+        self.assertIn("0 new NEOs, 0 new and 7 removed close approaches", message)
+        self.assertIs(self.watcher.database, database)
+        self.assertMatchesFiles()
+
+    def test_new_neos_are_applied(self):
+        with open(self.neo_file, newline='') as f:
+            rows = list(csv.reader(f))
+        row = list(rows[1])
+        row[3], row[4] = 'NEW1', 'Newcomer'
+        with open(self.neo_file, 'a', newline='') as f:
+            csv.writer(f).writerow(row)
+        message = self.poll(self.neo_file)
+        self.assertIn("1 new NEOs", message)
+        self.assertEqual(self.watcher.database.get_neo_by_name('Newcomer').designation, 'NEW1')
+
+    def test_changed_neos_are_reloaded(self):
+        with open(self.neo_file, newline='') as f:
+            rows = list(csv.reader(f))
+        rows[1][4] = 'Renamed'
+        with open(self.neo_file, 'w', newline='') as f:
+            csv.writer(f).writerows(rows)
+        database = self.watcher.database
+        message = self.poll(self.neo_file)
+        self.assertTrue(message.startswith("Reloaded"))
+        self.assertIsNot(self.watcher.database, database)
+        self.assertEqual(self.watcher.database.get_neo_by_name('Renamed').designation, rows[1][3])
+        self.assertMatchesFiles()
+
+
+if __name__ == '__main__':
+    unittest.main()
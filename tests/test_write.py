@@ -21,13 +21,16 @@ import datetime
 import io
 import json
 import pathlib
+import tempfile
 import unittest
 import unittest.mock
 
 
 from extract import load_neos, load_approaches
 from database import NEODatabase
-from write import write_to_csv, write_to_json
+from streams import open_stream
+from write import (manifest_path, part_path, write_neos_to_csv, write_neos_to_json,
+                   write_parts, write_to_csv, write_to_json, write_to_ndjson)
 
 
 TESTS_ROOT = (pathlib.Path(__file__).parent).resolve()
@@ -136,7 +139,7 @@ class TestWriteToJSON(unittest.TestCase):
     @classmethod
     @unittest.mock.patch('write.open')
     def setUpClass(cls, mock_file):
-        results = build_results(5)
+        results = cls.results = build_results(5)
 
         with UncloseableStringIO() as buf:
             mock_file.return_value = buf
@@ -225,6 +228,98 @@ class TestWriteToJSON(unittest.TestCase):
         self.assertIsInstance(approach['neo']['diameter_km'], float)
         self.assertIsInstance(approach['neo']['potentially_hazardous'], bool)
 
+    def test_json_element_has_the_hazardous_flag_of_its_neo(self):
+        data = json.loads(self.value)
+        self.assertEqual([approach['neo']['potentially_hazardous'] for approach in data],
+                         [result.neo.hazardous for result in self.results])
+
+
+class TestWriteNEOs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.neos = [approach.neo for approach in build_results(3)]
+
+    @unittest.mock.patch('write.open')
+    def write(self, writer, approaches, mock_file):
+        with UncloseableStringIO() as buf:
+            mock_file.return_value = buf
+            writer(iter(self.neos), None, approaches=approaches)
+            buf.seek(0)
+            return buf.getvalue()
+
+    def test_csv_has_one_row_per_neo(self):
+        rows = list(csv.DictReader(io.StringIO(self.write(write_neos_to_csv, False))))
+        self.assertEqual([row['designation'] for row in rows],
+                         [neo.designation for neo in self.neos])
+        self.assertNotIn('datetime_utc', rows[0])
+
+    def test_csv_has_one_row_per_approach(self):
+        rows = list(csv.DictReader(io.StringIO(self.write(write_neos_to_csv, True))))
+        self.assertEqual(len(rows), sum(max(len(neo.approaches), 1) for neo in self.neos))
+        datetime.datetime.strptime(rows[0]['datetime_utc'], '%Y-%m-%d %H:%M')
+
+    def test_json_nests_approaches(self):
+        data = json.loads(self.write(write_neos_to_json, True))
+        self.assertEqual([neo['designation'] for neo in data],
+                         [neo.designation for neo in self.neos])
+        self.assertEqual(len(data[0]['approaches']), len(self.neos[0].approaches))
+        self.assertNotIn('approaches', json.loads(self.write(write_neos_to_json, False))[0])
+
+
+class TestWriteParts(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = build_results(103)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_manifest(self, filename):
+        with open(manifest_path(filename)) as manifest_file:
+            return json.load(manifest_file)
+
+    def test_part_names(self):
+        self.assertEqual(part_path(pathlib.Path('out/results.csv.gz'), 3),
+                         pathlib.Path('out/results-00003.csv.gz'))
+        self.assertEqual(manifest_path(pathlib.Path('out/results.ndjson')),
+                         pathlib.Path('out/results.manifest.json'))
+
+    def test_csv_parts_by_size(self):
+        filename = self.root / 'results.csv'
+        manifest = write_parts(iter(self.results), filename, write_to_csv, part_size=25, workers=2)
+        self.assertEqual(manifest, self.read_manifest(filename))
+        self.assertTrue(manifest['complete'])
+        self.assertEqual([part['rows'] for part in manifest['parts']], [25, 25, 25, 25, 3])
+        designations = []
+        for part in manifest['parts']:
+            with open(self.root / part['path'], newline='') as part_file:
+                designations.extend(row['designation'] for row in csv.DictReader(part_file))
+        self.assertEqual(designations, [result.neo.designation for result in self.results])
+
+    def test_json_parts_by_count(self):
+        filename = self.root / 'results.json.gz'
+        manifest = write_parts(iter(self.results), filename, write_to_json, parts=4,
+                               total=len(self.results))
+        self.assertEqual([part['rows'] for part in manifest['parts']], [26, 26, 26, 25])
+        self.assertEqual(manifest['parts'][0]['path'], 'results-00000.json.gz')
+        with open_stream(self.root / manifest['parts'][-1]['path']) as part_file:
+            self.assertEqual(len(json.load(part_file)), 25)
+
+    def test_ndjson_parts(self):
+        filename = self.root / 'results.ndjson'
+        manifest = write_parts(self.results, filename, write_to_ndjson, parts=2)
+        self.assertEqual(manifest['rows'], len(self.results))
+        with open(self.root / manifest['parts'][0]['path']) as part_file:
+            records = [json.loads(line) for line in part_file]
+        self.assertEqual(len(records), 52)
+        self.assertEqual(records[0]['neo']['designation'], self.results[0].neo.designation)
+        self.assertEqual([record['neo']['potentially_hazardous'] for record in records],
+                         [result.neo.hazardous for result in self.results[:52]])
+
 
 if __name__ == '__main__':
     unittest.main()
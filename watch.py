@@ -0,0 +1,262 @@
+"""Watch the data files of an NEO database, and apply their changes to it.
+
+A `DataFileWatcher` fingerprints each row of the NEO and close approach data
+files. Whenever either file changes, both are read again in a background
+thread, and their rows are compared with those fingerprints:
+
+- The close approaches of rows that appeared are added to the database, and
+  those of rows that disappeared are removed from it, with
+  `NEODatabase.apply_delta`, so that only the changes are indexed.
+- The NEOs of rows that appeared are added with `NEODatabase.add_neos`. If the
+  rows of known NEOs changed or disappeared, the whole database is loaded again.
+
+In the meantime, the database keeps answering queries. The changes are only
+applied when the watcher is polled, by the thread which queries the database.
+
+An `NDJSONFollower` follows a file of close approach records, one JSON object
+per line, to which batches of records are appended over time. Each time it's
+polled, the records of the complete lines written since are appended to the
+database with `NEODatabase.append_approaches`.
+"""
+import collections
+import json
+import os
+import threading
+
+from database import NEODatabase
+from extract import parse_approach, parse_neo, read_approach_rows, read_neo_rows
+
+
+def fingerprint(row):
+    """Compute the fingerprint of one raw row of a data file.
+
+    :param row: A sequence of values.
+    :return: An integer, equal for equal rows.
+    """
+    return hash(tuple(row))
+
+
+class DataFileWatcher:
+    """A watcher of the NEO and close approach data files of a database."""
+    def __init__(self, database, neo_csv_path, cad_json_path, **options):
+        """Create a new `DataFileWatcher`.
+
+        Nothing is fingerprinted until the watcher is `start`ed.
+
+        :param database: The `NEODatabase` (or `BackgroundNEODatabase`) loaded from the data files.
+        :param neo_csv_path: A path to a CSV file containing data about near-Earth objects.
+        :param cad_json_path: A path to a JSON file containing data about close approaches.
+        :param options: Keyword arguments passed to the `NEODatabase` constructor, if reloading.
+        """
+        self.database = database
+        self._paths = (neo_csv_path, cad_json_path)
+        self._options = options
+        self._stamps = self._stat()
+
+        # The NEO of each NEO row's fingerprint, and the close approaches of each
+        # close approach row's fingerprint (since several rows might be equal).
+        self._neos = None
+        self._approaches = None
+
+        # A function applying the changes read by the background thread, or the error it raised.
+        self._thread = None
+        self._pending = None
+        self._error = None
+
+    def start(self):
+        """Start fingerprinting the data files in the background, and return this watcher."""
+        self._run(self._fingerprint)
+        return self
+
+    def _stat(self):
+        """Return the modification time and the size of each data file."""
+        return tuple((os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in self._paths)
+
+    def _run(self, target):
+        """Run a function in a background thread, and keep its result for the next poll."""
+        def run():
+            try:
+                self._pending = target()
+            except Exception as err:
+                self._error = err
+        self._thread = threading.Thread(target=run, name='neo-watcher', daemon=True)
+        self._thread.start()
+
+    @property
+    def is_busy(self):
+        """Return whether the data files are being read in the background."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self):
+        """Apply the changes read in the background, and start reading the data files if changed.
+
+        This must be called by the thread which queries the database, between
+        two queries.
+
+        :return: A message describing the applied changes (or why they couldn't be), or None.
+        """
+        if self.is_busy:
+            return None
+        message = None
+        if self._error is not None:
+            message = f"The data files couldn't be reloaded: {self._error}"
+            self._error = None
+        elif self._pending is not None:
+            message = self._pending()
+            self._pending = None
+        if self._approaches is not None:
+            stamps = self._stat()
+            if stamps != self._stamps:
+                self._stamps = stamps
+                self._run(self._diff)
+        return message
+
+    def _read(self):
+        """Read the raw rows of the data files.
+
+        :return: A tuple of the NEO rows, the close approach field names and the close approach rows.
+        """
+        neo_rows = read_neo_rows(self._paths[0])
+        fields, rows = read_approach_rows(self._paths[1])
+        return neo_rows, fields, rows
+
+    def _fingerprint(self):
+        """Fingerprint the rows of the data files the database was loaded from.
+
+        The rows are matched with the NEOs and close approaches of the
+        database in order. If the data files changed since the database was
+        loaded, it's loaded again instead.
+        """
+        neo_rows, fields, rows = self._read()
+        approaches = list(self.database.query())
+        neos = self.database.get_neos_by_designations(row[3] for row in neo_rows)
+        if self._stat() != self._stamps or len(rows) != len(approaches) \
+                or len(neo_rows) != len(neos):
+            return self._reload(neo_rows, fields, rows)
+
+        neo_prints = {fingerprint(row): neos[row[3]] for row in neo_rows}
+        approach_prints = collections.defaultdict(list)
+        for row, approach in zip(rows, approaches):
+            approach_prints[fingerprint(row)].append(approach)
+
+        def apply():
+            self._neos, self._approaches = neo_prints, approach_prints
+        return apply
+
+    def _reload(self, neo_rows, fields, rows):
+        """Load a whole new database from the rows of the data files."""
+        neos = [parse_neo(row) for row in neo_rows]
+        approaches = [parse_approach(fields, row) for row in rows]
+        database = NEODatabase(neos, approaches, **self._options)
+        neo_prints = {fingerprint(row): neo for row, neo in zip(neo_rows, neos)}
+        approach_prints = collections.defaultdict(list)
+        for row, approach in zip(rows, approaches):
+            approach_prints[fingerprint(row)].append(approach)
+
+        def apply():
+            self.database = database
+            self._neos, self._approaches = neo_prints, approach_prints
+            return f"Reloaded {len(neos)} NEOs and {len(approaches)} close approaches."
+        return apply
+
+    def _diff(self):
+        """Compare the rows of the changed data files with the fingerprints of the database."""
+        neo_rows, fields, rows = self._read()
+        neo_prints = {fingerprint(row): row for row in neo_rows}
+        if any(key not in neo_prints for key in self._neos):
+            return self._reload(neo_rows, fields, rows)
+        new_neos = [(key, parse_neo(row)) for key, row in neo_prints.items() if key not in self._neos]
+
+        approach_rows = collections.defaultdict(list)
+        for row in rows:
+            approach_rows[fingerprint(row)].append(row)
+        added, removed = [], []
+        for key, group in approach_rows.items():
+            known = len(self._approaches.get(key, ()))
+            added.extend((key, parse_approach(fields, row)) for row in group[known:])
+        for key, approaches in self._approaches.items():
+            extra = len(approaches) - len(approach_rows.get(key, ()))
+            if extra > 0:
+                removed.extend((key, approach) for approach in approaches[-extra:])
+
+        def apply():
+            if new_neos:
+                self.database.add_neos([neo for _, neo in new_neos])
+            self.database.apply_delta(added=[approach for _, approach in added],
+                                      removed=[approach for _, approach in removed])
+            for key, neo in new_neos:
+                self._neos[key] = neo
+            for key, approach in added:
+                self._approaches[key].append(approach)
+            for key, _ in removed:
+                self._approaches[key].pop()
+                if not self._approaches[key]:
+                    del self._approaches[key]
+            return (f"Applied the changes to the data files: {len(new_neos)} new NEOs, "
+                    f"{len(added)} new and {len(removed)} removed close approaches.")
+        return apply
+
+
+class NDJSONFollower:
+    """A follower of an NDJSON file of close approach records, which grows over time."""
+    def __init__(self, path):
+        """Create a new `NDJSONFollower`.
+
+        The records already in the file are appended at the first poll.
+
+        :param path: A path to an NDJSON file of close approach records.
+        """
+        self.path = path
+        # The number of bytes of the file whose records were appended.
+        self._offset = 0
+
+    def rewind(self):
+        """Append every record of the file again at the next poll, say to a new database."""
+        self._offset = 0
+
+    def poll(self, database):
+        """Append the close approaches of the records written since the previous poll.
+
+        A truncated or replaced file is followed from its start again. An
+        incomplete last line is left for a later poll, and lines which aren't
+        JSON objects of valid close approach records are skipped.
+
+        :param database: The `NEODatabase` to append the close approaches to.
+        :return: A message describing the appended close approaches, or None.
+        """
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            return None
+        if size < self._offset:
+            self._offset = 0
+        if size == self._offset:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return None
+        approaches, skipped = [], 0
+        for line in data[:end].decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                approach = parse_approach(row.keys(), row.values()) if isinstance(row, dict) else None
+            except (KeyError, TypeError, ValueError):
+                approach = None
+            if approach is not None:
+                approaches.append(approach)
+            else:
+                skipped += 1
+        appended = database.apply_delta(added=approaches)[0]
+        # Only move past the lines once their close approaches are in the database.
+        self._offset += end
+        message = f"Appended {appended} new close approaches from {self.path}"
+        if appended < len(approaches):
+            message += f", holding back {len(approaches) - appended} of unknown NEOs"
+        if skipped:
+            message += f", skipping {skipped} malformed lines"
+        return message + "."
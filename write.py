@@ -1,62 +1,347 @@
+"""Write close approaches and NEOs to CSV, JSON or NDJSON output files.
+
+An output file whose name ends with the extension of a compression format (as
+in `results.csv.gz`, `results.json.bz2` or `results.csv.xz`) is compressed on
+the fly.
+
+The close approach writers accept batches of close approaches, as generated by
+`NEODatabase.query_batches`, as well as single close approaches. Either way,
+the close approaches are turned into rows of plain values a batch at a time,
+and the rows are formatted a batch at a time.
+
+The `write_parts` function splits a stream of close approaches into several
+part files, written concurrently by a pool of threads, and lists the finished
+parts in a manifest.
+"""
+import concurrent.futures
 import csv
+import io
+import itertools
 import json
+import os
+import pathlib
+
+from columnar import rows_of
+from helpers import datetime_to_str
+from streams import compression_of, open_stream
+
+
+# The default number of threads that write part files concurrently.
+PART_WORKERS = os.cpu_count() or 1
+# The number of close approaches gathered into each batch of rows.
+BATCH_SIZE = 2000
+# The fields of each row of a CSV output file.
+FIELDNAMES = ('datetime_utc', 'distance_au', 'velocity_km_s',
+              'designation', 'name', 'diameter_km', 'potentially_hazardous')
+
+
+def _open(filename, newline=None):
+    """Open an output file for writing text, compressing it if its extension says so.
+
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param newline: How to translate line endings, as for the built-in `open`.
+    :return: A text file object.
+    """
+    if compression_of(filename) is None:
+        return open(filename, "w", newline=newline)
+    return open_stream(filename, "w", newline=newline)
+
+
+def approach_row(result):
+    """Gather the attributes of one `CloseApproach` and its NEO into a row of values.
+
+    The row holds the same values, in the same order, as those of `columnar.rows_of`.
+
+    :param result: A `CloseApproach` object.
+    :return: A tuple of the time, distance, velocity, designation, name, diameter
+             and hazardous flag.
+    """
+    neo = result.neo
+    return (result.time, result.distance, result.velocity,
+            neo.designation, neo.name, neo.diameter, neo.hazardous)
+
+
+def row_batches(results, batch_size=BATCH_SIZE):
+    """Generate batches of rows of values from close approaches, or from batches of them.
+
+    Each element of `results` can be a `CloseApproach`, a list of them or a
+    dictionary of columns, as generated by `NEODatabase.query` and by
+    `NEODatabase.query_batches`. A batch of close approaches becomes a batch
+    of rows, so that its rows are built in one loop.
+
+    :param results: An iterable of `CloseApproach` objects, or of batches of them.
+    :param batch_size: The number of rows in each batch of single close approaches.
+    :return: A stream of lists of rows, as built by `approach_row`.
+    """
+    rows = []
+    for result in results:
+        if isinstance(result, (list, dict)):
+            if rows:
+                yield rows
+                rows = []
+            yield rows_of(result) if isinstance(result, dict) else list(map(approach_row, result))
+            continue
+        rows.append(approach_row(result))
+        if len(rows) == batch_size:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+
+def _csv_row(row):
+    """Format a row of values as the fields of a CSV output row."""
+    time, distance, velocity, designation, name, diameter, hazardous = row
+    return (datetime_to_str(time), distance, velocity, designation,
+            name if name is not None else "", diameter, "True" if hazardous else "False")
+
+
+def _json_object(row):
+    """Build the JSON object of a row of values, with the NEO's attributes nested."""
+    time, distance, velocity, designation, name, diameter, hazardous = row
+    return {
+        "datetime_utc": datetime_to_str(time),
+        "distance_au": distance,
+        "velocity_km_s": velocity,
+        "neo": {
+            "designation": designation,
+            "name": name if name is not None else "",
+            "diameter_km": diameter,
+            "potentially_hazardous": bool(hazardous)
+        }
+    }
+
+
+def format_csv(rows):
+    """Format a batch of rows of values as lines of CSV text, without a header.
+
+    :param rows: A list of rows, as built by `approach_row`.
+    :return: A chunk of CSV text.
+    """
+    buf = io.StringIO()
+    csv.writer(buf).writerows(map(_csv_row, rows))
+    return buf.getvalue()
+
+
+def format_json(rows):
+    """Format a batch of rows of values as comma-separated JSON objects, the inside of a JSON list.
+
+    :param rows: A list of rows, as built by `approach_row`.
+    :return: A chunk of JSON text.
+    """
+    return ", ".join(json.dumps(_json_object(row)) for row in rows)
+
+
+def format_ndjson(rows):
+    """Format a batch of rows of values as lines of JSON objects.
+
+    :param rows: A list of rows, as built by `approach_row`.
+    :return: A chunk of NDJSON text.
+    """
+    return "".join(json.dumps(_json_object(row)) + "\n" for row in rows)
 
 
 def write_to_csv(results, filename):
-    """Write an iterable of `CloseApproach` objects to a CSV file.
+    """Write an iterable of `CloseApproach` objects, or of batches of them, to a CSV file.
 
     The precise output specification is in `README.md`. Roughly, each output row
     corresponds to the information in a single close approach from the `results`
     stream and its associated near-Earth object.
 
-    :param results: An iterable of `CloseApproach` objects.
+    :param results: An iterable of `CloseApproach` objects, or of batches of them.
     :param filename: A Path-like object pointing to where the data should be saved.
     """
-    fieldnames = (
-        'datetime_utc', 'distance_au', 'velocity_km_s',
-        'designation', 'name', 'diameter_km', 'potentially_hazardous'
-    )
-    
-    with open(filename, "w", newline="") as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-        for result in results:
-            content = result.serialize()
-            content.update(result.neo.serialize())
-            content["name"] = content["name"] if content["name"] is not None else ""
-            content["potentially_hazardous"] = "True" if content["potentially_hazardous"] else "False"
-            writer.writerow(content)
+    with _open(filename, newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(FIELDNAMES)
+        for rows in row_batches(results):
+            writer.writerows(map(_csv_row, rows))
+
 
 def write_to_json(results, filename):
-    """Write an iterable of `CloseApproach` objects to a JSON file.
+    """Write an iterable of `CloseApproach` objects, or of batches of them, to a JSON file.
 
     The precise output specification is in `README.md`. Roughly, the output is a
     list containing dictionaries, each mapping `CloseApproach` attributes to
     their values and the 'neo' key mapping to a dictionary of the associated
-    NEO's attributes.
+    NEO's attributes. The list is written a batch at a time.
+
+    :param results: An iterable of `CloseApproach` objects, or of batches of them.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    """
+    with _open(filename) as json_file:
+        json_file.write("[")
+        first = True
+        for rows in row_batches(results):
+            json_file.write(format_json(rows) if first else ", " + format_json(rows))
+            first = False
+        json_file.write("]")
+
+
+def write_to_ndjson(results, filename):
+    """Write an iterable of `CloseApproach` objects, or of batches of them, to an NDJSON file.
+
+    Each line holds one JSON object, in the format of the elements of the list
+    written by `write_to_json`.
+
+    :param results: An iterable of `CloseApproach` objects, or of batches of them.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    """
+    with _open(filename) as ndjson_file:
+        for rows in row_batches(results):
+            ndjson_file.write(format_ndjson(rows))
+
+
+def _split_name(filename):
+    """Split an output file name into its stem, its extension and its compression extension."""
+    path = pathlib.Path(filename)
+    compression = path.suffix if compression_of(path) is not None else ""
+    base = pathlib.PurePath(path.name[:len(path.name) - len(compression)])
+    return path, base.stem, base.suffix + compression
+
+
+def part_path(filename, index):
+    """Return the path of one part of a partitioned output file.
+
+    For example, the part 3 of `results.csv.gz` is `results-00003.csv.gz`.
+
+    :param filename: A Path-like object pointing to the partitioned output file.
+    :param index: The index of the part, from 0.
+    :return: A `pathlib.Path` next to the output file.
+    """
+    path, stem, suffix = _split_name(filename)
+    return path.with_name(f"{stem}-{index:05d}{suffix}")
+
+
+def manifest_path(filename):
+    """Return the path of the manifest of a partitioned output file, such as `results.manifest.json`.
+
+    :param filename: A Path-like object pointing to the partitioned output file.
+    :return: A `pathlib.Path` next to the output file.
+    """
+    path, stem, _ = _split_name(filename)
+    return path.with_name(f"{stem}.manifest.json")
+
+
+def _write_manifest(filename, manifest):
+    """Replace a manifest at once, so that a reader never sees it half written."""
+    temporary = filename.with_name(filename.name + ".tmp")
+    with open(temporary, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temporary, filename)
+
+
+def write_parts(results, filename, writer, parts=None, part_size=None, total=None,
+                workers=PART_WORKERS):
+    """Split an iterable of `CloseApproach` objects into part files, written concurrently.
+
+    The results are cut into consecutive chunks of `part_size` rows, or into
+    `parts` chunks of (nearly) equal size. Each chunk is written to its own
+    part file by `writer`, in a pool of threads, while the next chunks are
+    gathered; at most two chunks per thread are held in memory at once.
+
+    The manifest lists each finished part's file name and number of rows, in
+    order. It's rewritten as each part is finished, so that a downstream job
+    can consume the parts listed so far, and its 'complete' key becomes true
+    once every part has been written.
 
     :param results: An iterable of `CloseApproach` objects.
+    :param filename: A Path-like object naming the parts, as in `part_path`.
+    :param writer: A function writing an iterable of results to a file, such as `write_to_csv`.
+    :param parts: The number of part files to write.
+    :param part_size: The number of rows of each part file, if `parts` isn't given.
+    :param total: The number of results, if known. Otherwise, `parts` requires them all in memory.
+    :param workers: The number of threads that write part files concurrently.
+    :return: The manifest, as a dictionary.
+    """
+    if parts:
+        if total is None:
+            results = list(results)
+            total = len(results)
+        part_size = max(1, -(-total // parts))
+    results = iter(results)
+    chunks = iter(lambda: list(itertools.islice(results, part_size)), [])
+
+    manifest_file = manifest_path(filename)
+    manifest = {"parts": [], "rows": 0, "complete": False}
+    finished = []
+
+    def record(futures):
+        for future in futures:
+            index, path, rows = pending.pop(future)
+            future.result()
+            finished.append((index, {"path": path.name, "rows": rows}))
+        finished.sort(key=lambda part: part[0])
+        manifest["parts"] = [part for _, part in finished]
+        manifest["rows"] = sum(part["rows"] for part in manifest["parts"])
+        _write_manifest(manifest_file, manifest)
+
+    _write_manifest(manifest_file, manifest)
+    pending = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for index, chunk in enumerate(chunks):
+            path = part_path(filename, index)
+            pending[pool.submit(writer, chunk, path)] = (index, path, len(chunk))
+            if len(pending) >= 2 * workers:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                record(done)
+        for future in concurrent.futures.as_completed(list(pending)):
+            record([future])
+    manifest["complete"] = True
+    _write_manifest(manifest_file, manifest)
+    return manifest
+
+def write_neos_to_csv(neos, filename, approaches=False):
+    """Write an iterable of `NearEarthObject`s to a CSV file, one row at a time.
+
+    Each row holds the attributes of one NEO. If `approaches` is True, each row
+    instead holds one close approach of an NEO followed by the NEO's attributes,
+    as written by `write_to_csv`, and an NEO without close approaches gets a
+    single row with empty close approach fields.
+
+    :param neos: An iterable of `NearEarthObject`s.
     :param filename: A Path-like object pointing to where the data should be saved.
+    :param approaches: Whether to additionally write each NEO's close approaches.
     """
+    fieldnames = ('designation', 'name', 'diameter_km', 'potentially_hazardous')
+    if approaches:
+        fieldnames = ('datetime_utc', 'distance_au', 'velocity_km_s') + fieldnames
 
-    json_data = []
-    for result in results:
-        content = result.serialize()
-        content.update(result.neo.serialize())
-        content["name"] = content["name"] if content["name"] is not None else ""
-        content["potentially_hazardous"] = "True" if content["potentially_hazardous"] else "False"
-        json_data.append(
-            {
-                "datetime_utc": content["datetime_utc"],
-                "distance_au": content["distance_au"],
-                "velocity_km_s": content["velocity_km_s"],
-                "neo": {
-                    "designation": content["designation"],
-                    "name": content["name"],
-                    "diameter_km": content["diameter_km"],
-                    "potentially_hazardous": bool(content["potentially_hazardous"])
-                }
-            }
-        )
-    with open(filename, "w") as json_file:
-        json.dump(json_data, json_file)
\ No newline at end of file
+    with _open(filename, newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        for neo in neos:
+            content = neo.serialize()
+            content["name"] = content["name"] if content["name"] is not None else ""
+            content["potentially_hazardous"] = "True" if content["potentially_hazardous"] else "False"
+            if not approaches or not neo.approaches:
+                writer.writerow(content)
+                continue
+            for approach in neo.approaches:
+                row = approach.serialize()
+                row.update(content)
+                writer.writerow(row)
+
+
+def write_neos_to_json(neos, filename, approaches=False):
+    """Write an iterable of `NearEarthObject`s to a JSON file, one NEO at a time.
+
+    The output is a list of dictionaries of NEO attributes. If `approaches` is
+    True, each dictionary additionally maps the 'approaches' key to a list of
+    the NEO's close approaches. The list is written as the NEOs are generated,
+    so it's never held in memory as a whole.
+
+    :param neos: An iterable of `NearEarthObject`s.
+    :param filename: A Path-like object pointing to where the data should be saved.
+    :param approaches: Whether to additionally write each NEO's close approaches.
+    """
+    with _open(filename) as json_file:
+        json_file.write("[")
+        for i, neo in enumerate(neos):
+            content = neo.serialize()
+            content["name"] = content["name"] if content["name"] is not None else ""
+            if approaches:
+                content["approaches"] = [approach.serialize() for approach in neo.approaches]
+            json_file.write((", " if i else "") + json.dumps(content))
+        json_file.write("]")